@@ -0,0 +1,104 @@
+"""Shared fixtures for the pytest-benchmark performance suite.
+
+Run from the repository root (pytest-benchmark must be installed; the suite
+is skipped otherwise)::
+
+    python -m pytest benchmarks --benchmark-autosave      # record a baseline
+    python -m pytest benchmarks --benchmark-compare       # fail on regressions
+
+With ``--benchmark-compare`` a benchmark fails when its mean time is more
+than ``REGRESSION_THRESHOLD`` slower than the last saved run, unless an
+explicit ``--benchmark-compare-fail`` is given.  Everything is synthetic and
+runs offline: targets are seeded random sequences and bowtie2 is replaced by
+a small script on ``PATH``.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+REGRESSION_THRESHOLD = os.environ.get("HCR_BENCHMARK_THRESHOLD", "mean:25%")
+TARGET_SIZES = {"1kb": 1000, "10kb": 10000, "100kb": 100000}
+SAMPLE_TILES = 500  # Per-tile benchmarks use a fixed sample to keep rounds short
+
+FAKE_BOWTIE2 = '''#!{python}
+import sys
+
+# Stand-in for bowtie2 -f -U -: one perfect hit per read, a second hit for every tenth read.
+name = None
+for i, line in enumerate(sys.stdin):
+    line = line.strip()
+    if line.startswith(">"):
+        name = line[1:]
+        continue
+    if not line:
+        continue
+    cigar = f"{{len(line)}}M"
+    print(f"{{name}}\\t0\\tchr1\\t{{100 + i}}\\t255\\t{{cigar}}\\t*\\t0\\t0\\t{{line}}\\t*\\tAS:i:0\\tNM:i:0")
+    if i % 20 == 1:
+        print(f"{{name}}\\t256\\tchr2\\t{{500 + i}}\\t1\\t{{cigar}}\\t*\\t0\\t0\\t{{line}}\\t*\\tAS:i:-6\\tNM:i:1")
+'''
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Apply the default regression threshold whenever a comparison is requested.
+    if getattr(config.option, "benchmark_compare", None) and not getattr(config.option, "benchmark_compare_fail", None):
+        from pytest_benchmark.utils import parse_compare_fail
+
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
+
+
+@pytest.fixture(autouse=True)
+def _isolate_data_dir(tmp_path, monkeypatch):
+    """Keep benchmarks away from the user's data directory and hit cache."""
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(tmp_path / ".hcrprobedesign"))
+
+
+def synthetic_target(length, seed=0):
+    """
+    Return a reproducible random target with a few homopolymer runs and N stretches.
+
+    :param length: Sequence length.
+    :param seed: Random seed.
+    :return: Uppercase sequence string.
+    """
+    rng = random.Random(seed)
+    sequence = [rng.choice("ACGT") for _ in range(length)]
+    for start in range(0, length - 20, 997):
+        run = rng.choice(["CCCCCCC", "GGGGGGG", "NNNNN"])
+        sequence[start:start + len(run)] = run
+    return "".join(sequence)
+
+
+@pytest.fixture(params=list(TARGET_SIZES), scope="session")
+def target(request):
+    """Synthetic 1 kb, 10 kb and 100 kb targets as (size label, sequence)."""
+    return request.param, synthetic_target(TARGET_SIZES[request.param])
+
+
+@pytest.fixture(scope="session")
+def tile_sample():
+    """A fixed sample of Tile objects for the per-tile (scalar) benchmarks."""
+    from HCRProbeDesign import probeDesign
+
+    return probeDesign.scanSequence(synthetic_target(10000, seed=1), "sample")[:SAMPLE_TILES]
+
+
+@pytest.fixture
+def fake_bowtie2(tmp_path, monkeypatch):
+    """Put a deterministic bowtie2 stand-in first on PATH and return a dummy index prefix."""
+    binDir = tmp_path / "bin"
+    binDir.mkdir()
+    script = binDir / "bowtie2"
+    script.write_text(FAKE_BOWTIE2.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{binDir}{os.pathsep}{os.environ['PATH']}")
+    return str(tmp_path / "index" / "fake")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Measure start-up time of every HCRProbeDesign console script.
+
+Each entry point listed in ``setup.cfg`` is run with ``--help`` in a fresh
+interpreter under ``python -X importtime``.  The script reports the best
+wall-clock time over ``--repeat`` runs, the cumulative import time of the
+``HCRProbeDesign`` modules, and the slowest third-party imports, so regressions
+from a new eager import are easy to spot::
+
+    python benchmarks/startup_time.py --repeat 5 --max-ms 100 designProbes listReferences
+
+Results can be appended to a JSON-lines file with ``--json`` for tracking over
+time.  The exit status is 1 if a script exceeds ``--max-ms``.
+"""
+
+import argparse
+import configparser
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+
+
+def console_scripts(setup_cfg=os.path.join(ROOT, "setup.cfg")):
+    """
+    Read console script entry points from setup.cfg.
+
+    :param setup_cfg: Path to setup.cfg.
+    :return: Dict mapping script name to (module, function).
+    """
+    config = configparser.ConfigParser()
+    config.read(setup_cfg)
+    scripts = {}
+    for line in config["options.entry_points"]["console_scripts"].strip().splitlines():
+        name, target = (part.strip() for part in line.split("=", 1))
+        module, function = target.split(":")
+        scripts[name] = (module, function)
+    return scripts
+
+
+def parse_importtime(stderr):
+    """
+    Parse ``-X importtime`` output.
+
+    :param stderr: Captured stderr of the interpreter.
+    :return: List of (module, self microseconds, cumulative microseconds, importer) in
+        import order, where importer is the module whose import triggered it (or None).
+    """
+    rows = []
+    pending = []  # Rows whose importer is not known yet (importtime lists children first)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        selfTime, cumulative, module = line[len("import time:"):].split("|")
+        depth = len(module) - len(module.lstrip())
+        row = [module.strip(), int(selfTime), int(cumulative), None]
+        while pending and pending[-1][0] > depth:
+            pending.pop()[1][3] = row[0]
+        pending.append((depth, row))
+        rows.append(row)
+    return [tuple(row) for row in rows]
+
+
+def measure(name, module, function, repeat=5, env=None):
+    """
+    Time ``<script> --help`` in fresh interpreters.
+
+    :param name: Script name (used as argv[0]).
+    :param module: Entry point module.
+    :param function: Entry point function.
+    :param repeat: Number of runs; the fastest is reported.
+    :param env: Environment for the child interpreters.
+    :return: Dict with wall time and import breakdown.
+    """
+    code = f"import sys; sys.argv = [{name!r}, '--help']; from {module} import {function}; {function}()"
+    best = None
+    importRows = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            importRows = parse_importtime(proc.stderr)
+    inPackage = lambda module_: module_ is not None and module_.split(".")[0] == "HCRProbeDesign"
+    package = sum(row[2] for row in importRows if inPackage(row[0]) and not inPackage(row[3]))
+    # Third-party/stdlib modules imported directly by the package or the -c code
+    external = [row for row in importRows if not inPackage(row[0]) and (row[3] is None or inPackage(row[3]))]
+    heaviest = sorted(external, key=lambda row: row[2], reverse=True)[:5]
+    return {
+        "script": name,
+        "wall_ms": round(best * 1000, 1),
+        "package_import_ms": round(package / 1000, 1),
+        "heaviest_imports": {row[0]: round(row[2] / 1000, 1) for row in heaviest},
+        "returncode": proc.returncode,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="*", help="Console scripts to time (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per script; the fastest is reported")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if a script takes longer than this")
+    parser.add_argument("--json", default=None, help="Append one JSON line per script to this file")
+    args = parser.parse_args()
+
+    scripts = console_scripts()
+    names = args.scripts or sorted(scripts)
+    unknown = set(names) - set(scripts)
+    if unknown:
+        parser.error(f"unknown console script(s): {', '.join(sorted(unknown))}")
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, env.get("PYTHONPATH")]))
+    failed = []
+    with tempfile.TemporaryDirectory() as dataDir:
+        env["HCRPROBEDESIGN_DATA_DIR"] = dataDir
+        results = [measure(name, *scripts[name], repeat=args.repeat, env=env) for name in names]
+    for result in results:
+        heaviest = ", ".join(f"{module} {ms:.0f}" for module, ms in result["heaviest_imports"].items())
+        print(f"{result['script']:<20} {result['wall_ms']:>8.1f} ms   (package imports {result['package_import_ms']:.1f} ms; {heaviest})")
+        if result["returncode"] != 0 or (args.max_ms is not None and result["wall_ms"] > args.max_ms):
+            failed.append(result["script"])
+    if args.json:
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(args.json, "a") as handle:
+            for result in results:
+                handle.write(json.dumps({"time": stamp, "python": sys.version.split()[0], **result}) + "\n")
+    if failed:
+        sys.exit(f"Too slow or failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
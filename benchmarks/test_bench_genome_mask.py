@@ -0,0 +1,55 @@
+"""Genome masking benchmarks: SAM parsing and the bowtie2 stage with bowtie2 mocked."""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from HCRProbeDesign import genomeMask, probeDesign, tiles  # noqa: E402
+
+
+def _tile_reads(sequence, label):
+    tileSet = tiles.TileSet.fromSequence(sequence, label)
+    return tileSet, [(tileSet.name(row), tileSet.sequence(row)) for row in tileSet.rows()]
+
+
+@pytest.fixture
+def sam_file(tmp_path, target):
+    """A SAM file with one record per tile (plus secondary hits) of the target."""
+    label, sequence = target
+    _, reads = _tile_reads(sequence, label)
+    lines = ["@HD\tVN:1.0\tSO:unsorted", "@SQ\tSN:chr1\tLN:100000000", "@SQ\tSN:chr2\tLN:100000000"]
+    for i, (name, read) in enumerate(reads):
+        lines.append(f"{name}\t0\tchr1\t{i + 1}\t255\t{len(read)}M\t*\t0\t0\t{read}\t*\tAS:i:0\tNM:i:0")
+        if i % 10 == 0:
+            lines.append(f"{name}\t256\tchr2\t{i + 1}\t1\t{len(read)}M\t*\t0\t0\t{read}\t*\tAS:i:-6\tNM:i:1")
+    path = tmp_path / "tiles.sam"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path), len(reads)
+
+
+def test_count_hits_from_sam(benchmark, sam_file):
+    path, nReads = sam_file
+    counts = benchmark(lambda: dict(genomeMask.countHitsFromSam(path)))
+    assert len(counts) == nReads
+
+
+def test_genomemask_stream(benchmark, target, fake_bowtie2):
+    label, sequence = target
+    _, reads = _tile_reads(sequence, label)
+    counts = benchmark(lambda: dict(genomeMask.genomemask_stream(reads, index=fake_bowtie2)))
+    assert len(counts) == len(reads)
+
+
+def test_genome_mask_stage(benchmark, target, fake_bowtie2, tmp_path):
+    label, sequence = target
+    fasta = tmp_path / "target.fa"
+    fasta.write_text(f">{label}\n{sequence}\n")
+    args = probeDesign.build_parser().parse_args([str(fasta), "--index", fake_bowtie2, "--no-hit-cache"])
+
+    def run():
+        tileSet = tiles.TileSet.fromSequence(sequence, label)
+        probeDesign._genome_mask_tilesets(args, [tileSet], label)
+        return tileSet
+
+    tileSet = benchmark(run)
+    assert 0 < len(tileSet) < len(tileSet.mask)
@@ -0,0 +1,25 @@
+"""Probe selection benchmarks on the active tiles of each synthetic target."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from HCRProbeDesign import selection, tiles  # noqa: E402
+
+
+@pytest.fixture
+def candidates(target):
+    label, sequence = target
+    tileSet = tiles.TileSet.fromSequence(sequence, label)
+    tileSet.calcGibbs()
+    rows = tileSet.rows()
+    scores = np.abs(tileSet.Gibbs[rows] + 60.0)
+    return tileSet.start[rows], tileSet.end[rows], scores
+
+
+@pytest.mark.parametrize("strategy", ["greedy", "optimal"])
+def test_select(benchmark, candidates, strategy):
+    select = selection.greedy_select if strategy == "greedy" else selection.optimal_select
+    picks = benchmark(select, *candidates, 20)
+    assert 0 < len(picks) <= 20
@@ -0,0 +1,32 @@
+"""Nearest-neighbour thermodynamics benchmarks."""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from HCRProbeDesign import thermo, tiles  # noqa: E402
+
+
+def test_stacks_rna_dna(benchmark, tile_sample):
+    sequences = [tile.sequence for tile in tile_sample]
+    energies = benchmark(lambda: [thermo.stacks_rna_dna(sequence) for sequence in sequences])
+    assert len(energies) == len(sequences)
+
+
+def test_tile_calc_gibbs(benchmark, tile_sample):
+    # Detached tiles take the scalar path; tiles of a TileSet would hit its cached column
+    standalone = [tiles.Tile(tile.sequence, tile.seqName, tile.startPos) for tile in tile_sample]
+    benchmark(lambda: [tile.calcGibbs() for tile in standalone])
+    assert all(tile.Gibbs < 0 for tile in standalone)
+
+
+def test_tileset_calc_gibbs(benchmark, target):
+    label, sequence = target
+
+    def fresh():
+        # calcGibbs caches its column, so every round gets a new TileSet
+        return (tiles.TileSet.fromSequence(sequence, label),), {}
+
+    energies = benchmark.pedantic(tiles.TileSet.calcGibbs, setup=fresh, rounds=10)
+    computed = energies[energies == energies]  # Masked rows stay NaN
+    assert len(computed) and (computed < 0).all()
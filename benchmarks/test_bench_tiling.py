@@ -0,0 +1,25 @@
+"""Tiling and homopolymer-run benchmarks."""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from HCRProbeDesign import probeDesign, tiles  # noqa: E402
+
+
+def test_scan_sequence(benchmark, target):
+    label, sequence = target
+    result = benchmark(probeDesign.scanSequence, sequence, label)
+    assert result
+
+
+def test_tileset_has_runs(benchmark, target):
+    label, sequence = target
+    tileSet = tiles.TileSet.fromSequence(sequence, label)
+    flagged = benchmark(tileSet.hasRuns, "c", 7, 2)
+    assert len(flagged) == len(tileSet.mask)
+
+
+def test_tile_has_runs(benchmark, tile_sample):
+    flagged = benchmark(lambda: [tile.hasRuns("c", 7, 2) for tile in tile_sample])
+    assert len(flagged) == len(tile_sample)
@@ -1,15 +1,13 @@
 """Top-level package for HCRProbeDesign utilities and probe design workflows."""
 
-from . import probeDesign
-from . import thermo
-from . import sequencelib
 from ._datadir import get_data_dir, get_config_path, get_indices_dir, ensure_data_dir
 
+import importlib
 import os
-try:
-    from importlib import metadata as importlib_metadata
-except ImportError:  # Python < 3.8
-    importlib_metadata = None
+
+# Submodules historically imported here; they now load on first access (PEP 562)
+# so that light entry points such as listReferences do not import NumPy or primer3.
+_LAZY_SUBMODULES = ("probeDesign", "thermo", "sequencelib")
 
 _ROOT = os.path.abspath(os.path.dirname(__file__))
 
@@ -24,16 +22,26 @@ def index_path():
     return get_indices_dir()
 
 def _resolve_version():
-    if importlib_metadata is not None:
-        try:
-            return importlib_metadata.version("hcrprobedesign")
-        except Exception:
-            pass
+    try:
+        from importlib import metadata as importlib_metadata
+        return importlib_metadata.version("hcrprobedesign")
+    except Exception:
+        pass
     try:
         import pkg_resources
         return pkg_resources.get_distribution("hcrprobedesign").version
     except Exception:
         return "unknown"
 
-__version__ = _resolve_version()
-del _resolve_version
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name == "__version__":
+        version = _resolve_version()
+        globals()["__version__"] = version
+        return version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_SUBMODULES) | {"__version__"})
@@ -48,6 +48,15 @@ def get_indices_dir():
     return os.path.join(get_data_dir(), "indices")
 
 
+def get_mask_socket_path():
+    """
+    Return the default Unix socket path of the warm genome-masking worker.
+
+    :return: Absolute path to the socket file.
+    """
+    return os.path.join(get_data_dir(), "maskServer.sock")
+
+
 def _load_yaml(path):
     """Load a YAML file, returning an empty dict if missing."""
     if not os.path.exists(path):
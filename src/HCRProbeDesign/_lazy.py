@@ -0,0 +1,35 @@
+"""Deferred module imports to keep CLI startup fast.
+
+``lazy_import`` returns a module object whose code only runs on first
+attribute access, so entry points such as ``designProbes --help`` do not pay
+for NumPy, primer3, pysam and friends unless a code path actually uses them.
+Module-level names stay in place, which keeps ``module.dependency`` patchable
+in tests.
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Import a module lazily.
+
+    :param name: Absolute module name (e.g. "numpy" or "HCRProbeDesign.tiles").
+    :return: The module; it is executed on first attribute access.
+    :raises ModuleNotFoundError: If the module cannot be found.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
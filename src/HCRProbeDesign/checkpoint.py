@@ -0,0 +1,93 @@
+"""Per-record checkpoints for resumable batch probe design.
+
+``designProbesBatch --checkpoint-dir DIR`` stores the finished output of
+every record as one JSON file in ``DIR`` as soon as the record is done.  The
+file name is a hash of the record (name, sequence, channel), of every
+parameter that affects the designed probes and of the genome index contents,
+so ``--resume`` only reuses a checkpoint when re-running it would produce the
+same result (rebuilding an index in place invalidates its checkpoints).
+"""
+
+import hashlib
+import json
+import os
+
+CHECKPOINT_VERSION = 2
+
+# Arguments that change where output goes or how fast it is produced, but not the probes.
+_NON_RESULT_ARGS = frozenset({
+    "infile", "output", "idt", "verbose", "targetName", "calcPrice",
+    "workers", "jobs", "mask_chunk", "checkpoint_dir", "resume", "records", "record_regex", "metrics", "metrics_run",
+    "bowtie2_threads", "genomemask_io", "mask_server", "hit_cache", "hit_cache_size",
+})
+
+
+def record_key(record, channel, args, indexKey=None):
+    """
+    Hash a record together with the parameters that determine its probes.
+
+    :param record: Dict containing "name" and "sequence".
+    :param channel: Resolved HCR channel.
+    :param args: Parsed CLI arguments (argparse.Namespace).
+    :param indexKey: Fingerprint of the genome index used for masking (see hitCache.index_checksum), or None.
+    :return: Hex digest identifying the checkpoint.
+    """
+    params = {key: value for key, value in sorted(vars(args).items()) if key not in _NON_RESULT_ARGS}
+    payload = json.dumps(
+        {
+            "version": CHECKPOINT_VERSION,
+            "name": record["name"],
+            "sequence": record["sequence"],
+            "channel": channel,
+            "params": params,
+            "index": indexKey,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CheckpointStore:
+    """Directory of per-record result checkpoints, one JSON file per record key."""
+
+    def __init__(self, directory):
+        """
+        Open (and create if needed) a checkpoint directory.
+
+        :param directory: Checkpoint directory path.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        """
+        Return the stored result for a record key.
+
+        :param key: Record key from ``record_key``.
+        :return: Result dict, or None if there is no complete checkpoint.
+        """
+        try:
+            with open(self._path(key)) as handle:
+                return json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, key, result):
+        """
+        Atomically store the result of a finished record.
+
+        :param key: Record key from ``record_key``.
+        :param result: JSON-serializable result dict.
+        :return: None.
+        """
+        path = self._path(key)
+        tmpPath = f"{path}.tmp"
+        with open(tmpPath, "w") as handle:
+            json.dump(result, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmpPath, path)
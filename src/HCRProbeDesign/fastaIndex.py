@@ -0,0 +1,458 @@
+"""Memory-mapped, indexed FASTA access for transcriptome-scale inputs.
+
+``IndexedFasta`` maps the file instead of reading it line by line and keeps
+a samtools-style ``.fai`` offset index (name, length, offset, bases per line,
+bytes per line).  An existing ``<file>.fai`` that is newer than the FASTA and
+still matches it is reused, but never written or replaced.  Otherwise the
+index is built with one scan of the mapping and, when asked (batch runs),
+saved to the ``fai`` cache in the user data directory for the next run.
+Records can then be fetched by name, or by
+slice, without touching the rest of the file.  Records are kept by position,
+so headers that share their first word (``>Sox2 channel=B1`` and
+``>Sox2 channel=B2``) remain separate records; name lookups return the first.
+
+Plain gzip input is decompressed once to an anonymous temporary file and
+mapped from there.  BGZF input (``bgzip``) is read with ``pysam.FastaFile``,
+which gives random access through its ``.fai``/``.gzi`` indices; htslib
+drops repeated names, so such files are streamed instead by ``open_records``.
+"""
+
+import gzip
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from collections import namedtuple
+
+from ._datadir import get_data_dir
+
+FaiEntry = namedtuple("FaiEntry", ["name", "length", "offset", "linebases", "linewidth"])
+
+_WHITESPACE = b"\r\n \t"
+_FAI_SAMPLES = 64  # Records spot-checked when reusing a saved .fai
+
+
+def is_gzip(path):
+    """Return True if the file starts with the gzip magic bytes."""
+    with open(path, "rb") as handle:
+        return handle.read(2) == b"\x1f\x8b"
+
+
+def is_bgzf(path):
+    """Return True if the file is BGZF (blocked gzip with the 'BC' extra field)."""
+    with open(path, "rb") as handle:
+        head = handle.read(16)
+    return len(head) >= 14 and head[:2] == b"\x1f\x8b" and head[3] & 4 and head[12:14] == b"BC"
+
+
+def read_fai(path):
+    """
+    Read a samtools ``.fai`` index.
+
+    :param path: Path to the ``.fai`` file.
+    :return: List of FaiEntry in file order.
+    """
+    with open(path) as handle:
+        rows = [line.split("\t") for line in handle.read().splitlines()]
+    return [
+        FaiEntry(row[0], int(row[1]), int(row[2]), int(row[3]), int(row[4]))
+        for row in rows
+        if len(row) >= 5
+    ]
+
+
+def write_fai(entries, path):
+    """
+    Write a samtools ``.fai`` index.
+
+    :param entries: Iterable of FaiEntry.
+    :param path: Output path.
+    :return: None.
+    """
+    with open(path, "w") as handle:
+        for entry in entries:
+            handle.write("\t".join(map(str, entry)) + "\n")
+
+
+def scan_fasta(buf):
+    """
+    Build offset index entries for every record of a FASTA buffer.
+
+    Records whose sequence lines are not all the same width (or contain
+    spaces, tabs or carriage returns) are marked irregular with ``linebases == 0``; their bytes
+    end offset is returned separately so they can still be fetched.
+
+    :param buf: bytes-like FASTA contents (e.g. an mmap).
+    :return: Tuple of (list of FaiEntry, list of full headers, list of end offsets), all in file order.
+    """
+    entries = []
+    headers = []
+    ends = []
+    size = len(buf)
+    if buf[:1] == b">":
+        pos = 0
+    else:
+        pos = buf.find(b"\n>")
+        pos = pos + 1 if pos >= 0 else size
+    while pos < size:
+        headerEnd = buf.find(b"\n", pos)
+        if headerEnd < 0:
+            headerEnd = size
+        header = bytes(buf[pos + 1:headerEnd]).decode().rstrip()
+        name = header.split(None, 1)[0] if header.strip() else ""
+        seqStart = min(headerEnd + 1, size)
+        nextRecord = buf.find(b"\n>", headerEnd)
+        seqEnd = nextRecord + 1 if nextRecord >= 0 else size
+        region = buf[seqStart:seqEnd]
+        body = region[:-1] if region.endswith(b"\n") else region
+        nBreaks = body.count(b"\n")
+        linewidth = body.find(b"\n") + 1 if nBreaks else len(body) + 1
+        linebases = linewidth - 1
+        # Regular records have every line break at a multiple of the line width
+        # and a final line no longer than the others.
+        regular = (
+            linebases > 0
+            and body[linebases::linewidth][:nBreaks] == b"\n" * nBreaks
+            and 0 < len(body) - nBreaks * linewidth <= linebases
+            and b"\r" not in body
+            and b" " not in body
+            and b"\t" not in body
+        )
+        if regular:
+            length = len(body) - nBreaks
+        else:
+            linebases = linewidth = 0
+            length = len(region.translate(None, _WHITESPACE))
+        entries.append(FaiEntry(name, length, seqStart, linebases, linewidth))
+        headers.append(header)
+        ends.append(seqEnd)
+        pos = seqEnd
+    return entries, headers, ends
+
+
+def get_fai_cache_path(path):
+    """
+    Return where the ``.fai`` of a FASTA is cached in the user data directory.
+
+    :param path: FASTA path.
+    :return: Absolute path of the cached index, named by a hash of the FASTA's real path.
+    """
+    digest = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()
+    return os.path.join(get_data_dir(), "fai", f"{digest}.fai")
+
+
+def _load_fai(faiPath, path, buf):
+    """Return the entries of a ``.fai`` newer than ``path`` that still describes ``buf``, else None."""
+    if not os.path.exists(faiPath) or os.path.getmtime(faiPath) < os.path.getmtime(path):
+        return None
+    entries = read_fai(faiPath)
+    return entries if _fai_matches(buf, entries) else None
+
+
+def _fai_matches(buf, entries):
+    """
+    Check that a loaded ``.fai`` still describes a FASTA buffer.
+
+    Guards against a FASTA rewritten within the timestamp resolution of its
+    index: a sample of records must start right after their '>name' header
+    line and the last record must end at the end of the file.
+
+    :param buf: bytes-like FASTA contents.
+    :param entries: List of FaiEntry.
+    :return: True if the index is consistent with the buffer.
+    """
+    step = max(1, len(entries) // _FAI_SAMPLES)
+    for entry in entries[::step] + entries[-1:]:
+        if not entry.linebases or entry.offset > len(buf) or buf[entry.offset - 1:entry.offset] != b"\n":
+            return False
+        headerStart = buf.rfind(b"\n", 0, entry.offset - 1) + 1
+        header = bytes(buf[headerStart:entry.offset - 1])
+        if header[:1] != b">" or header[1:].split(None, 1)[:1] != [entry.name.encode()]:
+            return False
+    if entries:
+        last = entries[-1]
+        end = last.offset + (last.length // last.linebases) * last.linewidth + last.length % last.linebases
+        if len(bytes(buf[end:]).strip()):
+            return False
+    return True
+
+
+class IndexedFasta:
+    """Random access to FASTA records through a memory map and a ``.fai`` index."""
+
+    def __init__(self, path, cacheIndex=False):
+        """
+        Open a FASTA file (plain, gzip or BGZF) and load or build its index.
+
+        :param path: FASTA path.
+        :param cacheIndex: Save a newly built index of a plain FASTA to the user data directory (see get_fai_cache_path).
+        """
+        self.path = path
+        self._pysam = None
+        self._bgzfHeaderList = None
+        self._spool = None
+        self._mmap = None
+        self._headers = {}
+        self._ends = None
+        if is_bgzf(path):
+            import pysam
+
+            self._pysam = pysam.FastaFile(path)
+            self.entries = [
+                FaiEntry(name, length, 0, 0, 0)
+                for name, length in zip(self._pysam.references, self._pysam.lengths)
+            ]
+        else:
+            if is_gzip(path):
+                self._spool = tempfile.TemporaryFile()
+                with gzip.open(path, "rb") as handle:
+                    shutil.copyfileobj(handle, self._spool)
+                self._spool.flush()
+                fileno = self._spool.fileno()
+                plain = False
+            else:
+                self._file = open(path, "rb")
+                fileno = self._file.fileno()
+                plain = True
+            size = os.fstat(fileno).st_size
+            self._buf = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if size else b""
+            self._mmap = self._buf if size else None
+            self.entries = None
+            if plain:
+                cachePath = get_fai_cache_path(path)
+                self.entries = _load_fai(f"{path}.fai", path, self._buf) or _load_fai(cachePath, path, self._buf)
+            if self.entries is None:
+                self.entries, headers, self._ends = scan_fasta(self._buf)
+                self._headers = dict(enumerate(headers))
+                if plain and cacheIndex and all(entry.linebases for entry in self.entries):
+                    try:
+                        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+                        write_fai(self.entries, cachePath)
+                    except OSError:
+                        pass  # Unwritable data directory: keep the index in memory only
+        self._byName = {}
+        for index, entry in enumerate(self.entries):
+            self._byName.setdefault(entry.name, []).append(index)
+
+    def close(self):
+        """Release the mapping, temporary spool and any pysam handle."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+            self._file = None
+        if self._pysam is not None:
+            self._pysam.close()
+            self._pysam = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        """Return the number of records."""
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self._byName
+
+    @property
+    def names(self):
+        """Record names (first header word) in file order; a repeated name is listed once per record."""
+        return [entry.name for entry in self.entries]
+
+    @property
+    def unique(self):
+        """True if no two records share a name (scans the headers of BGZF input)."""
+        if self._pysam is not None:
+            return len(self._bgzfHeaders()) == len(self.entries)
+        return len(self._byName) == len(self.entries)
+
+    def indices(self, name):
+        """
+        Return the positions of all records with a name.
+
+        :param name: Record name.
+        :return: List of 0-based record indices in file order.
+        :raises KeyError: If no record has that name.
+        """
+        return list(self._byName[name])
+
+    def length(self, name):
+        """Return the sequence length of (the first) record ``name``."""
+        return self.entries[self._byName[name][0]].length
+
+    def _byteOffset(self, entry, position):
+        return entry.offset + (position // entry.linebases) * entry.linewidth + position % entry.linebases
+
+    def view(self, name, start=0, end=None):
+        """
+        Return the bases of ``name[start:end]`` as bytes-like data.
+
+        When the slice lies within a single line of the file the result is a
+        zero-copy memoryview of the mapping; otherwise line breaks are
+        removed into a new bytes object.
+
+        :param name: Record name (the first record with that name is used).
+        :param start: 0-based start position.
+        :param end: 0-based exclusive end (default: record end).
+        :return: memoryview or bytes.
+        :raises KeyError: If the record is not in the index.
+        """
+        return self._view(self._byName[name][0], start, end)
+
+    def _view(self, index, start=0, end=None):
+        entry = self.entries[index]
+        start, end, _ = slice(start, end).indices(entry.length)
+        end = max(start, end)
+        if self._pysam is not None:
+            return self._pysam.fetch(reference=entry.name, start=start, end=end).encode()
+        if not entry.linebases:
+            if self._ends is None:  # Irregular record missing from a stale in-memory index
+                raise KeyError(entry.name)
+            return bytes(self._buf[entry.offset:self._ends[index]]).translate(None, _WHITESPACE)[start:end]
+        first = self._byteOffset(entry, start)
+        if start == end:
+            return memoryview(b"")
+        last = self._byteOffset(entry, end - 1) + 1
+        if last - first == end - start:
+            return memoryview(self._buf)[first:last]
+        return bytes(self._buf[first:last]).translate(None, b"\r\n")
+
+    def fetch(self, name, start=0, end=None):
+        """
+        Return the sequence of ``name[start:end]`` as a string.
+
+        :param name: Record name.
+        :param start: 0-based start position.
+        :param end: 0-based exclusive end (default: record end).
+        :return: Sequence string with the file's case preserved.
+        """
+        return bytes(self.view(name, start, end)).decode()
+
+    def header(self, name):
+        """
+        Return the full header line (without '>') of a record.
+
+        :param name: Record name (the first record with that name is used).
+        :return: Header text, including any description after the name.
+        """
+        return self._header(self._byName[name][0])
+
+    def _header(self, index):
+        if index in self._headers:
+            return self._headers[index]
+        if self._pysam is not None:
+            name = self.entries[index].name
+            for header in self._bgzfHeaders():
+                if (header.split(None, 1)[0] if header.strip() else "") == name:
+                    return header
+            return name
+        entry = self.entries[index]
+        headerStart = self._buf.rfind(b"\n", 0, max(entry.offset - 1, 0)) + 1
+        header = bytes(self._buf[headerStart + 1:entry.offset]).decode().rstrip()
+        self._headers[index] = header
+        return header
+
+    def _bgzfHeaders(self):
+        if self._bgzfHeaderList is None:
+            with gzip.open(self.path, "rt") as handle:
+                self._bgzfHeaderList = [line[1:].rstrip() for line in handle if line.startswith(">")]
+        return self._bgzfHeaderList
+
+    def records(self, names=None, indices=None):
+        """
+        Iterate records as ``{'name': header, 'sequence': str}`` dicts, like FastaIterator.
+
+        :param names: Optional iterable of record names to fetch, in the given order; every record with a given name is returned.
+        :param indices: Optional iterable of record positions to fetch instead of ``names``.
+        :return: Generator of record dicts (default: all, in file order).
+        """
+        if indices is None:
+            if names is None:
+                indices = range(len(self.entries))
+            else:
+                indices = [index for name in names for index in self._byName[name]]
+        for index in indices:
+            yield {"name": self._header(index), "sequence": bytes(self._view(index)).decode()}
+
+
+def read_record_ids(path):
+    """
+    Read record names from a text file, one per line.
+
+    Blank lines and lines starting with '#' are ignored; only the first word
+    of each line is used, so FASTA-style header lines also work.
+
+    :param path: Path to the ID list.
+    :return: List of unique record names in file order.
+    """
+    names = []
+    with open(path) as handle:
+        for line in handle:
+            line = line.strip().lstrip(">")
+            if line and not line.startswith("#"):
+                names.append(line.split()[0])
+    return list(dict.fromkeys(names))
+
+
+def _filter_stream(records, wanted, regex):
+    seen = set()
+    for record in records:
+        name = record["name"].split(None, 1)[0] if record["name"].strip() else ""
+        if wanted is not None and name not in wanted:
+            continue
+        if regex is not None and not regex.search(record["name"]):
+            continue
+        seen.add(name)
+        yield record
+    if wanted is not None and wanted - seen:
+        raise KeyError(sorted(wanted - seen))
+
+
+def open_records(handle, names=None, pattern=None, cacheIndex=False):
+    """
+    Iterate FASTA records from an open handle, through the index when it is a regular file.
+
+    With ``names`` or ``pattern`` only the matching records are read; on an
+    indexed file the others are never touched.  Pipes and stdin (and BGZF
+    files with repeated names, which htslib cannot index) fall back to
+    streaming ``sequencelib.FastaIterator`` and filtering as records go by.
+
+    :param handle: File handle as opened by argparse.FileType.
+    :param names: Optional iterable of record names (first header word) to select; every record with a selected name is returned.
+    :param pattern: Optional regular expression searched in the full header.
+    :param cacheIndex: Save a newly built index to the user data directory (see IndexedFasta).
+    :return: Generator of ``{'name', 'sequence'}`` record dicts, in file order.
+    :raises KeyError: If any of ``names`` is not in the file (listing the missing names).
+    """
+    from .sequencelib import FastaIterator
+
+    wanted = None if names is None else set(names)
+    regex = re.compile(pattern) if pattern is not None else None
+    path = getattr(handle, "name", None)
+    if not isinstance(path, str) or not os.path.isfile(path):
+        yield from _filter_stream(FastaIterator(handle), wanted, regex)
+        return
+    with IndexedFasta(path, cacheIndex=cacheIndex) as fasta:
+        if fasta._pysam is not None and not fasta.unique:
+            with gzip.open(path, "rt") as stream:
+                yield from _filter_stream(FastaIterator(stream), wanted, regex)
+            return
+        selected = range(len(fasta))
+        if wanted is not None:
+            missing = wanted.difference(fasta.names)
+            if missing:
+                raise KeyError(sorted(missing))
+            selected = [index for index in selected if fasta.entries[index].name in wanted]
+        if regex is not None:
+            selected = [index for index in selected if regex.search(fasta._header(index))]
+        yield from fasta.records(indices=selected)
@@ -6,16 +6,21 @@
 
 import subprocess
 import tempfile
-import pysam
-from collections import defaultdict
+import threading
+import shlex
+import socket
+import json
 import os
-import urllib.request
 import shutil
-from zipfile import ZipFile
 import argparse
 import yaml
 
 from ._datadir import get_config_path, get_indices_dir, get_data_dir, ensure_data_dir
+from ._lazy import lazy_import
+from .utils import eprint
+
+hitCache = lazy_import(f"{__package__}.hitCache")
+kmerIndex = lazy_import(f"{__package__}.kmerIndex")  # NumPy
 
 package_directory = os.path.dirname(os.path.abspath(__file__))
 # indexLookup = {
@@ -73,16 +78,19 @@ def _register_species(species, index_prefix, force=False, config_path=None):
 
     :param species: Species key to register.
     :param index_prefix: Bowtie2 index prefix path.
-    :param force: Overwrite an existing species entry if True.
+    :param force: Replace a Bowtie2 index already registered for the species if True.
     :param config_path: Optional config path override.
     :return: None.
-    :raises ValueError: If the species exists and force is False.
+    :raises ValueError: If the species already has a Bowtie2 index and force is False.
     """
     config = _load_config(config_path=config_path)
     species_config = config.setdefault("species", {})
-    if species in species_config and not force:
+    entry = species_config.get(species) or {}
+    if "bowtie2_index" in entry and not force:
         raise ValueError(f"Species '{species}' already exists in config. Use --force to replace.")
-    species_config[species] = {"bowtie2_index": _format_index_path(index_prefix)}
+    # Keep other indices (e.g. a k-mer index) registered for the species
+    entry["bowtie2_index"] = _format_index_path(index_prefix)
+    species_config[species] = entry
     _save_config(config, config_path=config_path)
 
 
@@ -105,10 +113,45 @@ def _resolve_index(species, index):
             "Run buildGenomeIndex --species <name> --fasta <file_or_dir> "
             "or supply --index /path/to/bowtie2/index/prefix."
         )
-    return species_config[species]["bowtie2_index"]
+    index = (species_config[species] or {}).get("bowtie2_index")
+    if not index:
+        raise ValueError(
+            f"Species '{species}' has no Bowtie2 index registered (only a k-mer index). "
+            "Use --mask-engine kmer, run buildGenomeIndex --species <name> --fasta <file_or_dir> "
+            "or supply --index /path/to/bowtie2/index/prefix."
+        )
+    return index
+
+BOWTIE2_PRESETS = (
+    "very-fast", "fast", "sensitive", "very-sensitive",
+    "very-fast-local", "fast-local", "sensitive-local", "very-sensitive-local",
+)
+
+def _bowtie2_options(nAlignments=3, threads=1, preset=None, extra_args=None):
+    """
+    Build the Bowtie2 alignment options shared by file and streaming modes.
+
+    :param nAlignments: Number of alignments to report per read (-k).
+    :param threads: Number of Bowtie2 threads (-p); adds --reorder when > 1 so
+        output order matches input order.
+    :param preset: Optional sensitivity preset name (e.g. "very-fast").
+    :param extra_args: Extra Bowtie2 arguments as a string or list.
+    :return: List of command-line arguments.
+    :raises ValueError: If the preset is unknown.
+    """
+    options = [f"-k{nAlignments}"]
+    if threads and threads > 1:
+        options.extend(["-p", str(threads), "--reorder"])
+    if preset:
+        if preset not in BOWTIE2_PRESETS:
+            raise ValueError(f"Unknown bowtie2 preset '{preset}'. Choose from: {', '.join(BOWTIE2_PRESETS)}")
+        options.append(f"--{preset}")
+    if extra_args:
+        options.extend(shlex.split(extra_args) if isinstance(extra_args, str) else list(extra_args))
+    return options
 
 #TODO: make genomemask() take transient index argment if not default in species
-def genomemask(fasta_string,handleName="tmp",species="mouse",nAlignments = 3, index=None):
+def genomemask(fasta_string,handleName="tmp",species="mouse",nAlignments = 3, index=None, threads=1, preset=None, extra_args=None):
     """
     Run Bowtie2 to align probe tiles and write a SAM file to disk.
 
@@ -117,6 +160,9 @@ def genomemask(fasta_string,handleName="tmp",species="mouse",nAlignments = 3, in
     :param species: Species key in HCRconfig.yaml.
     :param nAlignments: Number of alignments to report per read.
     :param index: Optional Bowtie2 index prefix override.
+    :param threads: Number of Bowtie2 threads.
+    :param preset: Optional Bowtie2 sensitivity preset (see BOWTIE2_PRESETS).
+    :param extra_args: Extra Bowtie2 arguments as a string or list.
     :return: Bowtie2 subprocess return code.
     """
     fasta_file = f'{handleName}_reads.fa'
@@ -125,30 +171,455 @@ def genomemask(fasta_string,handleName="tmp",species="mouse",nAlignments = 3, in
     tmpFasta.write(fasta_string)
     tmpFasta.close()
     sam_file = f'{handleName}.sam'
+    index_path = _index_path(species, index)
+    options = _bowtie2_options(nAlignments, threads=threads, preset=preset, extra_args=extra_args)
+    res = subprocess.call(["bowtie2", *options, "-x", index_path, "-f", fasta_file, "-S", sam_file])
+    return res
+
+def _index_path(species, index):
+    """
+    Resolve the on-disk Bowtie2 index prefix for a species or explicit index.
+
+    :param species: Species key in HCRconfig.yaml.
+    :param index: Optional Bowtie2 index prefix override.
+    :return: Index prefix path (relative entries resolved against the data dir).
+    """
     index = _resolve_index(species, index)
-    print(index)
+    eprint(index)  # stderr: stdout may be the probe table
+    return _absolute_index(index)
+
+def _absolute_index(index):
+    """
+    Resolve a registered index prefix against the data dir if it is relative.
+
+    :param index: Bowtie2 index prefix.
+    :return: Index prefix path.
+    """
     if os.path.isabs(index):
-        index_path = index
-    else:
-        index_path = os.path.join(get_data_dir(), index)
-    res = subprocess.call(["bowtie2", f"-k{nAlignments}", "-x", index_path, "-f", fasta_file, "-S", sam_file])
-    return res
+        return index
+    return os.path.join(get_data_dir(), index)
+
+def _write_reads(handle, reads):
+    """
+    Write reads to a Bowtie2 stdin pipe as FASTA, then close it.
+
+    :param handle: Writable text handle (bowtie2 stdin).
+    :param reads: FASTA formatted string or iterable of (name, sequence) tuples.
+    :return: None.
+    """
+    try:
+        if isinstance(reads, str):
+            handle.write(reads)
+            if reads and not reads.endswith("\n"):
+                handle.write("\n")
+        else:
+            for name, sequence in reads:
+                handle.write(f">{name}\n{sequence}\n")
+    except BrokenPipeError:
+        pass  # bowtie2 exited early; its return code is reported by the reader
+    finally:
+        try:
+            handle.close()
+        except BrokenPipeError:
+            pass
+
+def genomemask_stream(reads, species="mouse", nAlignments=3, index=None, threads=1, preset=None, extra_args=None, stats=False):
+    """
+    Align reads with Bowtie2 over pipes and yield hit counts as they arrive.
+
+    Reads are fed to bowtie2 on stdin from a writer thread and SAM records
+    are parsed from stdout, so no FASTA/SAM files are written and concurrent
+    runs cannot clobber each other.
+
+    :param reads: FASTA formatted string or iterable of (name, sequence) tuples.
+    :param species: Species key in HCRconfig.yaml.
+    :param nAlignments: Number of alignments to report per read.
+    :param index: Optional Bowtie2 index prefix override.
+    :param threads: Number of Bowtie2 threads.
+    :param preset: Optional Bowtie2 sensitivity preset (see BOWTIE2_PRESETS).
+    :param extra_args: Extra Bowtie2 arguments as a string or list.
+    :param stats: Yield HitStats (scores, on/off-target mismatches) instead of plain counts.
+    :return: Generator of (read_name, hit_count or HitStats) tuples in Bowtie2 output order.
+    :raises subprocess.CalledProcessError: If bowtie2 exits with an error.
+    """
+    index_path = _index_path(species, index)
+    options = _bowtie2_options(nAlignments, threads=threads, preset=preset, extra_args=extra_args)
+    cmd = ["bowtie2", *options, "--no-hd", "-x", index_path, "-f", "-U", "-"]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    writer = threading.Thread(target=_write_reads, args=(proc.stdin, reads), daemon=True)
+    writer.start()
+    try:
+        if stats:
+            for readStats in hitStatsFromSamLines(proc.stdout):
+                yield readStats.name, readStats
+        else:
+            for item in countHitsFromSamLines(proc.stdout):
+                yield item
+    finally:
+        proc.stdout.close()
+        writer.join()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def _fasta_reads(fasta_string):
+    """
+    Parse a FASTA formatted string into (name, sequence) tuples.
+
+    :param fasta_string: FASTA formatted string.
+    :return: List of (name, sequence) tuples.
+    """
+    reads = []
+    for record in fasta_string.split(">")[1:]:
+        header, _, sequence = record.partition("\n")
+        reads.append((header.strip(), sequence.replace("\n", "").strip()))
+    return reads
+
+def _resolve_kmer_index(species, kmer_index=None):
+    """
+    Resolve the k-mer index directory for a species.
+
+    :param species: Species key in HCRconfig.yaml.
+    :param kmer_index: Optional explicit k-mer index directory.
+    :return: K-mer index directory.
+    :raises ValueError: If no k-mer index is registered and none is provided.
+    """
+    if not kmer_index:
+        species_config = (_load_config().get("species", {}) or {}).get(species) or {}
+        kmer_index = species_config.get("kmer_index")
+        if not kmer_index:
+            raise ValueError(
+                f"No k-mer index registered for species '{species}'. "
+                "Run buildGenomeIndex --species <name> --fasta <file_or_dir> --kmer-index "
+                "or supply --kmer-index /path/to/kmer/index."
+            )
+    return _absolute_index(kmer_index)
+
+def genomemask_kmer(reads, species="mouse", kmer_index=None):
+    """
+    Count genome hits with the in-process k-mer index instead of Bowtie2.
+
+    A read's hit count is the larger genome count of its first and last k bases.
+
+    :param reads: FASTA formatted string or iterable of (name, sequence) tuples.
+    :param species: Species key in HCRconfig.yaml.
+    :param kmer_index: Optional k-mer index directory override.
+    :return: Generator of (read_name, hit_count) tuples in input order.
+    """
+    if isinstance(reads, str):
+        reads = _fasta_reads(reads)
+    reads = list(reads)
+    index = kmerIndex.KmerIndex(_resolve_kmer_index(species, kmer_index))
+    hits = index.tile_hits([sequence for _, sequence in reads])
+    for (name, _), count in zip(reads, hits):
+        yield name, int(count)
+
+def genomemask_server(reads, socket_path, nAlignments=3, maxOffTargetMismatches=None, offTargets=False):
+    """
+    Count genome hits through a running maskServer worker.
+
+    :param reads: FASTA formatted string or iterable of (name, sequence) tuples.
+    :param socket_path: Unix socket path of the maskServer worker.
+    :param nAlignments: Number of alignments to report per read.
+    :param maxOffTargetMismatches: If given, count only off-target hits with at most this many edits (see HitStats.hitCount).
+    :param offTargets: Count only off-target hits, leaving out the first perfect alignment (see HitStats.offTargets).
+    :return: Generator of (read_name, hit_count) tuples in Bowtie2 output order.
+    :raises RuntimeError: If the worker reports an alignment error.
+    """
+    if isinstance(reads, str):
+        reads = _fasta_reads(reads)
+    response = _server_request(socket_path, {
+        "reads": [[name, sequence] for name, sequence in reads],
+        "nAlignments": nAlignments,
+        "maxOffTargetMismatches": maxOffTargetMismatches,
+        "offTargets": offTargets,
+    })
+    for name, count in response["counts"]:
+        yield name, count
+
+def mask_server_info(socket_path):
+    """
+    Ask a running maskServer worker which index and Bowtie2 options it aligns with.
+
+    :param socket_path: Unix socket path of the maskServer worker.
+    :return: Dict with "index" (absolute prefix), "preset" and "extra_args" (list).
+    :raises RuntimeError: If the worker reports an error.
+    """
+    return _server_request(socket_path, {"info": True})["info"]
+
+def _server_request(socket_path, request):
+    """Send one JSON request to a maskServer worker and return its decoded response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode())
+        with sock.makefile("rb") as handle:
+            response = json.loads(handle.readline())
+    if "error" in response:
+        raise RuntimeError(f"maskServer failed: {response['error']}")
+    return response
+
+def cache_params(nAlignments=3, preset=None, extra_args=None, maxOffTargetMismatches=None, offTargets=False):
+    """
+    Describe the alignment options that determine hit counts, for cache keys.
+
+    Thread count is excluded because it does not change the alignments.
+
+    :param nAlignments: Number of alignments to report per read.
+    :param preset: Optional Bowtie2 sensitivity preset.
+    :param extra_args: Extra Bowtie2 arguments as a string or list.
+    :param maxOffTargetMismatches: Off-target edit distance threshold, if hit counts use one.
+    :param offTargets: Whether the counts are off-target hits only (HitStats.offTargets).
+    :return: Options string.
+    """
+    params = " ".join(_bowtie2_options(nAlignments, threads=1, preset=preset, extra_args=extra_args))
+    if maxOffTargetMismatches is not None:
+        params += f" offtarget-nm<={maxOffTargetMismatches}"
+    if offTargets:
+        params += " offtargets-only"
+    return params
+
+def genomemask_cached(reads, count_hits, cache, index_prefix, params):
+    """
+    Count genome hits using the hit cache, aligning only sequences not cached yet.
+
+    :param reads: List of (name, sequence) tuples.
+    :param count_hits: Callable taking a FASTA string of cache misses and
+        returning an iterable of (read_name, hit_count) tuples.
+    :param cache: HitCache instance.
+    :param index_prefix: Bowtie2 index prefix the counts are produced against.
+    :param params: Alignment options string (see ``cache_params``).
+    :return: Dict mapping read name to hit count, in ``reads`` order.
+    """
+    index_key = hitCache.index_checksum(index_prefix)
+    if index_key is None:
+        return dict(count_hits("\n".join(f">{name}\n{sequence}" for name, sequence in reads)))
+    cached = cache.lookup(index_key, params, (sequence for _, sequence in reads))
+    misses = [(name, sequence) for name, sequence in reads if sequence.lower() not in cached]
+    aligned = {}
+    if misses:
+        aligned = dict(count_hits("\n".join(f">{name}\n{sequence}" for name, sequence in misses)))
+        cache.store(index_key, params, {sequence: aligned[name] for name, sequence in misses if name in aligned}, index_prefix)
+    counts = {}
+    for name, sequence in reads:
+        if sequence.lower() in cached:
+            counts[name] = cached[sequence.lower()]
+        elif name in aligned:
+            counts[name] = aligned[name]
+    return counts
+
+class HitStats:
+    """Per-read alignment statistics collected in one pass over Bowtie2 output.
+
+    One alignment is designated on-target: the first alignment overlapping
+    ``region`` when a target region is known, otherwise the first perfect
+    (NM:i:0) alignment, which is the tile's own locus for a target taken from
+    the reference.  Every other alignment is an off-target hit and its edit
+    distance is kept in ``offTargetMismatches``.
+    """
+
+    __slots__ = ("name", "hits", "bestScore", "secondScore", "onTarget", "offTargetMismatches", "region")
+
+    def __init__(self, name, region=None):
+        """
+        Start statistics for one read.
+
+        :param name: Read name.
+        :param region: Optional (reference name, start, end) of the target locus (1-based, inclusive).
+        """
+        self.name = name
+        self.hits = 0
+        self.bestScore = None
+        self.secondScore = None
+        self.onTarget = False
+        self.offTargetMismatches = []
+        self.region = region
+
+    def _addScore(self, score):
+        if score is None:
+            return
+        if self.bestScore is None or score > self.bestScore:
+            self.bestScore, self.secondScore = score, self.bestScore
+        elif self.secondScore is None or score > self.secondScore:
+            self.secondScore = score
+
+    def add(self, flag, reference, pos, score=None, mismatches=None, secondScore=None):
+        """
+        Add one SAM record of this read.
+
+        :param flag: SAM flag.
+        :param reference: Reference sequence name.
+        :param pos: 1-based leftmost mapping position.
+        :param score: AS:i alignment score, if present.
+        :param mismatches: NM:i edit distance, if present.
+        :param secondScore: XS:i second-best score reported by the aligner, if present.
+        :return: None.
+        """
+        if flag & 4:
+            return
+        self.hits += 1
+        self._addScore(score)
+        if secondScore is not None and (self.secondScore is None or secondScore > self.secondScore):
+            self.secondScore = secondScore
+        if not self.onTarget and self._isTarget(reference, pos, mismatches):
+            self.onTarget = True
+        else:
+            self.offTargetMismatches.append(mismatches)
+
+    def _isTarget(self, reference, pos, mismatches):
+        if self.region is not None:
+            chrom, start, end = self.region
+            return reference == chrom and start <= pos <= end
+        return mismatches == 0
+
+    def offTargets(self, maxMismatches=None):
+        """
+        Count off-target hits, optionally only those with at most ``maxMismatches`` edits.
+
+        Hits without an NM tag are always counted.
+
+        :param maxMismatches: Edit distance threshold (None counts every off-target hit).
+        :return: Number of off-target hits.
+        """
+        if maxMismatches is None:
+            return len(self.offTargetMismatches)
+        return sum(1 for nm in self.offTargetMismatches if nm is None or nm <= maxMismatches)
+
+    def hitCount(self, maxMismatches=None):
+        """
+        Return the hit count used for genome-mask filtering.
+
+        :param maxMismatches: If given, ignore off-target hits with more edits than this.
+        :return: All alignments, or the on-target hit plus close off-target hits.
+        """
+        if maxMismatches is None:
+            return self.hits
+        return int(self.onTarget) + self.offTargets(maxMismatches)
+
+    def __repr__(self):
+        return (f"HitStats({self.name!r}, hits={self.hits}, bestScore={self.bestScore}, "
+                f"secondScore={self.secondScore}, onTarget={self.onTarget}, "
+                f"offTargetMismatches={self.offTargetMismatches})")
+
+def _parse_sam_line(line):
+    """
+    Parse the fields of a SAM text line needed for hit statistics.
+
+    :param line: SAM alignment line.
+    :return: (name, flag, reference, pos, AS, NM, XS) with missing tags as None, or None for header/blank lines.
+    """
+    if not line or line[0] == "@":
+        return None
+    fields = line.rstrip("\n").split("\t")
+    if len(fields) < 4:
+        return None
+    tags = {}
+    for tag in fields[11:]:
+        if tag[:2] in ("AS", "NM", "XS") and tag[3:5] == "i:":
+            tags[tag[:2]] = int(tag[5:])
+    return fields[0], int(fields[1]), fields[2], int(fields[3]), tags.get("AS"), tags.get("NM"), tags.get("XS")
+
+def _group_hit_stats(records, regions=None):
+    """
+    Collect HitStats from consecutive per-read alignment records.
+
+    :param records: Iterable of (name, flag, reference, pos, AS, NM, XS) tuples.
+    :param regions: Optional dict mapping read name to its target (reference, start, end).
+    :return: Generator of HitStats, one per read, yielded as soon as the read is complete.
+    """
+    regions = regions or {}
+    current = None
+    for name, flag, reference, pos, score, mismatches, secondScore in records:
+        if current is None or name != current.name:
+            if current is not None:
+                yield current
+            current = HitStats(name, regions.get(name))
+        current.add(flag, reference, pos, score, mismatches, secondScore)
+    if current is not None:
+        yield current
+
+def hitStatsFromSamLines(lines, regions=None):
+    """
+    Stream HitStats from SAM text lines (e.g. Bowtie2 stdout).
+
+    :param lines: Iterable of SAM lines (header lines are skipped).
+    :param regions: Optional dict mapping read name to its target (reference, start, end).
+    :return: Generator of HitStats in output order.
+    """
+    records = (record for record in map(_parse_sam_line, lines) if record is not None)
+    return _group_hit_stats(records, regions)
+
+def hitStatsFromSam(samFile, regions=None):
+    """
+    Stream HitStats from a SAM or BAM file without requiring an index.
+
+    :param samFile: Path to a SAM or BAM file (format detected by pysam).
+    :param regions: Optional dict mapping read name to its target (reference, start, end).
+    :return: Generator of HitStats in file order.
+    """
+    def records():
+        import pysam
+
+        with pysam.AlignmentFile(samFile) as sam:
+            for read in sam.fetch(until_eof=True):
+                tags = dict((tag, value) for tag, value in read.get_tags() if tag in ("AS", "NM", "XS"))
+                reference = None if read.is_unmapped else read.reference_name
+                yield (read.query_name, read.flag, reference, read.reference_start + 1,
+                       tags.get("AS"), tags.get("NM"), tags.get("XS"))
+    return _group_hit_stats(records(), regions)
+
+def countHitsFromSamLines(lines):
+    """
+    Count alignments per read from SAM text lines, yielding each read once complete.
+
+    Bowtie2 reports all alignments of a read consecutively, so a read's count
+    is final as soon as the next read name appears.
+
+    :param lines: Iterable of SAM lines (header lines are skipped).
+    :return: Generator of (read_name, hit_count) tuples.
+    """
+    current = None
+    count = 0
+    for line in lines:
+        if not line or line[0] == "@":
+            continue
+        fields = line.split("\t", 2)
+        if len(fields) < 2:
+            continue
+        name = fields[0]
+        if name != current:
+            if current is not None:
+                yield current, count
+            current = name
+            count = 0
+        if not int(fields[1]) & 4:
+            count += 1
+    if current is not None:
+        yield current, count
 
 def countHitsFromSam(samFile):
     '''
-    For each read in the sam file, add 1 to the count of hits for that read
-    
-    :param samFile: the name of the sam file
+    For each read in the SAM or BAM file, count its aligned records
+
+    Reads are streamed in file order, so no BAM index is needed.  Only the
+    name and flag of each record are read; use hitStatsFromSam when
+    alignment scores or edit distances are needed.
+
+    :param samFile: the name of the SAM/BAM file
     :return: A dictionary with the read name as the key and the number of hits as the value.
     '''
-    hitCounts = defaultdict(int)
-    sam = pysam.AlignmentFile(samFile,"r")
-    for read in sam.fetch():
-        #print(read.get_tag(tag="TM:i")) # This doesn't work because pysam doesn't read the XS:i: tag
-        if read.is_unmapped:
-            hitCounts[read.query_name] += 0
-        else:
-            hitCounts[read.query_name] += 1
+    hitCounts = {}
+    with open(samFile, "rb") as handle:
+        compressed = handle.read(2) == b"\x1f\x8b"
+    if compressed:
+        import pysam
+
+        with pysam.AlignmentFile(samFile) as sam:
+            for read in sam.fetch(until_eof=True):
+                hitCounts[read.query_name] = hitCounts.get(read.query_name, 0) + (not read.is_unmapped)
+        return hitCounts
+    with open(samFile) as handle:
+        for name, count in countHitsFromSamLines(handle):
+            hitCounts[name] = hitCounts.get(name, 0) + count
     return hitCounts
 
 def test():
@@ -178,6 +649,9 @@ def install_index(url='https://genome-idx.s3.amazonaws.com/bt/mm10.zip', genome=
     parser.add_argument("--config", default=get_config_path(), help="Path to HCRconfig.yaml")
     parser.add_argument("--force", action="store_true", help="Overwrite existing species entry")
     args = parser.parse_args()
+    import urllib.request
+    from zipfile import ZipFile
+
     print(f'Downloading Bowtie2 index from {args.url} ...')
     index_folder = os.path.abspath(args.indices_dir)
     os.makedirs(index_folder, exist_ok=True)
@@ -0,0 +1,212 @@
+"""Persistent cache of Bowtie2 genome hit counts keyed by tile sequence.
+
+Re-running a target with different GC/Gibbs/probe-count settings re-aligns
+the same tiles against the same index.  ``HitCache`` stores the hit count of
+every aligned sequence in an SQLite database under the user data directory,
+keyed by a fingerprint of the index files, the alignment options and the
+sequence, so only unseen sequences need to be sent to Bowtie2.
+
+Entries are evicted least-recently-used once the cache exceeds its size
+limit.  Rebuilding an index changes its fingerprint (file sizes and
+modification times), which makes old entries unreachable; ``invalidate_index``
+removes them outright and is called by ``build_bowtie2_index``.
+"""
+
+import glob
+import hashlib
+import os
+import time
+
+from ._datadir import get_data_dir
+
+DEFAULT_MAX_ENTRIES = 1000000
+_QUERY_CHUNK = 500  # Stay below SQLite's bound-parameter limit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hits (
+    index_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    UNIQUE (index_key, params, sequence)
+);
+CREATE INDEX IF NOT EXISTS hits_last_used ON hits (last_used);
+CREATE TABLE IF NOT EXISTS indices (
+    prefix TEXT PRIMARY KEY,
+    index_key TEXT NOT NULL
+);
+"""
+
+
+def get_hit_cache_path():
+    """
+    Return the path to the hit-count cache database.
+
+    :return: Absolute path to the SQLite file.
+    """
+    return os.path.join(get_data_dir(), "hitCache.sqlite")
+
+
+def index_files(index_prefix):
+    """
+    List the files of a Bowtie2 index.
+
+    Only ``<prefix>.N.bt2[l]`` and ``<prefix>.rev.N.bt2[l]`` match, so a
+    sibling index sharing the prefix (``mm10`` vs ``mm10_ercc``) is not
+    picked up.
+
+    :param index_prefix: Bowtie2 index prefix.
+    :return: Sorted list of index file paths.
+    """
+    prefix = glob.escape(index_prefix)
+    files = []
+    for middle in (".", ".rev."):
+        for suffix in (".bt2", ".bt2l"):
+            files.extend(glob.glob(f"{prefix}{middle}[0-9]{suffix}"))
+    return sorted(files)
+
+
+def index_checksum(index_prefix):
+    """
+    Fingerprint a Bowtie2 index from the names, sizes and mtimes of its files.
+
+    :param index_prefix: Bowtie2 index prefix.
+    :return: Hex digest, or None if no index files exist.
+    """
+    files = index_files(index_prefix)
+    if not files:
+        return None
+    digest = hashlib.sha1()
+    for fname in files:
+        stat = os.stat(fname)
+        digest.update(f"{os.path.basename(fname)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class HitCache:
+    """SQLite-backed LRU map of (index, alignment params, sequence) to hit count."""
+
+    def __init__(self, path=None, maxEntries=DEFAULT_MAX_ENTRIES):
+        """
+        Open (and create if needed) the cache database.
+
+        :param path: Database path (default: ``get_hit_cache_path()``).
+        :param maxEntries: Maximum number of cached sequences before LRU eviction.
+        """
+        self.path = path or get_hit_cache_path()
+        self.maxEntries = maxEntries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        import sqlite3  # Deferred: the CLIs read DEFAULT_MAX_ENTRIES while building their parsers
+
+        self._conn = sqlite3.connect(self.path)
+        self._conn.executescript(_SCHEMA)
+        # Row count for eviction, kept up to date by store() instead of counting every call
+        self._count = len(self)
+
+    def close(self):
+        """Close the database connection."""
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        """Return the number of cached sequences across all indices."""
+        return self._conn.execute("SELECT COUNT(*) FROM hits").fetchone()[0]
+
+    def lookup(self, indexKey, params, sequences):
+        """
+        Fetch cached hit counts and mark them as recently used.
+
+        :param indexKey: Index fingerprint from ``index_checksum``.
+        :param params: Alignment options string the counts were produced with.
+        :param sequences: Iterable of sequences (case-insensitive).
+        :return: Dict mapping lowercase sequence to hit count for cache hits only.
+        """
+        sequences = list({sequence.lower() for sequence in sequences})
+        found = {}
+        for i in range(0, len(sequences), _QUERY_CHUNK):
+            chunk = sequences[i:i + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT sequence, hits FROM hits WHERE index_key = ? AND params = ? AND sequence IN ({placeholders})",
+                [indexKey, params, *chunk],
+            )
+            found.update(rows)
+        if found:
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE hits SET last_used = ? WHERE index_key = ? AND params = ? AND sequence = ?",
+                    [(now, indexKey, params, sequence) for sequence in found],
+                )
+        return found
+
+    def store(self, indexKey, params, counts, indexPrefix=None):
+        """
+        Insert or refresh hit counts, then evict least-recently-used entries over the limit.
+
+        :param indexKey: Index fingerprint from ``index_checksum``.
+        :param params: Alignment options string the counts were produced with.
+        :param counts: Dict mapping sequence to hit count.
+        :param indexPrefix: Index prefix to associate with ``indexKey`` for invalidation.
+        :return: None.
+        """
+        now = time.time()
+        with self._conn:
+            if indexPrefix:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO indices (prefix, index_key) VALUES (?, ?)",
+                    (os.path.abspath(indexPrefix), indexKey),
+                )
+            rows = [(int(hits), now, indexKey, params, sequence.lower()) for sequence, hits in counts.items()]
+            self._conn.executemany(
+                "UPDATE hits SET hits = ?, last_used = ? WHERE index_key = ? AND params = ? AND sequence = ?",
+                rows,
+            )
+            self._count += self._conn.executemany(
+                "INSERT OR IGNORE INTO hits (hits, last_used, index_key, params, sequence) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            ).rowcount
+            excess = self._count - self.maxEntries
+            if excess > 0:
+                self._count -= self._conn.execute(
+                    "DELETE FROM hits WHERE rowid IN (SELECT rowid FROM hits ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                ).rowcount
+
+    def invalidate_index(self, indexPrefix):
+        """
+        Drop every cached count produced against an index prefix.
+
+        :param indexPrefix: Bowtie2 index prefix.
+        :return: Number of cache entries removed.
+        """
+        prefix = os.path.abspath(indexPrefix)
+        with self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM hits WHERE index_key IN (SELECT index_key FROM indices WHERE prefix = ?)",
+                (prefix,),
+            ).rowcount
+            self._conn.execute("DELETE FROM indices WHERE prefix = ?", (prefix,))
+        self._count -= removed
+        return removed
+
+
+def invalidate_index(indexPrefix, path=None):
+    """
+    Remove cached hit counts for an index from the default cache, if it exists.
+
+    :param indexPrefix: Bowtie2 index prefix.
+    :param path: Database path (default: ``get_hit_cache_path()``).
+    :return: Number of cache entries removed.
+    """
+    path = path or get_hit_cache_path()
+    if not os.path.exists(path):
+        return 0
+    with HitCache(path) as cache:
+        return cache.invalidate_index(indexPrefix)
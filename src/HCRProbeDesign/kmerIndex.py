@@ -0,0 +1,266 @@
+"""On-disk sorted k-mer index for exact genome uniqueness checks without Bowtie2.
+
+Every k-mer of the reference is packed into a ``uint64`` (2 bits per base) in
+canonical form (the smaller of the k-mer and its reverse complement), so both
+strands are covered by one lookup.  K-mers are hashed into shards; each shard
+is stored as a sorted array of distinct k-mers (``kmers_XXX.npy``) with their
+genome occurrence counts (``counts_XXX.npy``).  Lookups memory-map only the
+shards they touch and use binary search, so a mammalian genome index needs
+neither to fit in memory nor an external aligner to query.
+
+Tiles are checked by their two halves: a tile's hit count is the larger of
+the genome counts of its first and last ``k`` bases.
+"""
+
+import gzip
+import hashlib
+import os
+
+import numpy as np
+import yaml
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import tiling
+
+DEFAULT_K = 26  # Half of the default 52-nt tile
+DEFAULT_SHARDS = 256
+CHUNK_SIZE = 1 << 22  # Bases encoded per pass while building
+META_FILE = "meta.yaml"
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _canonical(windows):
+    """
+    Pack rows of base codes into canonical 2-bit k-mers.
+
+    :param windows: (n, k) array of base codes (rows containing N must be discarded by the caller).
+    :return: uint64 array of length n.
+    """
+    n, k = windows.shape
+    forward = np.zeros(n, dtype=np.uint64)
+    reverse = np.zeros(n, dtype=np.uint64)
+    two = np.uint64(2)
+    for j in range(k):
+        column = np.minimum(windows[:, j], 3).astype(np.uint64)
+        forward = (forward << two) | column
+        reverse |= (np.uint64(3) - column) << np.uint64(2 * j)
+    return np.minimum(forward, reverse)
+
+
+def sequence_kmers(codes, k):
+    """
+    Return the canonical k-mers of every N-free window of an encoded sequence.
+
+    :param codes: uint8 base codes (see ``tiling.encode``).
+    :param k: K-mer length (at most 32).
+    :return: uint64 array of canonical k-mers.
+    """
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    valid = tiling.window_counts(codes == tiling.MASK_CODE, k) == 0
+    return _canonical(sliding_window_view(codes, k))[valid]
+
+
+def shard_of(kmers, nShards):
+    """
+    Assign k-mers to shards with a multiplicative hash.
+
+    :param kmers: uint64 array of canonical k-mers.
+    :param nShards: Number of shards (a power of two).
+    :return: int64 array of shard numbers.
+    """
+    if nShards == 1:
+        return np.zeros(len(kmers), dtype=np.int64)
+    shift = np.uint64(64 - (nShards.bit_length() - 1))
+    return ((kmers * _HASH_MULTIPLIER) >> shift).astype(np.int64)
+
+
+def _shard_files(outDir, shard):
+    return (
+        os.path.join(outDir, f"kmers_{shard:03d}.npy"),
+        os.path.join(outDir, f"counts_{shard:03d}.npy"),
+    )
+
+
+def index_checksum(path):
+    """
+    Fingerprint a k-mer index from the names, sizes and mtimes of its metadata and shard files.
+
+    :param path: Index directory.
+    :return: Hex digest, or None if the directory has no index metadata.
+    """
+    metaPath = os.path.join(path, META_FILE)
+    if not os.path.exists(metaPath):
+        return None
+    digest = hashlib.sha1()
+    for fname in sorted(os.listdir(path)):
+        if fname == META_FILE or fname.endswith(".npy"):
+            stat = os.stat(os.path.join(path, fname))
+            digest.update(f"{fname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def iter_fasta_chunks(path, chunkSize=CHUNK_SIZE, overlap=0):
+    """
+    Stream a (optionally gzip-compressed) FASTA file as encoded chunks.
+
+    Consecutive chunks of the same record share ``overlap`` bases so windows
+    spanning a chunk boundary are not lost; windows never span records.
+
+    :param path: FASTA path (``.gz`` is read through gzip).
+    :param chunkSize: Approximate number of bases per chunk.
+    :param overlap: Number of bases repeated at the start of the next chunk.
+    :return: Generator of uint8 base-code arrays.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as handle:
+        pieces = []
+        size = 0
+        fresh = 0  # Bases not yet emitted in a previous chunk
+        for line in handle:
+            if line.startswith(">"):
+                if fresh:
+                    yield tiling.encode("".join(pieces))
+                pieces, size, fresh = [], 0, 0
+                continue
+            line = line.strip()
+            pieces.append(line)
+            size += len(line)
+            fresh += len(line)
+            if size >= chunkSize:
+                chunk = "".join(pieces)
+                yield tiling.encode(chunk)
+                tail = chunk[len(chunk) - overlap:] if overlap else ""
+                pieces, size, fresh = [tail], len(tail), 0
+        if fresh:
+            yield tiling.encode("".join(pieces))
+
+
+def build_kmer_index(fasta_paths, outDir, k=DEFAULT_K, nShards=DEFAULT_SHARDS, chunkSize=CHUNK_SIZE):
+    """
+    Build a sharded sorted k-mer count index from FASTA files.
+
+    K-mers are first spilled unsorted to one temporary file per shard, then
+    each shard is sorted and collapsed into distinct k-mers and counts, so
+    peak memory is bounded by one chunk or one shard.
+
+    :param fasta_paths: List of FASTA paths (plain or gzip).
+    :param outDir: Output directory (created if needed).
+    :param k: K-mer length (1-32).
+    :param nShards: Number of shards (a power of two).
+    :param chunkSize: Bases encoded per pass.
+    :return: Output directory.
+    :raises ValueError: If k or nShards is out of range.
+    """
+    if not 1 <= k <= 32:
+        raise ValueError("k must be between 1 and 32")
+    if nShards < 1 or nShards & (nShards - 1):
+        raise ValueError("nShards must be a power of two")
+    os.makedirs(outDir, exist_ok=True)
+    spill = [os.path.join(outDir, f"spill_{shard:03d}.bin") for shard in range(nShards)]
+    for fname in spill:
+        open(fname, "wb").close()
+
+    total = 0
+    for path in fasta_paths:
+        for codes in iter_fasta_chunks(path, chunkSize=chunkSize, overlap=k - 1):
+            kmers = sequence_kmers(codes, k)
+            total += len(kmers)
+            shards = shard_of(kmers, nShards)
+            order = np.argsort(shards, kind="stable")
+            bounds = np.searchsorted(shards[order], np.arange(nShards + 1))
+            for shard in np.flatnonzero(np.diff(bounds)):
+                with open(spill[shard], "ab") as handle:
+                    kmers[order[bounds[shard]:bounds[shard + 1]]].tofile(handle)
+
+    distinct = 0
+    for shard, fname in enumerate(spill):
+        kmers, counts = np.unique(np.fromfile(fname, dtype=np.uint64), return_counts=True)
+        kmerFile, countFile = _shard_files(outDir, shard)
+        np.save(kmerFile, kmers)
+        np.save(countFile, counts.astype(np.uint32))
+        distinct += len(kmers)
+        os.remove(fname)
+
+    meta = {
+        "k": k,
+        "shards": nShards,
+        "kmers": total,
+        "distinct_kmers": distinct,
+        "sources": [os.path.abspath(path) for path in fasta_paths],
+    }
+    with open(os.path.join(outDir, META_FILE), "w") as handle:
+        yaml.safe_dump(meta, handle, sort_keys=False)
+    return outDir
+
+
+class KmerIndex:
+    """Read-only view of a sharded k-mer count index built by ``build_kmer_index``."""
+
+    def __init__(self, path):
+        """
+        Open an index directory; shards are memory-mapped on first use.
+
+        :param path: Index directory.
+        :raises FileNotFoundError: If the directory has no index metadata.
+        """
+        metaPath = os.path.join(path, META_FILE)
+        if not os.path.exists(metaPath):
+            raise FileNotFoundError(f"No k-mer index found at {path}")
+        with open(metaPath) as handle:
+            self.meta = yaml.safe_load(handle)
+        self.path = path
+        self.k = int(self.meta["k"])
+        self.nShards = int(self.meta["shards"])
+        self._shards = {}
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            kmerFile, countFile = _shard_files(self.path, shard)
+            self._shards[shard] = (np.load(kmerFile, mmap_mode="r"), np.load(countFile, mmap_mode="r"))
+        return self._shards[shard]
+
+    def count(self, kmers):
+        """
+        Look up genome occurrence counts of canonical k-mers.
+
+        :param kmers: uint64 array of canonical k-mers.
+        :return: uint32 array of counts (0 for absent k-mers).
+        """
+        kmers = np.asarray(kmers, dtype=np.uint64)
+        counts = np.zeros(len(kmers), dtype=np.uint32)
+        shards = shard_of(kmers, self.nShards)
+        for shard in np.unique(shards):
+            selected = np.flatnonzero(shards == shard)
+            keys, values = self._shard(int(shard))
+            if not len(keys):
+                continue
+            query = kmers[selected]
+            pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+            found = np.asarray(keys[pos]) == query
+            counts[selected[found]] = values[pos[found]]
+        return counts
+
+    def tile_hits(self, sequences):
+        """
+        Count genome hits of tiles as the larger count of their two k-length halves.
+
+        Halves containing non-ACGT bases count as 0 hits.
+
+        :param sequences: Iterable of tile sequences, each at least ``k`` long.
+        :return: int64 array with one hit count per tile.
+        :raises ValueError: If a sequence is shorter than ``k``.
+        """
+        encoded = [tiling.encode(sequence) for sequence in sequences]
+        if not encoded:
+            return np.zeros(0, dtype=np.int64)
+        if min(len(codes) for codes in encoded) < self.k:
+            raise ValueError(f"Tiles must be at least {self.k} nt for this k-mer index")
+        hits = np.zeros(len(encoded), dtype=np.int64)
+        for half in (np.stack([codes[:self.k] for codes in encoded]), np.stack([codes[-self.k:] for codes in encoded])):
+            valid = ~(half == tiling.MASK_CODE).any(axis=1)
+            counts = np.zeros(len(encoded), dtype=np.int64)
+            counts[valid] = self.count(_canonical(half[valid]))
+            hits = np.maximum(hits, counts)
+        return hits
@@ -72,6 +72,7 @@ def list_references(config_path=None):
             "absolute_path": abs_path,
             "index_files": index_files,
             "installed": len(index_files) > 0,
+            "kmer_index": entry.get("kmer_index"),
         })
 
     return {"species": species_info, "default_params": default_params}
@@ -109,6 +110,8 @@ def format_references(info):
                 lines.append(f"      Index files   : {len(sp['index_files'])} files")
             else:
                 lines.append("      Index files   : none found")
+            if sp.get("kmer_index"):
+                lines.append(f"      K-mer index   : {sp['kmer_index']} (--mask-engine kmer)")
             lines.append(f"      CLI usage     : designProbes --species {sp['name']}")
 
     lines.append("")
@@ -132,6 +135,9 @@ def format_references(info):
             "maxProbes": "--maxProbes",
             "maxRunMismatches": "--maxRunMismatches",
             "num_hits_allowed": "--num_hits_allowed",
+            "bowtie2_threads": "--bowtie2-threads",
+            "bowtie2_preset": "--bowtie2-preset",
+            "bowtie2_args": "--bowtie2-args",
         }
         for key, value in default_params.items():
             flag = param_flags.get(key, f"--{key}")
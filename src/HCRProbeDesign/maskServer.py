@@ -0,0 +1,178 @@
+"""Long-running genome masking worker that keeps the Bowtie2 index warm.
+
+Every ``designProbes`` run normally pays for Bowtie2 loading the genome index
+from disk.  ``maskServer`` memory-maps the index files once and keeps them
+resident, then aligns each batch it receives with ``bowtie2 --mm`` so the
+aligner maps the already-cached index instead of reading it again.  Clients
+talk to it over a Unix socket with one JSON request/response per line::
+
+    {"reads": [["name", "ACGT..."], ...], "nAlignments": 3}
+    {"counts": [["name", 1], ...]}
+
+Reads are always aligned with the server's own index and Bowtie2 options.
+Clients learn them with an info request, so they can key cached hit counts on
+what was actually used::
+
+    {"info": true}
+    {"info": {"index": "/data/mm10/mm10", "preset": null, "extra_args": []}}
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shlex
+import socketserver
+import sys
+
+from . import genomeMask
+from . import hitCache
+from ._datadir import ensure_data_dir, get_mask_socket_path
+
+
+def _map_index(index_path):
+    """
+    Memory-map every Bowtie2 index file for a prefix and ask the kernel to prefetch it.
+
+    :param index_path: Bowtie2 index prefix.
+    :return: List of open mmap objects (keep references to keep pages mapped).
+    :raises FileNotFoundError: If no index files exist for the prefix.
+    """
+    maps = []
+    for fname in hitCache.index_files(index_path):
+        if os.path.getsize(fname) == 0:
+            continue
+        with open(fname, "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+            mapped.madvise(mmap.MADV_WILLNEED)
+        maps.append(mapped)
+    if not maps:
+        raise FileNotFoundError(f"No Bowtie2 index files found for prefix {index_path}")
+    return maps
+
+
+class _MaskRequestHandler(socketserver.StreamRequestHandler):
+    """Answer newline-delimited JSON alignment requests on one connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get("info"):
+                    response = {"info": self.server.info()}
+                else:
+                    response = {"counts": self.server.align(request)}
+            except Exception as err:  # Report failures to the client instead of dropping the worker
+                response = {"error": f"{type(err).__name__}: {err}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class MaskServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running Bowtie2 against a memory-resident index."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, index_path, threads=1, preset=None, extra_args=None):
+        """
+        Map the index and bind the socket.
+
+        :param socket_path: Unix socket path to listen on (a stale file is replaced).
+        :param index_path: Resolved Bowtie2 index prefix.
+        :param threads: Bowtie2 threads per batch.
+        :param preset: Optional Bowtie2 sensitivity preset.
+        :param extra_args: Extra Bowtie2 arguments as a string or list.
+        """
+        self.index_path = index_path
+        self.threads = threads
+        self.preset = preset
+        if isinstance(extra_args, str):
+            extra_args = shlex.split(extra_args)
+        self.user_args = list(extra_args or [])
+        self.extra_args = self.user_args + ["--mm"]
+        self._index_maps = _map_index(index_path)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _MaskRequestHandler)
+
+    def info(self):
+        """
+        Describe the index and options every batch is aligned with.
+
+        ``--mm`` and the thread count are left out because they do not change
+        the alignments.
+
+        :return: Dict with "index", "preset" and "extra_args".
+        """
+        return {"index": self.index_path, "preset": self.preset, "extra_args": self.user_args}
+
+    def align(self, request):
+        """
+        Align one batch of reads.
+
+        :param request: Dict with "reads" ([name, sequence] pairs) and optional
+            "nAlignments", "maxOffTargetMismatches" and "offTargets".
+        :return: List of [read_name, hit_count] pairs in Bowtie2 output order.
+        """
+        reads = [(name, sequence) for name, sequence in request["reads"]]
+        maxMismatches = request.get("maxOffTargetMismatches")
+        if maxMismatches is not None:
+            maxMismatches = int(maxMismatches)
+        offTargets = bool(request.get("offTargets"))
+        results = genomeMask.genomemask_stream(
+            reads,
+            index=self.index_path,
+            nAlignments=int(request.get("nAlignments", 3)),
+            threads=self.threads,
+            preset=self.preset,
+            extra_args=self.extra_args,
+            stats=maxMismatches is not None or offTargets,
+        )
+        if offTargets:
+            return [[name, stats.offTargets(maxMismatches)] for name, stats in results]
+        if maxMismatches is None:
+            return [[name, count] for name, count in results]
+        return [[name, stats.hitCount(maxMismatches)] for name, stats in results]
+
+    def server_close(self):
+        """Close the socket, remove its file and release the index mappings."""
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        for mapped in self._index_maps:
+            mapped.close()
+        self._index_maps = []
+
+
+def main():
+    """CLI entry point for the warm genome masking worker."""
+    parser = argparse.ArgumentParser(
+        description="Keep a Bowtie2 genome index warm and serve genome masking requests over a Unix socket."
+    )
+    parser.add_argument("-s", "--species", default="mouse", help="Registered species whose index to serve")
+    parser.add_argument("-i", "--index", help="Bowtie2 index prefix (overrides --species)")
+    parser.add_argument("--socket", default=get_mask_socket_path(), help="Unix socket path to listen on")
+    parser.add_argument("--bowtie2-threads", type=int, default=1, help="Bowtie2 threads per batch")
+    parser.add_argument("--bowtie2-preset", default=None, choices=genomeMask.BOWTIE2_PRESETS, help="Bowtie2 sensitivity preset")
+    parser.add_argument("--bowtie2-args", default=None, help="Extra bowtie2 arguments as one quoted string")
+    args = parser.parse_args()
+
+    ensure_data_dir()
+    index_path = genomeMask._index_path(args.species, args.index)
+    server = MaskServer(
+        args.socket,
+        index_path,
+        threads=args.bowtie2_threads,
+        preset=args.bowtie2_preset,
+        extra_args=args.bowtie2_args,
+    )
+    print(f"Serving genome masking for {index_path} on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,151 @@
+"""Stage-level timing and counters for the probe design pipeline.
+
+``designProbes``/``designProbesBatch --metrics FILE`` wrap every pipeline stage
+(scan, homopolymer runs, hairpins, genome masking, GC, Gibbs, dTm, selection)
+in ``stage()``, which appends one JSON object per stage to ``FILE``::
+
+    {"run": "3f9c...", "pid": 4242, "record": "Gapdh", "stage": "hairpin",
+     "status": "ok", "wall_s": 1.93, "cpu_s": 7.41, "peak_rss_mb": 212.5,
+     "children_peak_rss_mb": 95.0, "tiles_in": 1830, "tiles_out": 1544,
+     "time": 1760712000.0}
+
+``cpu_s`` includes finished child processes (bowtie2) and the CPU time that
+the long-lived ``--workers`` pool reports back with every primer3 batch
+(``add_worker_usage``); the pool itself is only reaped at exit, so
+``getrusage`` alone would miss it.  ``children_peak_rss_mb`` likewise covers
+reaped children and the largest peak reported by a pool worker.
+``peak_rss_mb`` is the high-water mark of the process so far, as reported by
+``getrusage``; it cannot go down between stages.  Where ``getrusage`` is not
+available (Windows) the process peaks are reported as null.  Every line of one run shares
+its ``run`` id, so lines from ``--jobs`` worker processes can be grouped, and
+each line is written with a single append so concurrent writers do not
+interleave.
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_RSS_SCALE = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+
+def new_run_id():
+    """
+    Return a short random identifier shared by all metrics lines of one run.
+
+    :return: Hex string.
+    """
+    return uuid.uuid4().hex[:12]
+
+
+# CPU seconds and peak RSS (MB) reported by worker processes that are still alive
+_workerCpu = 0.0
+_workerPeakRss = 0.0
+
+
+def add_worker_usage(cpuSeconds, peakRssMb):
+    """
+    Account for work done in a long-lived worker process (e.g. one primer3 batch).
+
+    :param cpuSeconds: CPU seconds the worker spent on the batch.
+    :param peakRssMb: Peak RSS of the worker so far, in MB (None if unknown).
+    :return: None.
+    """
+    global _workerCpu, _workerPeakRss
+    _workerCpu += cpuSeconds
+    if peakRssMb is not None:
+        _workerPeakRss = max(_workerPeakRss, peakRssMb)
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system + _workerCpu
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process and of its children.
+
+    :return: Tuple of (self peak MB, children peak MB); children are reaped processes and reporting workers.
+        Peaks that cannot be measured on this platform are None.
+    """
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None, (round(_workerPeakRss, 1) if _workerPeakRss else None)
+    selfPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _RSS_SCALE
+    childPeak = max(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / _RSS_SCALE, _workerPeakRss)
+    return round(selfPeak, 1), round(childPeak, 1)
+
+
+class Stage:
+    """Counters of one running stage; set ``tilesOut`` (and ``tilesIn``) before the stage ends."""
+
+    __slots__ = ("name", "record", "tilesIn", "tilesOut")
+
+    def __init__(self, name, record=None, tilesIn=None):
+        self.name = name
+        self.record = record
+        self.tilesIn = tilesIn
+        self.tilesOut = None
+
+
+def write_line(path, entry):
+    """
+    Append one JSON line to a metrics file with a single write.
+
+    :param path: Metrics file path.
+    :param entry: JSON-serializable dict.
+    :return: None.
+    """
+    line = json.dumps(entry, default=str) + "\n"
+    with open(path, "a") as handle:
+        handle.write(line)
+
+
+@contextmanager
+def stage(path, name, record=None, run=None, tilesIn=None):
+    """
+    Time a pipeline stage and append its metrics line to ``path``.
+
+    When ``path`` is None nothing is measured or written, so callers can wrap
+    stages unconditionally.  A stage that raises is recorded with
+    ``"status": "error"`` and the exception propagates.
+
+    :param path: Metrics file path, or None to disable.
+    :param name: Stage name (e.g. "hairpin").
+    :param record: Record (target) name, or None for stages spanning several records.
+    :param run: Run id from ``new_run_id``.
+    :param tilesIn: Number of tiles entering the stage.
+    :return: Context manager yielding a Stage.
+    """
+    current = Stage(name, record, tilesIn)
+    if path is None:
+        yield current
+        return
+    wallStart = time.perf_counter()
+    cpuStart = _cpu_seconds()
+    status = "error"
+    try:
+        yield current
+        status = "ok"
+    finally:
+        selfPeak, childPeak = peak_rss_mb()
+        write_line(path, {
+            "run": run,
+            "pid": os.getpid(),
+            "record": current.record,
+            "stage": name,
+            "status": status,
+            "wall_s": round(time.perf_counter() - wallStart, 6),
+            "cpu_s": round(_cpu_seconds() - cpuStart, 6),
+            "peak_rss_mb": selfPeak,
+            "children_peak_rss_mb": childPeak,
+            "tiles_in": current.tilesIn,
+            "tiles_out": current.tilesOut,
+            "time": round(time.time(), 3),
+        })
@@ -1,27 +1,52 @@
 #!/usr/bin/env python3
 """Core probe design workflow and CLI entry points."""
-from .tiles import Tile, TileError
 from . import utils
 #import copy
 #import string
 from .utils import pp
 from . import sequencelib
-from . import repeatMask
-from . import genomeMask
 from . import HCR
-from ._datadir import ensure_data_dir, get_config_path
+from . import checkpoint
+from . import fastaIndex
+from . import metrics
+from ._datadir import ensure_data_dir, get_config_path, get_mask_socket_path
+from ._lazy import lazy_import
 #from probeDesign import BLAST
-import sys,re
+import sys,re,shlex
 #from Bio.Seq import Seq
-import primer3
 from string import ascii_uppercase
 import argparse
-from itertools import product
+from itertools import product, repeat
+from contextlib import ExitStack
 import yaml
 import os
+import shutil
+import tempfile
+
+# Heavy modules (NumPy, primer3, pysam, BeautifulSoup, SQLite) load on first use so the CLIs start fast
+tilesModule = lazy_import(f"{__package__}.tiles")
+tiling = lazy_import(f"{__package__}.tiling")
+selection = lazy_import(f"{__package__}.selection")
+repeatMask = lazy_import(f"{__package__}.repeatMask")
+genomeMask = lazy_import(f"{__package__}.genomeMask")
+hitCache = lazy_import(f"{__package__}.hitCache")
+kmerIndex = lazy_import(f"{__package__}.kmerIndex")
+primer3 = lazy_import("primer3")
+np = lazy_import("numpy")
 
 package_directory = os.path.dirname(os.path.abspath(__file__))
 
+# Names once imported eagerly from .tiles, still resolvable as probeDesign.<name> for existing callers
+_TILES_EXPORTS = ("Tile","TileError")
+
+def __getattr__(name):
+	if name in _TILES_EXPORTS:
+		return getattr(tilesModule,name)
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Default --mask-chunk when --checkpoint-dir is set (otherwise the whole panel is masked in one aligner run)
+_CHECKPOINT_MASK_CHUNK = 100
+
 #######################
 # Scan input sequence #
 #######################
@@ -39,29 +64,50 @@ def scanSequence(sequence,seqName,tileStep=1,tileSize=52):
 	:param tileSize: The size of the tile, defaults to 52 (optional)
 	:return: A list of Tile objects
 	'''
-	tiles = []
-	#Pre-compute number of chunks to emit
-	numOfChunks = int(((len(sequence)-tileSize)/tileStep) + 1)
-
-	#Tile across reverse complement of sequence
-	for i in range(0,numOfChunks*tileStep,tileStep):
-		tile = Tile(sequence=sequencelib.reverse_complement(sequence[i:i+tileSize]),seqName=seqName,startPos=i+1)
-		if not tile.isMasked():
-			tiles.append(tile)
-	return tiles
+	#Encode once, tile across reverse complement of sequence and drop windows containing masked bases
+	tileSet = tilesModule.TileSet.fromSequence(sequence,seqName,tileStep=tileStep,tileSize=tileSize)
+	#Only build Tile objects for unmasked windows
+	return tileSet.tiles()
 
 ###################
 # Reporting
 ###################
 
-def outputTable(tiles,outHandle=sys.stdout):
+def outputTable(tiles,outHandle=sys.stdout,workers=1,header=True):
 	"""
-	Formats tile output and writes to outHandle
+	Formats tile output and writes to outHandle (set header=False to append rows to an existing table)
 	"""
 	outputKeys=["name","probe","start","length","P1","P2","channel","GC","Tm","dTm","GibbsFE"]
-	outHandle.write("\t".join(outputKeys)+"\n")
-	for tile in tiles:
-		outHandle.write(f"{tile.name}\t{tile.sequence}\t{tile.start}\t{len(tile)}\t{tile.P1}\t{tile.P2}\t{tile.channel}\t{tile.GC():.2f}\t{primer3.calc_tm(tile.sequence):.2f}\t{tile.dTm:.2f}\t{tile.Gibbs:.2f}\n")
+	if header:
+		outHandle.write("\t".join(outputKeys)+"\n")
+	outHandle.writelines(_tableRows(tiles,workers=workers))
+
+def _tableRows(tiles,workers=1):
+	"""
+	Format output table rows (newline-terminated) for tiles.
+	"""
+	tms = _tileTms(tiles,workers=workers)
+	return [f"{tile.name}\t{tile.sequence}\t{tile.start}\t{len(tile)}\t{tile.P1}\t{tile.P2}\t{tile.channel}\t{tile.GC():.2f}\t{tm:.2f}\t{tile.dTm:.2f}\t{tile.Gibbs:.2f}\n" for tile,tm in zip(tiles,tms)]
+
+def _tileTms(tiles,workers=1):
+	"""
+	Return primer3 Tm for tiles, filling and reusing the Tm column of TileSet-backed tiles.
+	"""
+	tms = [None]*len(tiles)
+	standalone = []
+	tileSets = {}
+	for i,tile in enumerate(tiles):
+		if tile.tileSet is None:
+			standalone.append(i)
+		else:
+			tileSets.setdefault(id(tile.tileSet),(tile.tileSet,[]))[1].append(i)
+	for tileSet,positions in tileSets.values():
+		column = tileSet.calcTm([tiles[i].row for i in positions],workers=workers)
+		for i in positions:
+			tms[i] = float(column[tiles[i].row])
+	for i,tm in zip(standalone,tilesModule.calcTms([tiles[i].sequence for i in standalone],workers=workers)):
+		tms[i] = tm
+	return tms
 
 def outputIDT(tiles,outHandle=sys.stdout):
 	"""
@@ -73,18 +119,19 @@ def outputIDT(tiles,outHandle=sys.stdout):
 	outputKeys = ["name","start","length","P1","P2","channel"]
 	#Header for IDT plate template
 	outHandle.write("\t".join(["Name","Sequence"])+"\n")
-	#One row per oligo (P1='odd', p2='even')
-	odd = []
-	even = []
-	for tile in tiles:
-		odd.append((f"{tile.name}:{tile.channel}:odd",tile.P1))
-		even.append((f"{tile.name}:{tile.channel}:even",tile.P2))
-	
-	for oligo in odd:
-		outHandle.write(f"{oligo[0]}\t{oligo[1]}\n")
-	
-	for oligo in even:
-		outHandle.write(f"{oligo[0]}\t{oligo[1]}\n")
+	odd,even = _idtRows(tiles)
+	outHandle.writelines(odd)
+	outHandle.writelines(even)
+
+def _idtRows(tiles):
+	"""
+	Format IDT template rows, one per oligo (P1='odd', P2='even'); all odd oligos are listed before all even ones.
+
+	:return: Tuple of (odd rows, even rows), newline-terminated.
+	"""
+	odd = [f"{tile.name}:{tile.channel}:odd\t{tile.P1}\n" for tile in tiles]
+	even = [f"{tile.name}:{tile.channel}:even\t{tile.P2}\n" for tile in tiles]
+	return odd,even
 		
 		
 #
@@ -156,33 +203,188 @@ def build_parser():
 	parser.add_argument("--dTmFilter", help="Enable filtering based on dTm between probeset halves.", default=False, action="store_true")
 	parser.add_argument("-g", "--no-genomemask", help="Disables bowtie2 checking for multiple hits to genome", default=True, action="store_false")
 	parser.add_argument("-i","--index", help="Location of bowtie2 index file for genomemask analysis")
+	parser.add_argument("--bowtie2-threads", help="Number of bowtie2 alignment threads (-p)", default=1, type=int)
+	parser.add_argument("--bowtie2-preset", help="bowtie2 sensitivity preset (e.g. very-fast for 52-mers)", default=None, choices=genomeMask.BOWTIE2_PRESETS)
+	parser.add_argument("--bowtie2-args", help="Extra bowtie2 arguments as one quoted string (e.g. --bowtie2-args=\"--end-to-end --no-1mm-upfront\")", default=None)
+	parser.add_argument("--mask-target", help="Genome-mask whole tiles, or align both 25-nt binding arms and filter on their combined off-target hits", choices=["tile","arms"], default="tile")
+	parser.add_argument("--max-arm-offtargets", help="Maximum combined off-target hits of both arms with --mask-target arms", default=0, type=int)
+	parser.add_argument("--mask-engine", help="Genome masking engine: bowtie2 alignment, or exact lookup of both tile halves in a k-mer index (buildGenomeIndex --kmer-index)", choices=["bowtie2","kmer"], default="bowtie2")
+	parser.add_argument("--kmer-index", help="K-mer index directory for --mask-engine kmer (default: registered for --species)", default=None)
+	parser.add_argument("--mask-server", help="Send genome masking to a running maskServer worker (default socket if no path given)", nargs="?", const=get_mask_socket_path(), default=None)
+	parser.add_argument("--no-hit-cache", help="Do not read or update the persistent genome hit-count cache", action="store_false", dest="hit_cache")
+	parser.add_argument("--hit-cache-size", help="Maximum number of sequences kept in the hit-count cache (LRU eviction)", type=int, default=hitCache.DEFAULT_MAX_ENTRIES)
+	parser.add_argument("--genomemask-io", help="Stream reads/alignments through bowtie2 pipes, or write {targetName}_reads.fa and {targetName}.sam files", default="stream", choices=["stream","file"])
 	## Disabling repeat masking by default at this point.  Will likely remove because is in some ways redundant with genomeMask and is also a pain in the ass to maintain.
 	parser.add_argument("-r", "--no-repeatmask", help="Disables repeatmasker masking of target sequence", default=False, action="store_false") # Set default=True to repeatmask by default
 	parser.add_argument("--minGibbs", help="Min allowable GibbsFE", default=-70.0,type=float)
 	parser.add_argument("--maxGibbs", help="Max allowable GibbsFE", default=-50.0,type=float)
 	parser.add_argument("--targetGibbs", help="Target GibbsFE", default=-60.0,type=float)
+	parser.add_argument("--maxHairpinTm", help="Max tolerated melting temperature of predicted hairpins", default=45.0,type=float)
 	parser.add_argument("--maxRunLength", help="Max allowable homopolymer run size", default=7,type=int)
 	parser.add_argument("-n","--maxProbes", help="Max number of probes to return", default=20,type=int)
+	parser.add_argument("--selection", help="Probe selection strategy: greedy picks best-first; optimal maximizes probe count, then minimizes total distance to targetGibbs", default="greedy", choices=["greedy","optimal"])
 	parser.add_argument("--maxRunMismatches", help="Max allowable homopolymer run mismatches", default=2,type=int)
+	parser.add_argument("--runChars", help="Bases checked for homopolymer runs (tile orientation)", default="cg")
 	parser.add_argument("--num-hits-allowed", help="Number of allowable hits to genome", default=1, type=int)
+	parser.add_argument("--max-offtarget-mismatches", help="Only count off-target genome hits with at most this many mismatches (NM) towards --num-hits-allowed; the tile's own perfect hit still counts once", default=None, type=int)
 	parser.add_argument("--idt", help="File name to output tsv format optimized for IDT ordering", type=argparse.FileType('w'), default=None)
+	parser.add_argument("--jobs", help="designProbesBatch: design this many FASTA records concurrently in worker processes", default=1, type=int)
+	parser.add_argument("--mask-chunk", help=f"designProbesBatch: genome-mask this many records per aligner run; each chunk is selected, written and checkpointed before the next starts (default: the whole panel in one run, or {_CHECKPOINT_MASK_CHUNK} with --checkpoint-dir)", default=None, type=int, metavar="RECORDS")
+	recordSelection = parser.add_mutually_exclusive_group()
+	recordSelection.add_argument("--records", help="designProbesBatch: only design the records named in this file (one ID per line, matched to the first word of the FASTA header)", default=None, metavar="IDS_FILE")
+	recordSelection.add_argument("--record-regex", help="designProbesBatch: only design records whose FASTA header matches this regular expression", default=None, metavar="REGEX")
+	parser.add_argument("--checkpoint-dir", help="designProbesBatch: save each finished record to this directory", default=None)
+	parser.add_argument("--resume", help="designProbesBatch: reuse checkpoints of records whose sequence and parameters are unchanged (needs --checkpoint-dir)", action="store_true")
+	parser.add_argument("--workers", help="Number of worker processes for primer3 thermodynamic stages", default=1, type=int)
 	parser.add_argument("--calcPrice", help="Calculate total cost of probe synthesis assuming $0.12 per base", default=False, action="store_true")
+	parser.add_argument("--metrics", help="Append per-stage wall/CPU time, peak RSS and tile counts to this file as JSON lines", default=None, metavar="FILE")
+	parser.set_defaults(metrics_run=None,mask_server_info=None)
+	_apply_config_defaults(parser)
 	return parser
 
 
-def _sanitize_name(name):
+def _start_metrics(parser, args):
 	"""
-	Normalize an input name to a filesystem-friendly token.
+	Tag the run for --metrics and fail early if the metrics file cannot be written.
 
-	:param name: Raw name string.
-	:return: Sanitized name or empty string.
+	:param parser: argparse.ArgumentParser (for error reporting).
+	:param args: Parsed CLI arguments (metrics_run is set in place).
+	:return: None.
 	"""
-	if name is None:
-		return ""
-	name = name.strip()
-	if not name:
-		return ""
-	return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+	if args.metrics is None:
+		return
+	args.metrics_run = metrics.new_run_id()
+	try:
+		open(args.metrics,"a").close()
+	except OSError as err:
+		parser.error(f"--metrics: {err}")
+
+
+def _check_kmer_index(parser, args):
+	"""
+	Fail early if --mask-engine kmer cannot look up the masked sequences.
+
+	Tiles are looked up by their first and last k bases and binding arms
+	(--mask-target arms) the same way, so k may not exceed the length of what
+	is masked: a 25-nt arm needs an index built with --kmer-size 25 or less.
+
+	:param parser: argparse.ArgumentParser (for error reporting).
+	:param args: Parsed CLI arguments.
+	:return: None.
+	"""
+	if not args.no_genomemask or args.mask_engine != "kmer":
+		return
+	try:
+		index = kmerIndex.KmerIndex(genomeMask._resolve_kmer_index(args.species,args.kmer_index))
+	except (ValueError,FileNotFoundError) as err:
+		parser.error(f"--mask-engine kmer: {err}")
+	if args.mask_target == "arms":
+		length,what = len(tilesModule._splitSequence("n"*args.tileSize)[0]),"binding arms"
+	else:
+		length,what = args.tileSize,"tiles"
+	if index.k > length:
+		parser.error(
+			f"--mask-engine kmer: the k-mer index uses k={index.k}, longer than the {length}-nt {what}; "
+			f"build one with buildGenomeIndex --kmer-only --kmer-size {length}"
+		)
+
+
+def _check_mask_server(parser, args):
+	"""
+	Fetch the index and Bowtie2 options of --mask-server and reject conflicting local options.
+
+	The worker always aligns with the index and options it was started with,
+	so a different -i, --bowtie2-preset or --bowtie2-args would be silently
+	ignored.  The worker's settings are kept in ``args.mask_server_info`` to
+	key the hit cache (and checkpoints) on what was actually used.
+
+	:param parser: argparse.ArgumentParser (for error reporting).
+	:param args: Parsed CLI arguments (mask_server_info is set in place).
+	:return: None.
+	"""
+	if not args.no_genomemask or not args.mask_server or args.mask_engine == "kmer":
+		return
+	try:
+		info = genomeMask.mask_server_info(args.mask_server)
+	except (OSError,RuntimeError,ValueError,KeyError) as err:
+		parser.error(f"--mask-server: cannot query maskServer at {args.mask_server}: {err}")
+	conflicts = []
+	if args.index and genomeMask._absolute_index(args.index) != info["index"]:
+		conflicts.append(f"-i {args.index} (server: {info['index']})")
+	if args.bowtie2_preset and args.bowtie2_preset != info["preset"]:
+		conflicts.append(f"--bowtie2-preset {args.bowtie2_preset} (server: {info['preset']})")
+	if args.bowtie2_args is not None and shlex.split(args.bowtie2_args) != info["extra_args"]:
+		conflicts.append(f"--bowtie2-args {args.bowtie2_args!r} (server: {' '.join(map(shlex.quote,info['extra_args']))!r})")
+	if conflicts:
+		parser.error(
+			"--mask-server aligns with the worker's own index and bowtie2 options, which differ from "
+			+ "; ".join(conflicts) + ". Restart maskServer with these options or drop them."
+		)
+	args.mask_server_info = info
+
+
+def _apply_config_defaults(parser):
+	"""
+	Use HCRconfig.yaml default_params as parser defaults (explicit CLI flags still win).
+
+	:param parser: argparse.ArgumentParser instance.
+	:return: None.
+	"""
+	ensure_data_dir()
+	config_path = get_config_path()
+	if not os.path.exists(config_path):
+		return
+	with open(config_path, "r") as file:
+		config = yaml.safe_load(file) or {}
+	default_params = config.get("default_params", {}) or {}
+	defaults = {}
+	for action in parser._actions:
+		if action.dest in default_params:
+			defaults[action.dest] = _config_default(parser, action, default_params[action.dest], config_path)
+	parser.set_defaults(**defaults)
+
+
+def _config_default(parser, action, value, config_path):
+	"""
+	Check a default_params value the way argparse checks the matching command-line option.
+
+	Values are converted with the option's ``type`` and checked against its
+	``choices``; on/off flags take booleans.  File options are left as paths
+	for argparse to open when the arguments are parsed.
+
+	:param parser: argparse.ArgumentParser (for error reporting).
+	:param action: argparse action of the option.
+	:param value: Value from HCRconfig.yaml.
+	:param config_path: Path to HCRconfig.yaml (for error messages).
+	:return: The converted value.
+	"""
+	where = f"{config_path}: default_params.{action.dest}"
+	if action.nargs == 0:
+		if not isinstance(value, bool):
+			parser.error(f"{where}: expected true or false, got {value!r}")
+		return value
+	if value is None:
+		return value
+	if action.type is not None and not isinstance(action.type, argparse.FileType):
+		if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+			parser.error(f"{where}: invalid value {value!r}")
+		try:
+			value = action.type(str(value))
+		except (TypeError, ValueError, argparse.ArgumentTypeError):
+			parser.error(f"{where}: invalid value {value!r}")
+	if action.choices is not None and value not in action.choices:
+		parser.error(f"{where}: invalid choice {value!r} (choose from {', '.join(map(repr, action.choices))})")
+	return value
+
+
+def _bowtie2_kwargs(args):
+	"""
+	Collect Bowtie2 alignment settings from parsed CLI arguments.
+
+	:param args: Parsed CLI arguments.
+	:return: Dict of keyword arguments for genomeMask alignment functions.
+	"""
+	return {"threads": args.bowtie2_threads, "preset": args.bowtie2_preset, "extra_args": args.bowtie2_args}
 
 
 def _parse_record_channel(name):
@@ -218,30 +420,6 @@ def _resolve_channel(args, channel_override):
 	return channel
 
 
-def _build_target_name(base_name, record_name, index, used_names):
-	"""
-	Build a unique, sanitized target name for outputs.
-
-	:param base_name: Base target name from CLI.
-	:param record_name: FASTA record name.
-	:param index: Record index for fallback naming.
-	:param used_names: Set of previously used names.
-	:return: Unique target name string.
-	"""
-	base = _sanitize_name(base_name)
-	record = _sanitize_name(record_name)
-	if not record:
-		record = f"record_{index}"
-	candidate = f"{base}_{record}" if base else record
-	if candidate in used_names:
-		suffix = 2
-		while f"{candidate}_{suffix}" in used_names:
-			suffix += 1
-		candidate = f"{candidate}_{suffix}"
-	used_names.add(candidate)
-	return candidate
-
-
 def _design_tiles_for_record(args, record, target_name, channel_override=None):
 	"""
 	Run the full probe design workflow for a single FASTA record.
@@ -252,10 +430,24 @@ def _design_tiles_for_record(args, record, target_name, channel_override=None):
 	:param channel_override: Optional channel override.
 	:return: List of selected Tile objects.
 	"""
-	sequence = record["sequence"]
-	seq_name = record["name"]
 	handle_name = target_name or args.targetName
 	channel = _resolve_channel(args, channel_override)
+	tileSet = _prefilter_tiles(args, record)
+	if args.no_genomemask:
+		_genome_mask_tilesets(args, [tileSet], handle_name)
+	return _select_tiles(args, tileSet, channel)
+
+
+def _prefilter_tiles(args, record):
+	"""
+	Tile a FASTA record and apply the per-tile filters that precede genome masking.
+
+	:param args: Parsed CLI arguments.
+	:param record: Dict containing "name" and "sequence".
+	:return: TileSet with run and hairpin rejections applied.
+	"""
+	sequence = record["sequence"]
+	seq_name = record["name"]
 
 	#############
 	# Repeatmask target sequence
@@ -263,65 +455,282 @@ def _design_tiles_for_record(args, record, target_name, channel_override=None):
 	if args.no_repeatmask:
 		# RepeatMasking
 		utils.eprint(f"\nRepeat Masking using {args.species} reference...")
-		sequence = repeatMask.repeatmask(sequence,dnasource=args.species)
+		with _stage(args,"repeatmask",seq_name):
+			sequence = repeatMask.repeatmask(sequence,dnasource=args.species)
 
 	###############
 	# Tile over masked sequence record to generate all possible probes of appropriate length that are not already masked
 	###############
 	# This code is breaking the target sequence into tiles of size args.tileSize.
 	utils.eprint(f"\nBreaking target sequence into revcomp tiles of size {args.tileSize}...")
-	tiles = scanSequence(sequence,seq_name,tileStep=1,tileSize=args.tileSize) # Here we remove masked sequences and rev comp for tiles.
-	utils.eprint(f'{len(tiles)} tiles available of length {args.tileSize}...')
-
-	##############
-	# Crunmask
-	##############
-	# This code is checking if there are runs of C's in the tiles. If there are runs of C's, then the
-	# tile is removed from the list of tiles.
-	utils.eprint("\nChecking for runs of C's")
-	tiles = [tile for tile in tiles if not tile.hasRuns(runChar='c',runLength=args.maxRunLength,mismatches=args.maxRunMismatches)]
-	utils.eprint(f'{len(tiles)} tiles remain')
+	with _stage(args,"scan",seq_name) as stage:
+		tileSet = tilesModule.TileSet.fromSequence(sequence,seq_name,tileStep=1,tileSize=args.tileSize) # Here we mask N-containing windows and rev comp for tiles.
+		stage.tilesIn,stage.tilesOut = len(tileSet.mask),len(tileSet) # all windows, then those without masked bases
+	utils.eprint(f'{len(tileSet)} tiles available of length {args.tileSize}...')
 
 	##############
-	# Grunmask
+	# Homopolymer run masking (C and G runs by default)
 	##############
-	# This code is checking if there are runs of G's in the tiles. If there are runs of G's, then the
-	# tile is removed from the list of tiles.
-	utils.eprint("\nChecking for runs of G's")
-	tiles = [tile for tile in tiles if not tile.hasRuns(runChar='g',runLength=args.maxRunLength,mismatches=args.maxRunMismatches)]
-	utils.eprint(f'{len(tiles)} tiles remain')
+	# This code is checking if there are runs of each of args.runChars in the tiles. If there are runs,
+	# then the tile is rejected from the tile set.
+	for runChar in args.runChars.lower():
+		utils.eprint(f"\nChecking for runs of {runChar.upper()}'s")
+		with _stage(args,f"runs_{runChar}",seq_name,len(tileSet)) as stage:
+			tileSet.applyFilter(~tileSet.hasRuns(runChar=runChar,runLength=args.maxRunLength,mismatches=args.maxRunMismatches),tilesModule.MASK_RUNS)
+			stage.tilesOut = len(tileSet)
+		utils.eprint(f'{len(tileSet)} tiles remain')
 
 	##############
 	# Calculate Hairpins
 	##############
 	# Checking for hairpins in the tiles.
 	utils.eprint("\nChecking for hairpins")
-	#TODO: add this as a user-selectable parameter. Currently awkward as we don't have a min Tm filter.
-	max_Th = 45.0 # This is the maximum tolerated calculated melting temperature of any predicted hairpins 
-	tiles = [tile for tile in tiles if primer3.calc_hairpin(tile.sequence).tm < max_Th or not primer3.calc_hairpin(tile.sequence).structure_found]
-	utils.eprint(f'{len(tiles)} tiles remain')
+	# args.maxHairpinTm is the maximum tolerated calculated melting temperature of any predicted hairpins
+	with _stage(args,"hairpin",seq_name,len(tileSet)) as stage:
+		tileSet.calcHairpins(workers=args.workers)
+		tileSet.applyFilter((tileSet.hairpinTm < args.maxHairpinTm) | ~tileSet.hairpinFound,tilesModule.MASK_HAIRPIN)
+		stage.tilesOut = len(tileSet)
+	utils.eprint(f'{len(tileSet)} tiles remain')
+
+	return tileSet
+
+
+def _stage(args, name, record=None, tilesIn=None):
+	"""
+	Measure a pipeline stage for --metrics; a no-op context when metrics are off.
+
+	:param args: Parsed CLI arguments.
+	:param name: Stage name.
+	:param record: Record (target) name.
+	:param tilesIn: Number of tiles entering the stage.
+	:return: Context manager yielding a metrics.Stage (set its tilesOut).
+	"""
+	return metrics.stage(args.metrics,name,record,run=args.metrics_run,tilesIn=tilesIn)
+
+
+def _cache_key(args, offTargets=False):
+	"""
+	Resolve the Bowtie2 index prefix and alignment options used to key the hit cache.
+
+	With --mask-server these are the server's own index and options (see
+	_check_mask_server), since those are what the counts are produced with.
+
+	:param args: Parsed CLI arguments.
+	:param offTargets: Key off-target counts (see _hit_counter) apart from total hit counts.
+	:return: Tuple of (index prefix, options string), or None if the cache is disabled or the index cannot be resolved locally.
+	"""
+	if not args.hit_cache or args.mask_engine == "kmer":
+		return None
+	if args.mask_server:
+		info = args.mask_server_info
+		if info is None:
+			return None
+		return info["index"],genomeMask.cache_params(preset=info["preset"],extra_args=info["extra_args"],maxOffTargetMismatches=args.max_offtarget_mismatches,offTargets=offTargets)
+	try:
+		index_prefix = genomeMask._absolute_index(genomeMask._resolve_index(args.species,args.index))
+	except ValueError:
+		return None
+	return index_prefix,genomeMask.cache_params(preset=args.bowtie2_preset,extra_args=args.bowtie2_args,maxOffTargetMismatches=args.max_offtarget_mismatches,offTargets=offTargets)
+
+
+def _index_checksum(args):
+	"""
+	Fingerprint the genome index that masking will use, so checkpoints are not reused after it is rebuilt.
+
+	:param args: Parsed CLI arguments.
+	:return: Index fingerprint (hitCache.index_checksum or kmerIndex.index_checksum), or None if genome masking is off or the index cannot be resolved locally.
+	"""
+	if not args.no_genomemask:
+		return None
+	if args.mask_engine == "kmer":
+		try:
+			return kmerIndex.index_checksum(genomeMask._resolve_kmer_index(args.species,args.kmer_index))
+		except ValueError:
+			return None
+	if args.mask_server:
+		info = args.mask_server_info
+		return hitCache.index_checksum(info["index"]) if info is not None else None
+	try:
+		return hitCache.index_checksum(genomeMask._absolute_index(genomeMask._resolve_index(args.species,args.index)))
+	except ValueError:
+		return None
+
+
+def _hit_counter(args, handle_name, offTargets=False):
+	"""
+	Choose the genome hit counting backend for the masking options.
 
+	With ``offTargets`` each read is reported with its off-target hits only:
+	every alignment except its first perfect (NM:i:0) one, which is taken to
+	be the read's own locus (HitStats.offTargets).  A read without a perfect
+	alignment, such as an arm spanning an exon-exon junction, keeps all of its
+	hits.  K-mer index counts are exact matches, so one is subtracted whenever
+	the read is found at all.
+
+	:param args: Parsed CLI arguments.
+	:param handle_name: Prefix for FASTA/SAM files in file mode.
+	:param offTargets: Count off-target hits instead of all hits.
+	:return: Callable taking a FASTA string and returning (read_name, hit_count) pairs.
+	"""
+	if args.mask_engine == "kmer":
+		utils.eprint(f'Looking up tile halves in the k-mer index')
+		if offTargets:
+			return lambda fasta: ((name,max(count-1,0)) for name,count in genomeMask.genomemask_kmer(fasta,species=args.species,kmer_index=args.kmer_index))
+		return lambda fasta: genomeMask.genomemask_kmer(fasta,species=args.species,kmer_index=args.kmer_index)
+	if args.mask_server:
+		utils.eprint(f'Sending tiles to maskServer at {args.mask_server}')
+		return lambda fasta: genomeMask.genomemask_server(fasta,args.mask_server,maxOffTargetMismatches=args.max_offtarget_mismatches,offTargets=offTargets)
+	if offTargets:
+		count = lambda stats: stats.offTargets(args.max_offtarget_mismatches)
+	else:
+		count = lambda stats: stats.hitCount(args.max_offtarget_mismatches)
+	if args.genomemask_io == "stream":
+		utils.eprint(f'Streaming tiles through bowtie2')
+		if args.max_offtarget_mismatches is None and not offTargets:
+			return lambda fasta: genomeMask.genomemask_stream(fasta,species=args.species,index=args.index,**_bowtie2_kwargs(args))
+		return lambda fasta: ((name,count(stats)) for name,stats in genomeMask.genomemask_stream(fasta,species=args.species,index=args.index,stats=True,**_bowtie2_kwargs(args)))
+
+	def count_hits(fasta):
+		genomeMask.genomemask(fasta, handleName=handle_name,species=args.species,index=args.index,**_bowtie2_kwargs(args))
+		utils.eprint(f'Parsing bowtie2 output now')
+		if args.max_offtarget_mismatches is None and not offTargets:
+			return genomeMask.countHitsFromSam(f'{handle_name}.sam').items()
+		return ((stats.name,count(stats)) for stats in genomeMask.hitStatsFromSam(f'{handle_name}.sam'))
+	return count_hits
+
+
+def _count_reads(args, reads, count_hits, offTargets=False):
+	"""
+	Count genome hits for reads, going through the hit cache when it is enabled.
+
+	:param args: Parsed CLI arguments.
+	:param reads: List of (name, sequence) tuples.
+	:param count_hits: Backend from _hit_counter.
+	:param offTargets: Whether count_hits reports off-target hits only (keeps their cache entries apart).
+	:return: Dict mapping read name to hit count (reads the aligner did not report are absent).
+	:raises ValueError: If the aligner reports a read that was not submitted.
+	"""
+	cacheKey = _cache_key(args, offTargets)
+	if cacheKey is None:
+		hitCounts = dict(count_hits("\n".join([f'>{name}\n{sequence}' for name,sequence in reads])))
+	else:
+		with hitCache.HitCache(maxEntries=args.hit_cache_size) as cache:
+			hitCounts = genomeMask.genomemask_cached(reads,count_hits,cache,*cacheKey)
+	submitted = {name for name,_ in reads}
+	unexpected = [readName for readName in hitCounts if readName not in submitted]
+	if unexpected:
+		raise ValueError(f'bowtie2 reported {len(unexpected)} reads that were not submitted (e.g. {unexpected[0]})')
+	nMissing = len(submitted) - len(hitCounts)
+	if nMissing:
+		utils.eprint(f'{nMissing} reads were not reported by bowtie2; treating them as unmapped (0 hits)')
+	return hitCounts
+
+
+def _genome_mask_tilesets(args, tileSets, handle_name):
+	"""
+	Count genome hits for the active tiles of one or more TileSets with a single aligner run.
+
+	Reads are multiplexed by prefixing each tile name with its TileSet's
+	position ("<i>|<tile name>"), so the bowtie2 index is loaded once for the
+	whole batch and hit counts are attached back to rows by read name.
+	With ``--mask-target arms`` the binding arms are aligned instead (see
+	_genome_mask_arms).
+
+	:param args: Parsed CLI arguments.
+	:param tileSets: List of TileSets to mask (updated in place).
+	:param handle_name: Prefix for FASTA/SAM files in file mode.
+	:return: None.
+	"""
 	##############
 	# GenomeMasking?  Using bowtie because BLAST over WWW is unpredictable
 	##############
 	# This code is checking the number of hits to the genome for each tile. If the number of hits is
-	# greater than the number of hits allowed, the tile is removed from the list of tiles.
-	if args.no_genomemask:
-		utils.eprint(f"\nChecking unique mapping of remaining tiles against {args.species} reference genome")
-		blast_string = "\n".join([tile.toFasta() for tile in tiles])
-		blast_res = genomeMask.genomemask(blast_string, handleName=handle_name,species=args.species,index=args.index)
-		utils.eprint(f'Parsing bowtie2 output now')
-		hitCounts = genomeMask.countHitsFromSam(f'{handle_name}.sam')
-		#print(hitCounts)
-		#Check that keys returned from hitCounts match order of tiles in tiles
-		assert all(map(lambda x, y: x == y, [k for k in hitCounts.keys()], [tile.name for tile in tiles]))
-		utils.eprint(f'Filtering for <= {args.num_hits_allowed} alignments to {args.species} genome...')
-		for i in range(len(tiles)):
-			k = list(hitCounts.keys())[i]
-			tiles[i].hitCount = hitCounts[k]
-			#utils.eprint(f'{tiles[i].hitCount}')
-		tiles = [tile for tile in tiles if tile.hitCount <= args.num_hits_allowed]
-		utils.eprint(f'{len(tiles)} tiles remain')
+	# greater than the number of hits allowed, the tile is rejected from the tile set.
+	utils.eprint(f"\nChecking unique mapping of remaining tiles against {args.species} reference genome")
+	record = tileSets[0].seqName if len(tileSets) == 1 else None
+	with _stage(args,"genome_mask",record,sum(len(tileSet) for tileSet in tileSets)) as stage:
+		count_hits = _hit_counter(args, handle_name, offTargets=args.mask_target == "arms")
+		if args.mask_target == "arms":
+			_genome_mask_arms(args, tileSets, count_hits)
+		else:
+			_genome_mask_tiles(args, tileSets, count_hits)
+		stage.tilesOut = sum(len(tileSet) for tileSet in tileSets)
+
+
+def _genome_mask_tiles(args, tileSets, count_hits):
+	"""
+	Mask tiles by the genome hit count of the whole tile sequence.
+
+	:param args: Parsed CLI arguments.
+	:param tileSets: List of TileSets to mask (updated in place).
+	:param count_hits: Backend from _hit_counter.
+	:return: None.
+	"""
+	setRows = [tileSet.rows() for tileSet in tileSets]
+	reads = []
+	readRows = {} # read name -> (TileSet index, row) for attaching hit counts
+	for i,(tileSet,rows) in enumerate(zip(tileSets,setRows)):
+		for row in rows:
+			name = f'{i}|{tileSet.name(row)}'
+			readRows[name] = (i,row)
+			reads.append((name,tileSet.sequence(row)))
+	allHitCounts = _count_reads(args, reads, count_hits)
+
+	# Attach hit counts to TileSet rows by read name. Unmapped reads are reported with 0 hits;
+	# reads bowtie2 did not report at all (e.g. with --no-unal) are treated as unmapped.
+	for readName,count in allHitCounts.items():
+		setIndex,row = readRows[readName]
+		tileSets[setIndex].hitCount[row] = count
+
+	utils.eprint(f'Filtering for <= {args.num_hits_allowed} alignments to {args.species} genome...')
+	for tileSet,rows in zip(tileSets,setRows):
+		tileSet.hitCount[rows[tileSet.hitCount[rows] < 0]] = 0
+		tileSet.applyFilter(tileSet.hitCount <= args.num_hits_allowed,tilesModule.MASK_GENOME)
+		utils.eprint(f'{tileSet.seqName}: {len(tileSet)} tiles remain')
+
+
+def _genome_mask_arms(args, tileSets, count_hits):
+	"""
+	Mask tiles by the combined off-target hits of their two binding arms.
+
+	HCR v3 probes bind as two half-sites (Tile.splitProbe), each of which can
+	bind off-target on its own.  Every distinct arm sequence across all
+	TileSets is aligned once in a single run (and cached per arm sequence);
+	an arm's first perfect alignment is its own locus, and a tile's
+	``armHits`` is the sum of the other (off-target) hits of both arms.
+
+	:param args: Parsed CLI arguments.
+	:param tileSets: List of TileSets to mask (updated in place).
+	:param count_hits: Backend from _hit_counter(offTargets=True).
+	:return: None.
+	"""
+	setRows = [tileSet.rows() for tileSet in tileSets]
+	setArms = [tileSet.armSequences(rows) for tileSet,rows in zip(tileSets,setRows)]
+	armNames = {} # arm sequence -> read name; overlapping and repeated tiles share arms
+	for fivePrime,threePrime in setArms:
+		for arm in fivePrime + threePrime:
+			if arm not in armNames:
+				armNames[arm] = f'arm{len(armNames)}'
+	utils.eprint(f'Aligning {len(armNames)} distinct binding arms')
+	hitCounts = _count_reads(args, [(name,arm) for arm,name in armNames.items()], count_hits, offTargets=True)
+	offTargets = {arm: hitCounts.get(name,0) for arm,name in armNames.items()}
+
+	utils.eprint(f'Filtering for <= {args.max_arm_offtargets} combined off-target arm hits...')
+	for tileSet,rows,(fivePrime,threePrime) in zip(tileSets,setRows,setArms):
+		tileSet.armHits[rows] = [offTargets[five] + offTargets[three] for five,three in zip(fivePrime,threePrime)]
+		tileSet.applyFilter(tileSet.armHits <= args.max_arm_offtargets,tilesModule.MASK_GENOME)
+		utils.eprint(f'{tileSet.seqName}: {len(tileSet)} tiles remain')
+
+
+def _select_tiles(args, tileSet, channel):
+	"""
+	Apply the post-masking filters, select non-overlapping tiles and build probes.
+
+	:param args: Parsed CLI arguments.
+	:param tileSet: TileSet after prefiltering (and genome masking, if enabled).
+	:param channel: Resolved HCR channel.
+	:return: List of selected Tile objects.
+	"""
 
 	###############
 	# TM filtering
@@ -331,36 +740,40 @@ def _design_tiles_for_record(args, record, target_name, channel_override=None):
 	# GC filtering
 	###############
 	utils.eprint(f"\nChecking for {args.minGC} < GC < {args.maxGC}")
-	tiles = [tile for tile in tiles if tile.GC() >= args.minGC]
-	tiles = [tile for tile in tiles if tile.GC() <= args.maxGC]
-	utils.eprint(f'{len(tiles)} tiles remain')
+	with _stage(args,"gc",tileSet.seqName,len(tileSet)) as stage:
+		tileSet.calcGC()
+		tileSet.applyFilter((tileSet.GC >= args.minGC) & (tileSet.GC <= args.maxGC),tilesModule.MASK_GC)
+		stage.tilesOut = len(tileSet)
+	utils.eprint(f'{len(tileSet)} tiles remain')
 
 	###############
 	# Gibbs filtering
 	###############
 	# Checking if the Gibbs free energy is within the specified range.
 	utils.eprint(f"\nChecking for {args.minGibbs} < Gibbs FE < {args.maxGibbs}")
-	[tile.calcGibbs() for tile in tiles]
-	tiles = [tile for tile in tiles if tile.Gibbs >= args.minGibbs]
-	tiles = [tile for tile in tiles if tile.Gibbs <= args.maxGibbs]
-	utils.eprint(f'{len(tiles)} tiles remain')
+	with _stage(args,"gibbs",tileSet.seqName,len(tileSet)) as stage:
+		tileSet.calcGibbs()
+		tileSet.applyFilter((tileSet.Gibbs >= args.minGibbs) & (tileSet.Gibbs <= args.maxGibbs),tilesModule.MASK_GIBBS)
+		stage.tilesOut = len(tileSet)
+	utils.eprint(f'{len(tileSet)} tiles remain')
 
 	###############
 	# Split tile into probeset
 	###############
 	utils.eprint(f"\nSplitting tiles into probesets")
-	[tile.splitProbe() for tile in tiles]
-	[tile.calcdTm() for tile in tiles]
-
-	###############
-	# dTm between halves
-	###############
-	# This code is checking if the dTm value is less than or equal to the dTmMax value. If it is, it will
-	# keep the tile. If it is not, it will remove the tile.
-	if args.dTmFilter:
-		utils.eprint(f"\nChecking for dTm <= {args.dTmMax} between probes for each tile")
-		tiles = [tile for tile in tiles if tile.dTm <= args.dTmMax]
-		utils.eprint(f'{len(tiles)} tiles remain')
+	with _stage(args,"dtm",tileSet.seqName,len(tileSet)) as stage:
+		tileSet.calcdTm(workers=args.workers)
+
+		###############
+		# dTm between halves
+		###############
+		# This code is checking if the dTm value is less than or equal to the dTmMax value. If it is, it will
+		# keep the tile. If it is not, it will reject the tile.
+		if args.dTmFilter:
+			utils.eprint(f"\nChecking for dTm <= {args.dTmMax} between probes for each tile")
+			tileSet.applyFilter(tileSet.dTm <= args.dTmMax,tilesModule.MASK_DTM)
+			utils.eprint(f'{len(tileSet)} tiles remain')
+		stage.tilesOut = len(tileSet)
 
 	################
 	# Select overall best n tiles (regardless of region)
@@ -372,25 +785,27 @@ def _design_tiles_for_record(args, record, target_name, channel_override=None):
 	#TODO: Currently ranking tiles based on min distance to targetGibbs.  Need to make an argument to select targetGC as goal instead.
 	# Selecting the top tiles based on distance to the targetGibbs.
 	utils.eprint(f'\nSelecting top {args.maxProbes} tiles based on distance to targetGibbs = {args.targetGibbs}')
-	bestTiles = []
-	while len(bestTiles) < args.maxProbes and len(tiles) > 0:
-		nextBestIdx = min(range(len(tiles)), key=lambda i: abs([x.Gibbs for x in tiles][i]-args.targetGibbs))
-		#print(f'{nextBestIdx}')
-		if len(bestTiles) == 0:
-			bestTiles.append(tiles.pop(nextBestIdx))
-			continue
-		if any([tiles[nextBestIdx].overlaps(x) for x in bestTiles]):
-			tiles.pop(nextBestIdx)
-		else:
-			bestTiles.append(tiles.pop(nextBestIdx))
-
-	utils.eprint(f'Selected {len(bestTiles)} non-overlapping tiles for probe design')
-
-	################
-	# Add initator and spacers to split probes
-	################
-	utils.eprint(f"\nAdding spacers and initiator sequences to split probes for channel {channel}")
-	[tile.makeProbes(channel) for tile in bestTiles]
+	with _stage(args,"select",tileSet.seqName,len(tileSet)) as stage:
+		rows = tileSet.rows()
+		scores = np.abs(tileSet.Gibbs[rows]-args.targetGibbs)
+		picks = selection.greedy_select(tileSet.start[rows],tileSet.end[rows],scores,args.maxProbes)
+		if args.selection == "optimal":
+			greedyCount,greedyTotal = selection.selection_objective(picks,scores)
+			picks = selection.optimal_select(tileSet.start[rows],tileSet.end[rows],scores,args.maxProbes)
+			optimalCount,optimalTotal = selection.selection_objective(picks,scores)
+			utils.eprint(f'Optimal selection: {optimalCount} tiles, total |Gibbs - targetGibbs| = {optimalTotal:.2f}')
+			utils.eprint(f'Greedy selection: {greedyCount} tiles, total |Gibbs - targetGibbs| = {greedyTotal:.2f}')
+		bestTiles = tileSet.tiles(rows[picks])
+
+		utils.eprint(f'Selected {len(bestTiles)} non-overlapping tiles for probe design')
+		[tile.splitProbe() for tile in bestTiles]
+
+		################
+		# Add initator and spacers to split probes
+		################
+		utils.eprint(f"\nAdding spacers and initiator sequences to split probes for channel {channel}")
+		[tile.makeProbes(channel) for tile in bestTiles]
+		stage.tilesOut = len(bestTiles)
 
 	return bestTiles
 
@@ -479,12 +894,9 @@ def test():
 		utils.eprint(f'Parsing BLAST output now')
 		hitCounts = genomeMask.countHitsFromSam(f'{targetName}.sam')
 		#print(hitCounts)
-		#Check that keys returned from hitCounts match order of tiles in tiles
-		assert all(map(lambda x, y: x == y, [k for k in hitCounts.keys()], [tile.name for tile in tiles]))
 		utils.eprint(f'Filtering for <= {num_hits_allowed} alignments to {species} genome...')
-		for i in range(len(tiles)):
-			k = list(hitCounts.keys())[i]
-			tile.hitCount = hitCounts[k]
+		for tile in tiles:
+			tile.hitCount = hitCounts.get(tile.name,0) # Reads missing from the SAM are unmapped
 		tiles = [tile for tile in tiles if tile.hitCount <= num_hits_allowed]
 		utils.eprint(f'{len(tiles)} tiles remain')
 
@@ -557,7 +969,7 @@ def _assert_species_config(args):
 	:return: None.
 	:raises SystemExit: If species is not configured and genomemask is enabled.
 	"""
-	if (not args.no_genomemask) or args.index:
+	if (not args.no_genomemask) or args.index or getattr(args, "mask_server", None) or getattr(args, "kmer_index", None):
 		return
 
 	ensure_data_dir()
@@ -570,6 +982,12 @@ def _assert_species_config(args):
 	species_config = config.get("species", {}) or {}
 
 	if args.species in species_config:
+		if getattr(args, "mask_engine", "bowtie2") == "bowtie2" and not (species_config[args.species] or {}).get("bowtie2_index"):
+			raise SystemExit(
+				f"Species '{args.species}' only has a k-mer index registered in HCRconfig.yaml.\n"
+				"Use --mask-engine kmer, build a Bowtie2 index with buildGenomeIndex --species <name> --fasta <file_or_dir>,\n"
+				"or supply --index /path/to/bowtie2/index/prefix."
+			)
 		return
 
 	available = ", ".join(sorted(species_config)) if species_config else "none"
@@ -589,13 +1007,16 @@ def main():
 	"""
 	parser = build_parser()
 	args = parser.parse_args()
+	_start_metrics(parser, args)
 	_assert_species_config(args)
+	_check_kmer_index(parser, args)
+	_check_mask_server(parser, args)
 
 	#########
 	# Parse fasta file. Currently not looping over records, only uses first fasta record
 	#########
 	utils.eprint("Reading in Fasta file")
-	fastaIter = sequencelib.FastaIterator(args.infile)
+	fastaIter = fastaIndex.open_records(args.infile)
 	mySeq = next(fastaIter)
 
 	record_name, channel_override = _parse_record_channel(mySeq["name"])
@@ -608,7 +1029,7 @@ def main():
 	if args.idt is not None:
 		outputIDT(bestTiles,outHandle=args.idt)
 
-	outputTable(bestTiles,outHandle=args.output)
+	outputTable(bestTiles,outHandle=args.output,workers=args.workers)
 
 	if args.calcPrice:
 		utils.eprint(f'\nTotal cost to synthesize probe sets ~${calcOligoCost(bestTiles):.2f}')
@@ -616,42 +1037,241 @@ def main():
 	outputRunParams(args)
 
 
+def _job_args(args):
+	"""
+	Return a picklable copy of the CLI arguments for record-level worker processes.
+
+	Open file handles are dropped (only the parent reads input and writes
+	output) and primer3 stages run serially inside each job.
+
+	:param args: Parsed CLI arguments.
+	:return: argparse.Namespace.
+	"""
+	jobArgs = argparse.Namespace(**vars(args))
+	jobArgs.infile = jobArgs.output = jobArgs.idt = None
+	jobArgs.workers = 1
+	return jobArgs
+
+
+def _prefilter_job(args, record):
+	"""
+	Worker entry point: prefilter one record, isolating failures.
+
+	:return: Tuple of (TileSet, None) on success or (None, error message) on failure.
+	"""
+	utils.eprint(f"\nProcessing target {record['name']}")
+	try:
+		return _prefilter_tiles(args, record), None
+	except Exception as err:
+		return None, f"{type(err).__name__}: {err}"
+
+
+def _select_job(args, tileSet, channel):
+	"""
+	Worker entry point: select probes for one prefiltered record, isolating failures.
+
+	:return: Tuple of (list of Tiles, None) on success or (None, error message) on failure.
+	"""
+	utils.eprint(f"\nSelecting probes for target {tileSet.seqName}")
+	try:
+		return _select_tiles(args, tileSet, channel), None
+	except Exception as err:
+		return None, f"{type(err).__name__}: {err}"
+
+
+def _record_result(args, name, bestTiles):
+	"""
+	Render a finished record into its output rows (the unit that is checkpointed and streamed).
+
+	:param args: Parsed CLI arguments.
+	:param name: Record display name.
+	:param bestTiles: Selected Tile objects.
+	:return: JSON-serializable result dict.
+	"""
+	odd,even = _idtRows(bestTiles)
+	return {
+		"name": name,
+		"table": _tableRows(bestTiles,workers=args.workers),
+		"idt_odd": odd,
+		"idt_even": even,
+		"cost": calcOligoCost(bestTiles),
+	}
+
+
+def _record_chunks(records, size):
+	"""
+	Split records, in input order, into consecutive chunks of at most ``size`` records still to design.
+
+	Resumed records do not count towards the size and travel with the chunk
+	that follows them, so output stays in input order.
+
+	:param records: List of record tuples from main_batch (the last item is the resumed result or None).
+	:param size: Maximum number of records to design per chunk, or None for a single chunk.
+	:return: Generator of lists of record tuples.
+	"""
+	chunk,nPending = [],0
+	for record in records:
+		if record[4] is None:
+			if size is not None and nPending == size:
+				yield chunk
+				chunk,nPending = [],0
+			nPending += 1
+		chunk.append(record)
+	if chunk:
+		yield chunk
+
+
+def _design_chunk(args, jobArgs, mapper, chunk, store, evenSpool, failed):
+	"""
+	Prefilter, genome-mask (in one aligner run), select and write one chunk of batch records.
+
+	:param args: Parsed CLI arguments.
+	:param jobArgs: Arguments passed to record jobs (see _job_args).
+	:param mapper: map-like callable running record jobs (builtin map or a process pool's map).
+	:param chunk: List of record tuples from _record_chunks.
+	:param store: CheckpointStore, or None.
+	:param evenSpool: Temporary file collecting the even IDT oligos, or None.
+	:param failed: List collecting names of failed records (appended to in place).
+	:return: Oligo cost of the records written.
+	"""
+	pending = [record for record in chunk if record[4] is None]
+	prefiltered = []
+	skipped = set() # ids of records that failed prefiltering
+	results = mapper(_prefilter_job, repeat(jobArgs), [record[2] for record in pending])
+	for record, (tileSet, error) in zip(pending, results):
+		if error is not None:
+			utils.eprint(f"Skipping target {record[0]}: {error}")
+			failed.append(record[0])
+			skipped.add(id(record))
+			continue
+		prefiltered.append((record, tileSet))
+
+	if args.no_genomemask and prefiltered:
+		_genome_mask_tilesets(args, [tileSet for _, tileSet in prefiltered], args.targetName)
+
+	selected = mapper(_select_job, repeat(jobArgs), [tileSet for _, tileSet in prefiltered], [record[1] for record, _ in prefiltered])
+	cost = 0.0
+	for record in chunk:
+		display_name, channel, record_data, key, resumed = record
+		if resumed is not None:
+			result = resumed
+		elif id(record) in skipped:
+			continue
+		else:
+			bestTiles, error = next(selected)
+			if error is not None:
+				utils.eprint(f"Skipping target {display_name}: {error}")
+				failed.append(display_name)
+				continue
+			result = _record_result(args, display_name, bestTiles)
+			if store is not None:
+				store.save(key, result)
+		# Stream this record's rows now rather than holding every tile until the end
+		args.output.writelines(result["table"])
+		args.output.flush()
+		if evenSpool is not None:
+			args.idt.writelines(result["idt_odd"])
+			evenSpool.writelines(result["idt_even"])
+		cost += result["cost"]
+	return cost
+
+
 def main_batch():
 	"""
 	Batch probe design for multi-record FASTA inputs.
+
+	Records are processed in chunks of --mask-chunk records still to design
+	(by default the whole panel is one chunk, so the aligner and its index
+	are loaded once; with --checkpoint-dir chunks default to
+	_CHECKPOINT_MASK_CHUNK records so progress is saved along the way).
+	Within a chunk, records are prefiltered (and later selected)
+	independently, in --jobs worker processes when requested; genome masking
+	runs once for the whole chunk in between.  Output rows are written per
+	record in input order as each chunk finishes (even IDT oligos are spooled
+	to a temporary file until the end), and a record that fails is reported
+	and skipped without losing the others.  With --checkpoint-dir every
+	finished record is also saved, so a crash (e.g. an aligner running out
+	of memory) loses at most the chunk in progress, and --resume reuses saved
+	records whose sequence and parameters match.
 	"""
 	parser = build_parser()
 	args = parser.parse_args()
+	if args.resume and not args.checkpoint_dir:
+		parser.error("--resume requires --checkpoint-dir")
+	if args.mask_chunk is None and args.checkpoint_dir:
+		args.mask_chunk = _CHECKPOINT_MASK_CHUNK
+	if args.mask_chunk is not None and args.mask_chunk < 1:
+		parser.error("--mask-chunk must be at least 1")
+	if args.record_regex is not None:
+		try:
+			re.compile(args.record_regex)
+		except re.error as err:
+			parser.error(f"--record-regex: {err}")
+	_start_metrics(parser, args)
 	_assert_species_config(args)
+	_check_kmer_index(parser, args)
+	_check_mask_server(parser, args)
 
 	utils.eprint("Reading in Fasta file")
-	fastaIter = sequencelib.FastaIterator(args.infile)
-	used_names = set()
-	all_tiles = []
+	recordIds = None
+	if args.records:
+		try:
+			recordIds = fastaIndex.read_record_ids(args.records)
+		except OSError as err:
+			parser.error(f"--records: {err}")
+	fastaIter = fastaIndex.open_records(args.infile, names=recordIds, pattern=args.record_regex, cacheIndex=True)
 	total_cost = 0.0
-
-	for index, record in enumerate(fastaIter, start=1):
+	failed = []
+	store = checkpoint.CheckpointStore(args.checkpoint_dir) if args.checkpoint_dir else None
+	indexKey = _index_checksum(args) if store else None
+
+	# Channels are resolved up front so configuration errors stop the run before any work
+	records = []
+	try:
+		selectedRecords = list(fastaIter)
+	except KeyError as err:
+		parser.error(f"--records: not found in {args.infile.name}: {', '.join(err.args[0])}")
+	for index, record in enumerate(selectedRecords, start=1):
 		record_name, channel_override = _parse_record_channel(record["name"])
 		display_name = record_name.strip() if record_name else ""
 		if not display_name:
 			display_name = f"record_{index}"
-		utils.eprint(f"\nProcessing target {display_name}")
+		channel = _resolve_channel(args, channel_override)
 		record_data = {"name": display_name, "sequence": record["sequence"]}
-		handle_name = _build_target_name(args.targetName, display_name, index, used_names)
-		bestTiles = _design_tiles_for_record(args, record_data, handle_name, channel_override)
-		all_tiles.extend(bestTiles)
-		if args.calcPrice:
-			total_cost += calcOligoCost(bestTiles)
+		key = checkpoint.record_key(record_data, channel, args, indexKey) if store else None
+		resumed = store.load(key) if args.resume else None
+		if resumed is not None:
+			utils.eprint(f"\nResuming target {display_name} from checkpoint")
+		records.append((display_name, channel, record_data, key, resumed))
 
+	outputTable([],outHandle=args.output)
 	if args.idt is not None:
-		outputIDT(all_tiles,outHandle=args.idt)
+		outputIDT([],outHandle=args.idt)
+
+	with ExitStack() as stack:
+		if args.jobs > 1:
+			from concurrent.futures import ProcessPoolExecutor
+			mapper = stack.enter_context(ProcessPoolExecutor(max_workers=args.jobs)).map
+			jobArgs = _job_args(args)
+		else:
+			mapper = map
+			jobArgs = args
+		evenSpool = stack.enter_context(tempfile.TemporaryFile("w+")) if args.idt is not None else None
+
+		for chunk in _record_chunks(records, args.mask_chunk):
+			total_cost += _design_chunk(args, jobArgs, mapper, chunk, store, evenSpool, failed)
 
-	outputTable(all_tiles,outHandle=args.output)
+		if evenSpool is not None:
+			evenSpool.seek(0)
+			shutil.copyfileobj(evenSpool, args.idt)
 
 	if args.calcPrice:
 		utils.eprint(f'\nTotal cost to synthesize probe sets ~${total_cost:.2f}')
 
 	outputRunParams(args)
 
+	if failed:
+		raise SystemExit(f"Probe design failed for {len(failed)} record(s): {', '.join(failed)}")
+
 if __name__ == "__main__":
     main()
@@ -7,7 +7,7 @@ import shutil
 import subprocess
 import yaml
 
-from . import index_path
+from . import hitCache, index_path, kmerIndex
 from ._datadir import get_data_dir, get_config_path, get_indices_dir, ensure_data_dir
 
 PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
@@ -133,31 +133,88 @@ def build_bowtie2_index(fasta_paths, species, index_name=None, indices_dir=None,
         cmd.extend(["--threads", str(threads)])
     cmd.extend([",".join(fasta_paths), index_prefix])
     subprocess.check_call(cmd)
+    # Counts cached against the previous build of this prefix are no longer valid
+    hitCache.invalidate_index(index_prefix)
     return index_prefix
 
 
-def register_species(config_path=None, species=None, index_prefix=None, force=False):
+def build_kmer_index(fasta_paths, species, k=kmerIndex.DEFAULT_K, indices_dir=None, force=False):
+    """
+    Build a sharded k-mer uniqueness index from the provided FASTA files.
+
+    :param fasta_paths: List of FASTA file paths (plain or gzip).
+    :param species: Species name for the index directory.
+    :param k: K-mer length (use half the tile size).
+    :param indices_dir: Output directory for indices.
+    :param force: Overwrite an existing k-mer index if True.
+    :return: K-mer index directory.
+    :raises FileExistsError: If the index exists and force is False.
+    """
+    indices_dir = indices_dir or index_path()
+    kmer_dir = os.path.join(indices_dir, species, f"kmer{k}")
+    if os.path.exists(os.path.join(kmer_dir, kmerIndex.META_FILE)):
+        if not force:
+            raise FileExistsError(f"K-mer index already exists at {kmer_dir}. Use --force to overwrite.")
+        shutil.rmtree(kmer_dir)
+    return kmerIndex.build_kmer_index(fasta_paths, kmer_dir, k=k)
+
+
+def register_species(config_path=None, species=None, index_prefix=None, force=False, kmer_index=None):
     """
     Register a species and its Bowtie2 index prefix in the config file.
 
+    The given indices are merged into an existing species entry, so adding a
+    k-mer index keeps the registered Bowtie2 index and vice versa.
+
     :param config_path: Path to HCRconfig.yaml (default: user data dir).
     :param species: Species key to register.
-    :param index_prefix: Bowtie2 index prefix path.
-    :param force: Overwrite an existing species entry if True.
+    :param index_prefix: Bowtie2 index prefix path (None to register a k-mer index only).
+    :param force: Replace indices already registered for the species if True.
+    :param kmer_index: Optional k-mer index directory.
     :return: None.
-    :raises ValueError: If the species exists and force is False.
+    :raises ValueError: If one of the given indices is already registered and force is False.
     """
     if config_path is None:
         ensure_data_dir()
         config_path = get_config_path()
     config = load_config(config_path)
     species_config = config.setdefault("species", {})
-    if species in species_config and not force:
-        raise ValueError(f"Species '{species}' already exists in config. Use --force to replace.")
-    species_config[species] = {"bowtie2_index": format_index_path(index_prefix)}
+    updates = _registration_keys(index_prefix, kmer_index)
+    entry = species_config.get(species) or {}
+    _check_registration(species, entry, updates, force)
+    entry.update({key: format_index_path(path) for key, path in updates.items()})
+    species_config[species] = entry
     save_config(config, config_path)
 
 
+def _registration_keys(index_prefix=None, kmer_index=None):
+    """Map the config keys to register onto their index paths."""
+    updates = {}
+    if index_prefix:
+        updates["bowtie2_index"] = index_prefix
+    if kmer_index:
+        updates["kmer_index"] = kmer_index
+    return updates
+
+
+def _check_registration(species, entry, keys, force):
+    """
+    Refuse to replace indices already registered for a species unless forced.
+
+    :param species: Species key.
+    :param entry: Existing config entry of the species ({} if new).
+    :param keys: Config keys about to be registered.
+    :param force: Allow replacing existing indices.
+    :return: None.
+    :raises ValueError: If a key is already registered and force is False.
+    """
+    taken = [key for key in keys if key in entry]
+    if taken and not force:
+        raise ValueError(
+            f"Species '{species}' already has {' and '.join(taken)} registered in config. Use --force to replace."
+        )
+
+
 def main():
     """CLI entry point for building and registering a reference genome index."""
     parser = argparse.ArgumentParser(
@@ -177,17 +234,45 @@ def main():
     parser.add_argument("--config", default=get_config_path(), help="Path to HCRconfig.yaml")
     parser.add_argument("--force", action="store_true", help="Overwrite existing index/config entry")
     parser.add_argument("--large-index", action="store_true", help="Build a large index (for genomes > 4 billion bases)")
+    parser.add_argument("--kmer-index", action="store_true", help="Also build a k-mer index for --mask-engine kmer")
+    parser.add_argument("--kmer-only", action="store_true", help="Build only the k-mer index (no bowtie2-build needed)")
+    parser.add_argument("--kmer-size", type=int, default=kmerIndex.DEFAULT_K, help="K-mer length (default: half the 52-nt tile)")
     args = parser.parse_args()
 
+    # Check the config before spending hours on an index that could not be registered
+    entry = (load_config(args.config).get("species") or {}).get(args.species) or {}
+    try:
+        _check_registration(
+            args.species,
+            entry,
+            _registration_keys(not args.kmer_only, args.kmer_index or args.kmer_only),
+            args.force,
+        )
+    except ValueError as err:
+        parser.error(str(err))
     fasta_paths = collect_fasta_inputs(args.fasta)
-    index_prefix = build_bowtie2_index(
-        fasta_paths,
-        args.species,
-        index_name=args.index_name,
-        indices_dir=args.indices_dir,
-        threads=args.threads,
-        force=args.force,
-        large_index=args.large_index,
-    )
-    register_species(args.config, args.species, index_prefix, force=args.force)
-    print(f"Registered {args.species} with index {format_index_path(index_prefix)}")
+    index_prefix = None
+    if not args.kmer_only:
+        index_prefix = build_bowtie2_index(
+            fasta_paths,
+            args.species,
+            index_name=args.index_name,
+            indices_dir=args.indices_dir,
+            threads=args.threads,
+            force=args.force,
+            large_index=args.large_index,
+        )
+    kmer_dir = None
+    if args.kmer_index or args.kmer_only:
+        kmer_dir = build_kmer_index(
+            fasta_paths,
+            args.species,
+            k=args.kmer_size,
+            indices_dir=args.indices_dir,
+            force=args.force,
+        )
+    register_species(args.config, args.species, index_prefix, force=args.force, kmer_index=kmer_dir)
+    if index_prefix:
+        print(f"Registered {args.species} with index {format_index_path(index_prefix)}")
+    if kmer_dir:
+        print(f"Registered {args.species} with k-mer index {format_index_path(kmer_dir)}")
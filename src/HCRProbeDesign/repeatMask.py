@@ -10,7 +10,6 @@ import time
 import urllib.parse
 import urllib.request
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 from . import utils
 import random
 import re
@@ -44,6 +43,7 @@ def repeatmask(sequence,dnasource='mouse'):
     with urllib.request.urlopen(req) as response:
        html_text = response.read()
 
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_text,'html.parser')
     resultLink = soup.find_all('a')[1].get('href')
     resultParse = urlparse(resultLink)
@@ -71,6 +71,7 @@ def repeatmask(sequence,dnasource='mouse'):
         utils.eprint('No repeats found in sequence.')
         return(sequence)
     else:
+        from bs4 import BeautifulSoup
         res_soup = BeautifulSoup(result_text,'html.parser')
         summary_text = res_soup.find_all("pre")[1].text
         utils.eprint(summary_text)
@@ -0,0 +1,103 @@
+"""Non-overlapping probe selection strategies."""
+
+import heapq
+from bisect import bisect_left
+
+import numpy as np
+
+
+def greedy_select(starts, ends, scores, maxProbes):
+    """
+    Greedily pick non-overlapping intervals in order of increasing score.
+
+    Candidates are taken from a priority queue ordered by (score, index), so
+    ties go to the earliest candidate, and each candidate is checked against
+    a sorted index of the chosen intervals in O(log k).  The result is
+    identical to repeatedly taking the minimum-score remaining candidate and
+    discarding it if it overlaps any chosen interval.
+
+    :param starts: Interval starts (half-open [start, end)).
+    :param ends: Interval ends.
+    :param scores: Ranking score per interval (lower is better).
+    :param maxProbes: Maximum number of intervals to choose.
+    :return: List of chosen candidate indices, in pick order.
+    """
+    heap = [(float(score), i) for i, score in enumerate(scores)]
+    heapq.heapify(heap)
+    chosen = []
+    chosenStarts = []
+    chosenEnds = []
+    while len(chosen) < maxProbes and heap:
+        _, i = heapq.heappop(heap)
+        start, end = starts[i], ends[i]
+        pos = bisect_left(chosenStarts, start)
+        # Chosen intervals never overlap, so only the neighbours can overlap the candidate.
+        if pos > 0 and chosenEnds[pos - 1] > start:
+            continue
+        if pos < len(chosenStarts) and chosenStarts[pos] < end:
+            continue
+        chosenStarts.insert(pos, start)
+        chosenEnds.insert(pos, end)
+        chosen.append(i)
+    return chosen
+
+
+def optimal_select(starts, ends, scores, maxProbes):
+    """
+    Choose non-overlapping intervals by weighted interval scheduling.
+
+    Maximizes the number of chosen intervals (up to maxProbes) and, among
+    selections of that size, minimizes the total score.  Intervals are sorted
+    by end; ``dp[j][i]`` is the lowest total score of ``j`` compatible
+    intervals drawn from the first ``i``.  Each level is a prefix minimum over
+    ``dp[j-1][p(i)] + score(i)``, where ``p(i)`` is found by binary search, so
+    the whole table costs O(n log n + n*k).
+
+    :param starts: Interval starts (half-open [start, end)).
+    :param ends: Interval ends.
+    :param scores: Cost per interval (lower is better, must be finite).
+    :param maxProbes: Maximum number of intervals to choose.
+    :return: List of chosen candidate indices, ordered by position.
+    """
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    scores = np.asarray(scores, dtype=np.float64)
+    n = len(starts)
+    if n == 0 or maxProbes <= 0:
+        return []
+    order = np.lexsort((np.arange(n), starts, ends))
+    sortedStarts = starts[order]
+    sortedEnds = ends[order]
+    sortedScores = scores[order]
+    # Number of intervals (in end order) that finish at or before each interval starts.
+    compatible = np.searchsorted(sortedEnds, sortedStarts, side="right")
+
+    previous = np.zeros(n + 1)
+    candidates = []
+    for _ in range(maxProbes):
+        candidate = previous[compatible] + sortedScores
+        current = np.concatenate(([np.inf], np.minimum.accumulate(candidate)))
+        if not np.isfinite(current[n]):
+            break
+        candidates.append(candidate)
+        previous = current
+
+    chosen = []
+    bound = n
+    for candidate in reversed(candidates):
+        i = int(np.argmin(candidate[:bound]))
+        chosen.append(int(order[i]))
+        bound = int(compatible[i])
+    chosen.sort(key=lambda i: (starts[i], i))
+    return chosen
+
+
+def selection_objective(picks, scores):
+    """
+    Summarize a selection as (number of intervals, total score).
+
+    :param picks: Chosen candidate indices.
+    :param scores: Score per candidate.
+    :return: Tuple of (count, total score).
+    """
+    return len(picks), float(sum(scores[i] for i in picks))
@@ -2,7 +2,6 @@
 
 #/usr/bin/env python
 import operator,random,math
-from . import prob
 
 ######
 #Parsers
@@ -269,6 +268,7 @@ def kmer_stats(kmer,dic,genfreqs):
     if kmer in dic.keys() and kmer in genfreqs.keys():
         observed = dic[kmer]
         expected = sum(dic.values())*genfreqs[kmer]
+        from . import prob
         snr = prob.snr(observed,expected)
         zscore = prob.zscore(observed, expected)
         return {'snr':snr,'zscore':zscore}
@@ -3,8 +3,27 @@
 from . import utils
 from . import thermo
 from . import sequencelib
+from . import tiling
 import primer3
 from . import HCR
+from . import metrics
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import time
+
+# Bit flags recorded in TileSet.mask describing why a candidate was rejected.
+MASK_N = 1
+MASK_RUNS = 2
+MASK_HAIRPIN = 4
+MASK_GENOME = 8
+MASK_GC = 16
+MASK_GIBBS = 32
+MASK_DTM = 64
+
+# Max number of distinct (sequence, thermodynamic parameters) hairpin results kept in memory.
+HAIRPIN_CACHE_SIZE = 2**16
 
 
 # This class is used to raise exceptions.
@@ -15,16 +34,55 @@ class TileError(Exception):
 	def __str__(self):
 		return repr(self.value)
 
+class _RowField:
+	"""Tile attribute stored in the owning TileSet column when the tile is a row view."""
+	def __init__(self,column):
+		self.column = column
+		self.slot = f"_{column}"
+
+	def __get__(self,tile,owner=None):
+		if tile is None:
+			return self
+		if tile.tileSet is not None:
+			return getattr(tile.tileSet,self.column)[tile.row].item()
+		return getattr(tile,self.slot)
+
+	def __set__(self,tile,value):
+		if tile.tileSet is not None:
+			getattr(tile.tileSet,self.column)[tile.row] = value
+		else:
+			setattr(tile,self.slot,value)
+
 class Tile:
-	"""Represents a candidate probe tile extracted from a target sequence."""
-	def __init__(self,sequence,seqName,startPos):
+	"""Represents a candidate probe tile extracted from a target sequence.
+
+	A Tile is either standalone or a lightweight view into one row of a
+	TileSet, in which case per-candidate metrics are read from and written to
+	the TileSet columns.
+	"""
+	__slots__ = ("sequence","startPos","start","end","seqName","name","masked",
+		"fivePrimeSeq","threePrimeSeq","P1","P2","channel","tileSet","row",
+		"_Gibbs","_dTm","_hitCount","_hairpinTm","_hairpinDg","_hairpinFound")
+
+	Gibbs = _RowField("Gibbs")
+	dTm = _RowField("dTm")
+	hitCount = _RowField("hitCount")
+	hairpinTm = _RowField("hairpinTm")
+	hairpinDg = _RowField("hairpinDg")
+	hairpinFound = _RowField("hairpinFound")
+
+	def __init__(self,sequence,seqName,startPos,tileSet=None,row=None):
 		"""
 		Initialize a Tile from a sequence and positional metadata.
 
 		:param sequence: Tile sequence (string).
 		:param seqName: Source sequence name.
 		:param startPos: 1-based start position in the source sequence.
+		:param tileSet: Optional TileSet this tile is a row view of.
+		:param row: Row index within tileSet.
 		"""
+		self.tileSet = tileSet
+		self.row = row
 		self.sequence = str.lower(sequence)
 		self.startPos = startPos
 		self.start = startPos
@@ -32,7 +90,8 @@ class Tile:
 		self.seqName = seqName
 		self.name = f"{self.seqName}:{self.start}-{self.start+len(self.sequence)}".replace(" ", "_")
 		self.masked = False
-		self.hitCount = -1 #-1 indicates that genome masking has not yet been performed.
+		if tileSet is None:
+			self.hitCount = -1 #-1 indicates that genome masking has not yet been performed.
 		#self.RajTM = self.calcRajTm()
 
 
@@ -92,6 +151,8 @@ class Tile:
 
 	def GC(self):
 		"""Return GC percentage for the tile sequence."""
+		if self.tileSet is not None:
+			return float(self.tileSet.calcGC()[self.row])
 		return float(sequencelib.gc_content(self.sequence))
 
 	#def oligoSequence(self):
@@ -125,11 +186,18 @@ class Tile:
 		'''
 		Calculate the Gibbs free energy of binding for a given sequence
 		'''
-		[dHs,dSs] = thermo.stacks_rna_dna(self.sequence)
-		[dHi,dSi] = thermo.init_rna_dna()
-		binding_energy = thermo.gibbs(dHs+dHi,dSs+dSi,temp=37)  # cal/mol
-		binding_energy = thermo.salt_adjust(binding_energy/1000,len(self.sequence),saltconc=0.33)  # kcal/mol
-		self.Gibbs = binding_energy
+		if self.tileSet is not None:
+			self.tileSet.calcGibbs()
+			return
+		self.Gibbs = _gibbs(self.sequence)
+
+	def calcHairpin(self,thermoParams=None):
+		'''
+		Screen the tile for hairpins with a single (memoized) primer3 call and keep the result
+
+		:param thermoParams: Optional dict of primer3 thermodynamic keyword arguments (e.g. mv_conc, temp_c)
+		'''
+		self.hairpinTm,self.hairpinDg,self.hairpinFound = calcHairpin(self.sequence,thermoParams)
 
 	def Tm(self):
 		"""Return the basic melting temperature estimate for the tile."""
@@ -174,15 +242,14 @@ class Tile:
 		Split sequence in half with two bases in the middle removed (flexible gap to help initiator sequence land)
 		ie. a 52mer will be split into two 25mers with the middle two bases of the 52mer dropped
 		"""
-		self.fivePrimeSeq = self.sequence[:int(len(self)/2)-1]
-		self.threePrimeSeq = self.sequence[int(len(self)/2)+1:]
+		self.fivePrimeSeq,self.threePrimeSeq = _splitSequence(self.sequence)
 		return
 
 	def calcdTm(self):
 		'''
 		Calculate the difference in melting temperature between the 5' and 3' sequences
 		'''
-		self.dTm = abs(primer3.calc_tm(self.fivePrimeSeq)-primer3.calc_tm(self.threePrimeSeq))
+		self.dTm = _dTm(self.fivePrimeSeq,self.threePrimeSeq)
 
 	#TODO: PLEASE check this to make sure that I'm adding the initiator sequences in the correct position and order
 	def makeProbes(self,channel):
@@ -194,3 +261,350 @@ class Tile:
 		self.P1 = HCR.initiators[channel]["odd"]+self.threePrimeSeq
 		self.P2 = self.fivePrimeSeq + HCR.initiators[channel]["even"]
 		self.channel = channel
+
+
+def _gibbs(sequence):
+	"""Return the salt-adjusted RNA/DNA Gibbs free energy (kcal/mol) of a sequence."""
+	[dHs,dSs] = thermo.stacks_rna_dna(sequence)
+	[dHi,dSi] = thermo.init_rna_dna()
+	binding_energy = thermo.gibbs(dHs+dHi,dSs+dSi,temp=37)  # cal/mol
+	return thermo.salt_adjust(binding_energy/1000,len(sequence),saltconc=0.33)  # kcal/mol
+
+class _LRUCache:
+	"""Minimal bounded least-recently-used mapping."""
+	def __init__(self,maxsize):
+		self.maxsize = maxsize
+		self._data = OrderedDict()
+
+	def get(self,key,default=None):
+		if key not in self._data:
+			return default
+		self._data.move_to_end(key)
+		return self._data[key]
+
+	def put(self,key,value):
+		self._data[key] = value
+		self._data.move_to_end(key)
+		if len(self._data) > self.maxsize:
+			self._data.popitem(last=False)
+
+	def clear(self):
+		self._data.clear()
+
+	def __contains__(self,key):
+		return key in self._data
+
+	def __len__(self):
+		return len(self._data)
+
+_hairpinCache = _LRUCache(HAIRPIN_CACHE_SIZE)
+
+def _hairpinKey(thermoParams):
+	"""Return a hashable cache key for a dict of primer3 thermodynamic parameters."""
+	return tuple(sorted((thermoParams or {}).items()))
+
+def _primer3Hairpin(sequence,thermoParams):
+	"""Run primer3.calc_hairpin and return (tm, dg, structure_found)."""
+	res = primer3.calc_hairpin(sequence,**dict(thermoParams))
+	return (res.tm,res.dg,bool(res.structure_found))
+
+def calcHairpin(sequence,thermoParams=None):
+	"""
+	Return the (tm, dg, structure_found) hairpin prediction for a sequence.
+
+	Results are kept in a bounded LRU cache keyed by sequence and
+	thermodynamic parameters, so repeated sequences (shared isoform exons,
+	batch records) only pay for one primer3 call.
+
+	:param sequence: Probe sequence.
+	:param thermoParams: Optional dict of primer3 thermodynamic keyword arguments.
+	:return: Tuple of (tm, dg, structure_found).
+	"""
+	key = (sequence,_hairpinKey(thermoParams))
+	result = _hairpinCache.get(key)
+	if result is None:
+		result = _primer3Hairpin(*key)
+		_hairpinCache.put(key,result)
+	return result
+
+def clearHairpinCache():
+	"""Drop all memoized hairpin results."""
+	_hairpinCache.clear()
+
+##############
+# Process-pool execution of primer3-bound stages
+##############
+_executor = None
+_executorWorkers = 0
+
+def _getExecutor(workers):
+	"""Return a process pool with the requested number of workers, reused across stages."""
+	global _executor,_executorWorkers
+	if _executor is None or _executorWorkers != workers:
+		if _executor is not None:
+			_executor.shutdown()
+		_executor = ProcessPoolExecutor(max_workers=workers)
+		_executorWorkers = workers
+	return _executor
+
+@atexit.register
+def _shutdownExecutor():
+	global _executor
+	if _executor is not None:
+		_executor.shutdown()
+		_executor = None
+
+def mapBatches(func,items,workers=1,*args):
+	"""
+	Apply a batch function to contiguous batches of items, optionally in worker processes.
+
+	Results are returned in the original order regardless of which worker
+	finished first.  With workers <= 1 everything runs in this process.
+
+	:param func: Picklable module-level function taking (batch, *args) and returning a list.
+	:param items: Sequence of inputs.
+	:param workers: Number of worker processes.
+	:return: Flat list of results aligned with items.
+	"""
+	items = list(items)
+	if workers is None or workers <= 1 or len(items) < 2:
+		return func(items,*args)
+	batchSize = max(64,-(-len(items)//(workers*4)))
+	batches = [items[i:i+batchSize] for i in range(0,len(items),batchSize)]
+	if len(batches) == 1:
+		return func(items,*args)
+	results = []
+	for batchResult,cpuSeconds,peakRss in _getExecutor(workers).map(_timedBatch,[func]*len(batches),batches,*[[arg]*len(batches) for arg in args]):
+		#Pool workers live until exit, so their CPU time is reported per batch rather than reaped
+		metrics.add_worker_usage(cpuSeconds,peakRss)
+		results.extend(batchResult)
+	return results
+
+def _timedBatch(func,batch,*args):
+	"""Worker entry point: run a batch function and report its CPU time and the worker's peak RSS."""
+	start = time.process_time()
+	result = func(batch,*args)
+	return result,time.process_time()-start,metrics.peak_rss_mb()[0]
+
+def _hairpinBatch(sequences,thermoParams):
+	"""Worker entry point: hairpin predictions for a batch of sequences."""
+	return [_primer3Hairpin(seq,thermoParams) for seq in sequences]
+
+def _dTmBatch(sequences):
+	"""Worker entry point: half-probe Tm differences for a batch of tile sequences."""
+	return [_dTm(*_splitSequence(seq)) for seq in sequences]
+
+def _tmBatch(sequences):
+	"""Worker entry point: primer3 Tm for a batch of sequences."""
+	return [primer3.calc_tm(seq) for seq in sequences]
+
+def calcTms(sequences,workers=1):
+	"""
+	Return primer3 melting temperatures for a list of sequences.
+
+	:param sequences: Probe sequences.
+	:param workers: Number of worker processes.
+	:return: List of Tm values in input order.
+	"""
+	return mapBatches(_tmBatch,sequences,workers)
+
+def _splitSequence(sequence):
+	"""Split a tile sequence into 5' and 3' halves, dropping the middle two bases."""
+	half = int(len(sequence)/2)
+	return sequence[:half-1],sequence[half+1:]
+
+def _dTm(fivePrimeSeq,threePrimeSeq):
+	"""Return the absolute primer3 Tm difference between two probe halves."""
+	return abs(primer3.calc_tm(fivePrimeSeq)-primer3.calc_tm(threePrimeSeq))
+
+
+class TileSet:
+	"""Columnar collection of every candidate tile across one target sequence.
+
+	Per-candidate state is held in parallel NumPy arrays (one row per tile
+	window) instead of per-object attributes.  Filters set bits in ``mask``
+	rather than rebuilding lists; a row is active while its mask is zero.
+	Tile objects are only materialized as views for rows that are needed.
+	"""
+	def __init__(self,targetTiling,seqName):
+		"""
+		Initialize a TileSet over an encoded target.
+
+		:param targetTiling: tiling.TargetTiling for the target sequence.
+		:param seqName: Source sequence name.
+		"""
+		n = len(targetTiling)
+		self.tiling = targetTiling
+		self.seqName = seqName
+		self.tileSize = targetTiling.tileSize
+		self.start = targetTiling.starts + 1
+		self.end = self.start + self.tileSize
+		self.GC = np.full(n,np.nan)
+		self.Gibbs = np.full(n,np.nan)
+		self.Tm = np.full(n,np.nan)
+		self.dTm = np.full(n,np.nan)
+		self.hitCount = np.full(n,-1,dtype=np.int64)
+		self.armHits = np.full(n,-1,dtype=np.int64) # Combined off-target hits of both binding arms
+		self.hairpinTm = np.full(n,np.nan)
+		self.hairpinDg = np.full(n,np.nan)
+		self.hairpinFound = np.zeros(n,dtype=bool)
+		self.mask = np.where(targetTiling.masked,MASK_N,0).astype(np.uint16)
+		self._gcComputed = False
+		self._gibbsComputed = False
+
+	@classmethod
+	def fromSequence(cls,sequence,seqName,tileStep=1,tileSize=52):
+		"""
+		Tile across the reverse complement of a sequence.
+
+		:param sequence: Target sequence.
+		:param seqName: Source sequence name.
+		:param tileStep: Step between tile starts.
+		:param tileSize: Tile length.
+		:return: TileSet with windows containing masked bases already rejected.
+		"""
+		return cls(tiling.TargetTiling(sequence,tileSize=tileSize,tileStep=tileStep),seqName)
+
+	def __len__(self):
+		"""Return the number of active (unrejected) tiles."""
+		return int(np.count_nonzero(self.mask == 0))
+
+	@property
+	def active(self):
+		"""Boolean array flagging rows that have not been rejected."""
+		return self.mask == 0
+
+	def rows(self):
+		"""Return the indices of active rows."""
+		return np.flatnonzero(self.mask == 0)
+
+	def sequence(self,row):
+		"""Return the tile sequence for a row."""
+		return self.tiling.tileSequence(row)
+
+	def sequences(self,rows=None):
+		"""Return tile sequences for the given rows (default: active rows)."""
+		if rows is None:
+			rows = self.rows()
+		return [self.tiling.tileSequence(row) for row in rows]
+
+	def armSequences(self,rows=None):
+		"""
+		Return the 5' and 3' binding-arm sequences (see Tile.splitProbe) for the given rows.
+
+		:param rows: Row indices (default: active rows).
+		:return: Tuple of (fivePrimeSeqs, threePrimeSeqs) lists.
+		"""
+		arms = [_splitSequence(sequence) for sequence in self.sequences(rows)]
+		return [five for five,_ in arms],[three for _,three in arms]
+
+	def name(self,row):
+		"""Return the tile name for a row."""
+		start = int(self.start[row])
+		return f"{self.seqName}:{start}-{start+self.tileSize}".replace(" ", "_")
+
+	def toFasta(self,rows=None):
+		"""Return active rows (or the given rows) formatted as FASTA records."""
+		if rows is None:
+			rows = self.rows()
+		return "\n".join([f'>{self.name(row)}\n{self.sequence(row)}' for row in rows])
+
+	def reject(self,rows,flag):
+		"""
+		Mark rows as rejected.
+
+		:param rows: Row indices (or boolean array over all rows) to reject.
+		:param flag: MASK_* bit recording the reason.
+		"""
+		self.mask[rows] |= flag
+
+	def applyFilter(self,keep,flag):
+		"""
+		Reject active rows that fail a filter.
+
+		:param keep: Boolean array over all rows; False rejects the row.
+		:param flag: MASK_* bit recording the reason.
+		"""
+		self.mask[self.active & ~keep] |= flag
+
+	def hasRuns(self,runChar,runLength,mismatches):
+		"""
+		Flag rows containing a homopolymer run (see Tile.hasRuns), computed for all rows at once.
+
+		:param runChar: Character that forms the run.
+		:param runLength: Length of the run window.
+		:param mismatches: Number of mismatches allowed in the run.
+		:return: Boolean array over all rows.
+		"""
+		return self.tiling.runWindows(runChar,runLength,mismatches)
+
+	def calcHairpins(self,thermoParams=None,workers=1):
+		"""
+		Screen active rows for hairpins (one memoized primer3 call per distinct sequence).
+
+		:param thermoParams: Optional dict of primer3 thermodynamic keyword arguments.
+		:param workers: Number of worker processes for uncached sequences.
+		"""
+		rows = self.rows()
+		sequences = self.sequences(rows)
+		paramKey = _hairpinKey(thermoParams)
+		#Results for this call are kept locally; the LRU only memoizes across calls and may be smaller than one target
+		results = {seq:_hairpinCache.get((seq,paramKey)) for seq in dict.fromkeys(sequences)}
+		missing = [seq for seq,result in results.items() if result is None]
+		for seq,result in zip(missing,mapBatches(_hairpinBatch,missing,workers,paramKey)):
+			results[seq] = result
+			_hairpinCache.put((seq,paramKey),result)
+		for row,seq in zip(rows,sequences):
+			self.hairpinTm[row],self.hairpinDg[row],self.hairpinFound[row] = results[seq]
+
+	def calcGC(self):
+		"""Compute GC percentage for every row once from prefix sums (cached in the GC column)."""
+		if not self._gcComputed:
+			self.GC[:] = self.tiling.gcContent()
+			self._gcComputed = True
+		return self.GC
+
+	def calcGibbs(self):
+		"""Compute Gibbs free energy for every row once from stack prefix sums (cached in the Gibbs column)."""
+		if not self._gibbsComputed:
+			if len(self.tiling):
+				energies = thermo.gibbs_rna_dna_windows(self.tiling.rcCodes,self.tileSize)
+				self.Gibbs[:] = energies[self.tiling.rcOffsets]
+			self._gibbsComputed = True
+		return self.Gibbs
+
+	def calcTm(self,rows=None,workers=1):
+		"""
+		Compute primer3 Tm for rows not yet filled in the Tm column.
+
+		:param rows: Row indices (default: active rows).
+		:param workers: Number of worker processes.
+		"""
+		if rows is None:
+			rows = self.rows()
+		rows = np.asarray(rows,dtype=np.int64)
+		rows = np.unique(rows[np.isnan(self.Tm[rows])])
+		if len(rows):
+			self.Tm[rows] = calcTms(self.sequences(rows),workers)
+		return self.Tm
+
+	def calcdTm(self,workers=1):
+		"""
+		Compute the Tm difference between probe halves for active rows.
+
+		:param workers: Number of worker processes.
+		"""
+		rows = self.rows()
+		self.dTm[rows] = mapBatches(_dTmBatch,self.sequences(rows),workers)
+		return self.dTm
+
+	def tile(self,row):
+		"""Return a Tile view of a row."""
+		row = int(row)
+		return Tile(sequence=self.sequence(row),seqName=self.seqName,startPos=int(self.start[row]),tileSet=self,row=row)
+
+	def tiles(self,rows=None):
+		"""Return Tile views for the given rows (default: active rows)."""
+		if rows is None:
+			rows = self.rows()
+		return [self.tile(row) for row in rows]
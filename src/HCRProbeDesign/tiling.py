@@ -0,0 +1,181 @@
+"""Vectorized tiling of target sequences using NumPy.
+
+The target is encoded once as a ``uint8`` array and reverse complemented once.
+Every candidate tile is then a fixed-size slice of the reverse complement, so
+per-tile work can be done as whole-array passes over prefix sums.
+"""
+
+import numpy as np
+
+BASES = "acgt"
+MASK_CODE = 4  # Any character that is not A/C/G/T (e.g. N from repeat masking)
+TARGET_CHARS = "acgtnACGTN"  # Characters accepted in a target sequence
+
+_ENCODE = np.full(256, MASK_CODE, dtype=np.uint8)
+for _code, _base in enumerate(BASES):
+    _ENCODE[ord(_base)] = _code
+    _ENCODE[ord(_base.upper())] = _code
+del _code, _base
+
+_TARGET_CHAR = np.zeros(256, dtype=bool)
+_TARGET_CHAR[np.frombuffer(TARGET_CHARS.encode(), dtype=np.uint8)] = True
+
+_COMPLEMENT = np.array([3, 2, 1, 0, MASK_CODE], dtype=np.uint8)
+_DECODE = np.frombuffer(b"acgtn", dtype=np.uint8)
+
+
+def encode(sequence, strict=False):
+    """
+    Encode a nucleotide sequence as base codes (a=0, c=1, g=2, t=3, other=4).
+
+    Genome references may contain IUPAC ambiguity codes, which are encoded
+    like N.  Targets are encoded with ``strict`` so that characters other than
+    A/C/G/T/N (IUPAC codes, U, gaps) are reported instead of silently masking
+    every tile that covers them.
+
+    :param sequence: Nucleotide sequence (str or bytes, any case).
+    :param strict: Raise on characters other than A/C/G/T/N.
+    :return: uint8 NumPy array of base codes.
+    :raises ValueError: With ``strict``, if the sequence has other characters.
+    """
+    if isinstance(sequence, str):
+        sequence = sequence.encode("ascii", "replace")
+    raw = np.frombuffer(sequence, dtype=np.uint8)
+    if strict:
+        invalid = np.flatnonzero(~_TARGET_CHAR[raw])
+        if len(invalid):
+            chars = sorted(set(bytes(raw[invalid]).decode("ascii", "replace")))
+            raise ValueError(
+                f"Unsupported character(s) {', '.join(map(repr, chars))} in target sequence "
+                f"(first at position {invalid[0] + 1}); only A, C, G, T and N are allowed"
+            )
+    return _ENCODE[raw]
+
+
+def decode(codes):
+    """
+    Decode base codes back into a lowercase sequence string.
+
+    :param codes: uint8 array of base codes.
+    :return: Lowercase sequence string (masked positions become 'n').
+    """
+    return _DECODE[codes].tobytes().decode("ascii")
+
+
+def reverse_complement_codes(codes):
+    """
+    Reverse complement an array of base codes.
+
+    :param codes: uint8 array of base codes.
+    :return: New uint8 array holding the reverse complement.
+    """
+    return _COMPLEMENT[codes[::-1]]
+
+
+def window_counts(values, windowSize):
+    """
+    Sum a per-position array over every window of a fixed size.
+
+    :param values: 1-D array of per-position values (bool or numeric).
+    :param windowSize: Window length.
+    :return: Array of length ``len(values) - windowSize + 1`` with window sums.
+    """
+    cumulative = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    return cumulative[windowSize:] - cumulative[:len(cumulative) - windowSize]
+
+
+class TargetTiling:
+    """Encoded target sequence with the offsets of every tile window.
+
+    Tiles are the reverse complement of the target window starting at each
+    entry of ``starts`` (0-based).  Tile ``i`` therefore corresponds to the
+    reverse-complement slice ``rcOffsets[i]:rcOffsets[i]+tileSize``.
+    """
+
+    def __init__(self, sequence, tileSize=52, tileStep=1):
+        """
+        Encode a target and pre-compute window offsets and N-masking.
+
+        :param sequence: Target sequence (A/C/G/T/N, any case).
+        :param tileSize: Tile length.
+        :param tileStep: Step between consecutive tile starts.
+        :raises ValueError: If the sequence has characters other than A/C/G/T/N.
+        """
+        self.tileSize = tileSize
+        self.tileStep = tileStep
+        self.codes = encode(sequence, strict=True)
+        self.rcCodes = reverse_complement_codes(self.codes)
+        self.length = len(self.codes)
+        nWindows = max(0, (self.length - tileSize) // tileStep + 1)
+        self.starts = np.arange(nWindows, dtype=np.int64) * tileStep
+        self.rcOffsets = self.length - self.starts - tileSize
+        if nWindows:
+            nCounts = window_counts(self.codes == MASK_CODE, tileSize)
+            self.masked = nCounts[self.starts] > 0
+        else:
+            self.masked = np.zeros(0, dtype=bool)
+        self._rcSequence = None
+
+    def __len__(self):
+        """Return the number of tile windows."""
+        return len(self.starts)
+
+    @property
+    def rcSequence(self):
+        """Lowercase reverse complement of the full target, decoded once."""
+        if self._rcSequence is None:
+            self._rcSequence = decode(self.rcCodes)
+        return self._rcSequence
+
+    def gcContent(self):
+        """
+        Return the GC percentage of every tile from one cumulative count pass.
+
+        Matches ``sequencelib.gc_content`` (GC over GC+AT, ignoring masked
+        bases); windows without any A/C/G/T are NaN.
+
+        :return: Float array with one entry per tile.
+        """
+        if not len(self):
+            return np.zeros(0)
+        gc = window_counts((self.codes == 1) | (self.codes == 2), self.tileSize)[self.starts]
+        at = window_counts((self.codes == 0) | (self.codes == 3), self.tileSize)[self.starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 100 * gc / (gc + at).astype(np.float64)
+
+    def runWindows(self, runChar, runLength, mismatches):
+        """
+        Flag every tile containing a run of ``runChar`` allowing mismatches.
+
+        Equivalent to ``Tile.hasRuns(runChar, runLength, mismatches)`` for each
+        tile, but computed for the whole target with one cumulative-sum pass
+        for the per-position run counts and one for the per-tile hits.
+
+        :param runChar: Base to look for (matched against lowercase tiles).
+        :param runLength: Length of the run window.
+        :param mismatches: Number of non-``runChar`` bases tolerated per run.
+        :return: Boolean array with one entry per tile.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=bool)  # Target shorter than one tile
+        nSubWindows = self.tileSize - runLength + 1
+        if runLength <= 0 or nSubWindows <= 0 or runLength > self.length:
+            # No run windows are counted, so the answer depends on the threshold alone.
+            hasRun = runLength <= 0 and nSubWindows > 0 and runLength - mismatches <= 0
+            return np.full(len(self), hasRun, dtype=bool)
+        if runChar in BASES:
+            matches = self.rcCodes == BASES.index(runChar)
+        else:
+            matches = np.zeros(self.length, dtype=bool)
+        runHits = window_counts(matches, runLength) >= runLength - mismatches
+        return window_counts(runHits, nSubWindows)[self.rcOffsets] > 0
+
+    def tileSequence(self, i):
+        """
+        Return the (reverse complemented) sequence of tile ``i``.
+
+        :param i: Tile index.
+        :return: Lowercase tile sequence.
+        """
+        offset = int(self.rcOffsets[i])
+        return self.rcSequence[offset:offset + self.tileSize]
@@ -4,44 +4,11 @@ import string
 import operator
 import random
 import math
-from Bio import Restriction
 import sys
 import types
 
-##############
-#FastaIterator
-##############
-def FastaIterator(handle):
-    """
-    Generator function to iterate over fasta records in <handle>:
-    Use in a loop to apply to each sequence record contained in a .fasta file
-    Input: record handle as obtained by handle = open(<file>,'r')
-    Returns an iterator across sequences in file
-    """
-    #Skip any header text
-    while True:
-        line = handle.readline()
-        if line == "" : return #Premature end of file, or just empty?
-        if line [0] == ">":
-            break
-
-    while True:
-        if line[0] != ">":
-            raise ValueError("Records in Fasta files should start with a '>' character")
-        name = line[1:].rstrip()
-        lines = []
-        line = handle.readline()
-        while True:
-            if not line : break
-            if line[0] == ">" : break
-            lines.append(line.rstrip().replace(" ",""))
-            line = handle.readline()
-        #Return record then continue
-        newSeq = {'name':name,'sequence':"".join(lines)}
-        yield newSeq
-
-        if not line : return #StopIteration
-    assert False, "Should not reach this line"
+# Kept importable from here for backwards compatibility; sequencelib owns the implementation.
+from .sequencelib import FastaIterator  # noqa: F401
 
 
 def eprint(*args, **kwargs):
@@ -317,6 +284,8 @@ def hasRestrictionSites(sequence,sites):
 	"""
 	#Parse sites
 	sites = sites.split(",")
+	from Bio import Restriction
+	from Bio.Seq import Seq
 	rb = Restriction.RestrictionBatch(sites)
 
 	#Get Bio.Seq object
@@ -346,6 +315,8 @@ def warnRestrictionSites(sequence,name,sites):
 	:return: None.
 	"""
 	sites = sites.split(",")
+	from Bio import Restriction
+	from Bio.Seq import Seq
 	rb = Restriction.RestrictionBatch(sites)
 
 	#Get Bio.Seq object
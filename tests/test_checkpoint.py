@@ -0,0 +1,31 @@
+import argparse
+
+from HCRProbeDesign import checkpoint
+
+
+def _args(**overrides):
+    params = dict(tileSize=52, maxProbes=20, workers=1, jobs=1, output=None, resume=False)
+    params.update(overrides)
+    return argparse.Namespace(**params)
+
+
+def test_record_key_tracks_sequence_channel_and_result_params():
+    record = {"name": "gene", "sequence": "ACGT"}
+    key = checkpoint.record_key(record, "B1", _args())
+
+    assert checkpoint.record_key(dict(record), "B1", _args(workers=8, jobs=4, resume=True)) == key
+    assert checkpoint.record_key(record, "B2", _args()) != key
+    assert checkpoint.record_key({"name": "gene", "sequence": "ACGA"}, "B1", _args()) != key
+    assert checkpoint.record_key(record, "B1", _args(maxProbes=10)) != key
+    assert checkpoint.record_key(record, "B1", _args(), "index-v2") != checkpoint.record_key(record, "B1", _args(), "index-v1")
+
+
+def test_store_round_trip_and_ignores_partial_files(tmp_path):
+    store = checkpoint.CheckpointStore(str(tmp_path / "ckpt"))
+    assert store.load("missing") is None
+
+    store.save("abc", {"name": "gene", "table": ["row\n"], "cost": 1.5})
+    assert store.load("abc") == {"name": "gene", "table": ["row\n"], "cost": 1.5}
+
+    (tmp_path / "ckpt" / "broken.json").write_text('{"name": ')
+    assert store.load("broken") is None
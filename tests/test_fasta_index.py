@@ -0,0 +1,182 @@
+import gzip
+import io
+import os
+
+import pytest
+
+from HCRProbeDesign import fastaIndex, sequencelib
+
+FASTA = (
+    "some preamble\n"
+    ">geneA channel=B2 first gene\n"
+    "ACGTACGTAC\n"
+    "GTACGTACGT\n"
+    "acg\n"
+    ">geneB\n"
+    "TTTTGGGGCC\n"
+    ">ragged description\n"
+    "AAAA\n"
+    "CC GG\n"
+    "TTTTTT\n"
+    ">empty\n"
+)
+
+
+def _expected():
+    return list(sequencelib.FastaIterator(io.StringIO(FASTA)))
+
+
+def test_records_match_fasta_iterator(tmp_path):
+    path = tmp_path / "in.fa"
+    path.write_text(FASTA)
+
+    with fastaIndex.IndexedFasta(str(path)) as fasta:
+        assert list(fasta.records()) == _expected()
+        assert fasta.names == ["geneA", "geneB", "ragged", "empty"]
+        assert "geneB" in fasta and len(fasta) == 4
+        assert fasta.length("geneA") == 23
+        assert fasta.length("ragged") == 14
+
+    # Irregular records cannot be described by a .fai, so none is cached
+    with fastaIndex.IndexedFasta(str(path), cacheIndex=True):
+        pass
+    assert not (tmp_path / "in.fa.fai").exists()
+    assert not os.path.exists(fastaIndex.get_fai_cache_path(str(path)))
+
+
+def test_fetch_slices_and_zero_copy_views(tmp_path):
+    path = tmp_path / "in.fa"
+    path.write_text(FASTA.split(">ragged")[0])
+
+    with fastaIndex.IndexedFasta(str(path), cacheIndex=True) as fasta:
+        whole = "ACGTACGTACGTACGTACGTacg"
+        assert fasta.fetch("geneA") == whole
+        for start, end in [(0, 10), (3, 7), (8, 15), (5, None), (20, 23), (4, 4)]:
+            assert fasta.fetch("geneA", start, end) == whole[start:end]
+        assert isinstance(fasta.view("geneA", 2, 9), memoryview)
+        assert fasta.header("geneA") == "geneA channel=B2 first gene"
+        with pytest.raises(KeyError):
+            fasta.fetch("missing")
+
+    # The index is cached in the data directory, never next to the input
+    assert not (tmp_path / "in.fa.fai").exists()
+    entries = fastaIndex.read_fai(fastaIndex.get_fai_cache_path(str(path)))
+    assert entries[0] == fastaIndex.FaiEntry("geneA", 23, 43, 10, 11)
+
+    # A second open reuses the cached index, including full headers
+    with fastaIndex.IndexedFasta(str(path)) as fasta:
+        assert fasta.entries == entries
+        assert list(fasta.records()) == list(sequencelib.FastaIterator(io.StringIO(path.read_text())))
+
+
+def test_gzip_input(tmp_path):
+    path = tmp_path / "in.fa.gz"
+    with gzip.open(path, "wt") as handle:
+        handle.write(FASTA)
+
+    with fastaIndex.IndexedFasta(str(path)) as fasta:
+        assert list(fasta.records()) == _expected()
+    assert not (tmp_path / "in.fa.gz.fai").exists()
+
+
+def test_bgzf_input(tmp_path):
+    pysam = pytest.importorskip("pysam")
+    path = tmp_path / "in.fa"
+    path.write_text(FASTA.split(">ragged")[0].replace("some preamble\n", ""))
+    pysam.tabix_compress(str(path), str(path) + ".gz")
+
+    assert fastaIndex.is_bgzf(str(path) + ".gz")
+    with fastaIndex.IndexedFasta(str(path) + ".gz") as fasta:
+        assert fasta.fetch("geneA", 8, 15) == "ACGTACG"
+        assert fasta.header("geneA") == "geneA channel=B2 first gene"
+
+
+def test_open_records_streams_non_file_handles():
+    assert list(fastaIndex.open_records(io.StringIO(FASTA))) == _expected()
+
+
+def test_stale_fai_is_rebuilt(tmp_path):
+    path = tmp_path / "in.fa"
+    path.write_text(">geneA\nACGT\nAC\n")
+    fastaIndex.IndexedFasta(str(path), cacheIndex=True).close()
+    path.write_text(">geneZ\nTTTTTT\nGG\n")
+    cached = fastaIndex.get_fai_cache_path(str(path))
+    os.utime(cached)  # Index looks newer than the rewritten FASTA
+
+    with fastaIndex.IndexedFasta(str(path)) as fasta:
+        assert fasta.names == ["geneZ"]
+        assert fasta.fetch("geneZ") == "TTTTTTGG"
+
+
+def test_samtools_fai_is_reused_but_never_overwritten(tmp_path):
+    path = tmp_path / "in.fa"
+    path.write_text(">geneA\nACGT\nAC\n")
+    fai = tmp_path / "in.fa.fai"
+    fai.write_text("geneA\t6\t7\t4\t5\n")
+    with fastaIndex.IndexedFasta(str(path)) as fasta:
+        assert fasta.fetch("geneA") == "ACGTAC"
+
+    # An older (or stale) samtools index is ignored and left as it is
+    path.write_text(">geneZ\nTTTTTT\nGG\n")
+    os.utime(fai, (0, 0))
+    with fastaIndex.IndexedFasta(str(path), cacheIndex=True) as fasta:
+        assert fasta.names == ["geneZ"]
+    assert fai.read_text() == "geneA\t6\t7\t4\t5\n"
+
+
+def test_read_record_ids(tmp_path):
+    ids = tmp_path / "ids.txt"
+    ids.write_text("# panel\ngeneB\n\n>geneA extra words\ngeneB\n")
+    assert fastaIndex.read_record_ids(str(ids)) == ["geneB", "geneA"]
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_open_records_selects_by_name_or_regex(tmp_path, indexed):
+    path = tmp_path / "in.fa"
+    path.write_text(FASTA)
+
+    def select(**kwargs):
+        handle = open(path) if indexed else io.StringIO(FASTA)
+        with handle:
+            return [record["name"] for record in fastaIndex.open_records(handle, **kwargs)]
+
+    assert select(names=["geneB", "geneA"]) == ["geneA channel=B2 first gene", "geneB"]
+    assert select(pattern="channel=B2|^rag") == ["geneA channel=B2 first gene", "ragged description"]
+    with pytest.raises(KeyError) as err:
+        select(names=["geneA", "nope"])
+    assert err.value.args[0] == ["nope"]
+
+
+DUPLICATES = ">Sox2 channel=B1\nACGTACGTAC\nGG\n>Nanog\nCCCC\n>Sox2 channel=B2\nTTTTGGGGAA\nT\n"
+
+
+@pytest.mark.parametrize("compress", [None, "gzip", "bgzf"])
+def test_records_sharing_a_name_are_all_kept(tmp_path, compress):
+    path = tmp_path / "dup.fa"
+    path.write_text(DUPLICATES)
+    if compress == "gzip":
+        with gzip.open(tmp_path / "dup.fa.gz", "wt") as handle:
+            handle.write(DUPLICATES)
+        path = tmp_path / "dup.fa.gz"
+    elif compress == "bgzf":
+        pysam = pytest.importorskip("pysam")
+        pysam.tabix_compress(str(path), str(path) + ".gz")
+        path = tmp_path / "dup.fa.gz"
+    expected = list(sequencelib.FastaIterator(io.StringIO(DUPLICATES)))
+
+    def select(**kwargs):
+        with open(path) as handle:
+            return list(fastaIndex.open_records(handle, **kwargs))
+
+    assert select() == expected
+    assert select(names=["Sox2"]) == [expected[0], expected[2]]
+    assert select(pattern="B2") == [expected[2]]
+    if compress is None:
+        with fastaIndex.IndexedFasta(str(path)) as fasta:
+            assert fasta.indices("Sox2") == [0, 2] and not fasta.unique
+            assert fasta.fetch("Sox2") == "ACGTACGTACGG"
+        # The cached .fai keeps both entries
+        with fastaIndex.IndexedFasta(str(path), cacheIndex=True):
+            pass
+        with fastaIndex.IndexedFasta(str(path)) as fasta:
+            assert list(fasta.records()) == expected
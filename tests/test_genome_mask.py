@@ -36,3 +36,182 @@ def test_genomemask_uses_relative_index(monkeypatch, tmp_path):
 
     idx = captured["cmd"].index("-x") + 1
     assert captured["cmd"][idx] == os.path.join(data_dir, "indices/mm10/mm10")
+
+
+FAKE_BOWTIE2 = '''#!{python}
+import sys
+names = []
+for line in sys.stdin:
+    if line.startswith(">"):
+        names.append(line[1:].strip())
+for name in names:
+    if "unmapped" in name:
+        print(f"{{name}}\\t4\\t*\\t0\\t0\\t*\\t*\\t0\\t0\\tACGT\\t*")
+        continue
+    hits = 3 if "multi" in name else 1
+    for i in range(hits):
+        flag = 0 if i == 0 else 256
+        print(f"{{name}}\\t{{flag}}\\tchr1\\t{{100 + i}}\\t255\\t4M\\t*\\t0\\t0\\tACGT\\tIIII")
+'''
+
+
+def _install_fake_bowtie2(tmp_path, monkeypatch):
+    import sys
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "bowtie2"
+    script.write_text(FAKE_BOWTIE2.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_count_hits_from_sam_lines_groups_consecutive_records():
+    lines = [
+        "@HD\tVN:1.0",
+        "r1\t0\tchr1\t1\t255\t4M\t*\t0\t0\tACGT\tIIII\n",
+        "r1\t256\tchr2\t1\t255\t4M\t*\t0\t0\tACGT\tIIII\n",
+        "r2\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\t*\n",
+        "r3\t16\tchr1\t9\t255\t4M\t*\t0\t0\tACGT\tIIII\n",
+    ]
+    assert list(gm.countHitsFromSamLines(lines)) == [("r1", 2), ("r2", 0), ("r3", 1)]
+
+
+def test_genomemask_stream_keeps_stdout_clean(monkeypatch, tmp_path, capsys):
+    _install_fake_bowtie2(tmp_path, monkeypatch)
+    list(gm.genomemask_stream([("tile_a", "ACGT")], index="/abs/index"))
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "/abs/index" in captured.err
+
+
+def test_genomemask_stream_writes_no_files(monkeypatch, tmp_path):
+    _install_fake_bowtie2(tmp_path, monkeypatch)
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+
+    reads = [("tile_a", "ACGT"), ("tile_multi", "ACGT"), ("tile_unmapped", "ACGT")]
+    counts = list(gm.genomemask_stream(reads, index="/abs/index"))
+
+    assert counts == [("tile_a", 1), ("tile_multi", 3), ("tile_unmapped", 0)]
+    assert list(work.iterdir()) == []
+
+
+def test_genomemask_passes_threads_preset_and_extra_args(monkeypatch, tmp_path):
+    captured = {}
+
+    def fake_call(cmd):
+        captured["cmd"] = cmd
+        return 0
+
+    monkeypatch.setattr(gm.subprocess, "call", fake_call)
+    monkeypatch.chdir(tmp_path)
+
+    gm.genomemask(
+        ">read1\nACGT\n", handleName="test", index="/abs/index",
+        threads=8, preset="very-fast", extra_args="--no-unal --end-to-end",
+    )
+
+    cmd = captured["cmd"]
+    assert cmd[cmd.index("-p") + 1] == "8"
+    assert "--reorder" in cmd
+    assert "--very-fast" in cmd
+    assert cmd[cmd.index("-x") - 2:cmd.index("-x")] == ["--no-unal", "--end-to-end"]
+
+
+def test_bowtie2_options_rejects_unknown_preset():
+    import pytest
+
+    with pytest.raises(ValueError, match="Unknown bowtie2 preset"):
+        gm._bowtie2_options(preset="ludicrous")
+
+
+def test_mask_server_counts_hits_over_socket(monkeypatch, tmp_path):
+    import threading
+
+    from HCRProbeDesign import maskServer
+
+    _install_fake_bowtie2(tmp_path, monkeypatch)
+    index = tmp_path / "idx"
+    (tmp_path / "idx.1.bt2").write_bytes(b"\0" * 64)
+    socket_path = str(tmp_path / "mask.sock")
+
+    server = maskServer.MaskServer(socket_path, str(index), preset="very-fast", extra_args="--score-min 'L,0,-0.2'")
+    assert server.extra_args == ["--score-min", "L,0,-0.2", "--mm"]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        fasta = ">tile_a\nACGT\n>tile_multi\nACGT\n>tile_unmapped\nACGT\n"
+        counts = list(gm.genomemask_server(fasta, socket_path))
+        info = gm.mask_server_info(socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert counts == [("tile_a", 1), ("tile_multi", 3), ("tile_unmapped", 0)]
+    assert info == {"index": str(index), "preset": "very-fast", "extra_args": ["--score-min", "L,0,-0.2"]}
+    assert not os.path.exists(socket_path)
+
+
+def test_mask_server_requires_index_files(tmp_path):
+    import pytest
+
+    from HCRProbeDesign import maskServer
+
+    with pytest.raises(FileNotFoundError):
+        maskServer._map_index(str(tmp_path / "missing"))
+
+
+SAM_STATS_LINES = [
+    "@HD\tVN:1.0\n",
+    "r1\t0\tchr1\t100\t255\t4M\t*\t0\t0\tACGT\tIIII\tAS:i:0\tXS:i:-6\tNM:i:0\n",
+    "r1\t256\tchr2\t50\t255\t4M\t*\t0\t0\tACGT\tIIII\tAS:i:-6\tNM:i:1\n",
+    "r1\t256\tchr3\t10\t255\t4M\t*\t0\t0\tACGT\tIIII\tAS:i:-15\tNM:i:3\n",
+    "r2\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\t*\tYT:Z:UU\n",
+    "r3\t16\tchr1\t9\t255\t4M\t*\t0\t0\tACGT\tIIII\tAS:i:-5\tNM:i:1\n",
+]
+
+
+def test_hit_stats_from_sam_lines_tracks_scores_and_off_target_mismatches():
+    stats = {s.name: s for s in gm.hitStatsFromSamLines(SAM_STATS_LINES)}
+
+    r1 = stats["r1"]
+    assert (r1.hits, r1.bestScore, r1.secondScore, r1.onTarget) == (3, 0, -6, True)
+    assert r1.offTargetMismatches == [1, 3]
+    assert r1.offTargets(1) == 1
+    assert r1.hitCount() == 3
+    assert r1.hitCount(maxMismatches=0) == 1
+    assert r1.hitCount(maxMismatches=2) == 2
+
+    assert stats["r2"].hits == 0 and stats["r2"].hitCount(2) == 0
+    # No perfect hit: the 1-mismatch alignment is off-target.
+    assert not stats["r3"].onTarget and stats["r3"].hitCount(1) == 1
+
+
+def test_hit_stats_use_target_region_when_given():
+    regions = {"r1": ("chr2", 40, 60)}
+    r1 = next(gm.hitStatsFromSamLines(SAM_STATS_LINES, regions=regions))
+    assert r1.onTarget
+    assert r1.offTargetMismatches == [0, 3]
+
+
+def test_hit_stats_from_bam_without_index(tmp_path):
+    import pysam
+
+    sam_path = tmp_path / "hits.sam"
+    header = "@HD\tVN:1.0\n@SQ\tSN:chr1\tLN:1000\n@SQ\tSN:chr2\tLN:1000\n@SQ\tSN:chr3\tLN:1000\n"
+    sam_path.write_text(header + "".join(SAM_STATS_LINES[1:]))
+    bam_path = tmp_path / "hits.bam"
+    with pysam.AlignmentFile(str(sam_path)) as sam, pysam.AlignmentFile(str(bam_path), "wb", template=sam) as bam:
+        for read in sam:
+            bam.write(read)
+
+    for path in (sam_path, bam_path):
+        stats = list(gm.hitStatsFromSam(str(path)))
+        assert [(s.name, s.hits, s.offTargetMismatches) for s in stats] == [
+            ("r1", 3, [1, 3]), ("r2", 0, []), ("r3", 1, [1]),
+        ]
+    for path in (sam_path, bam_path):
+        assert gm.countHitsFromSam(str(path)) == {"r1": 3, "r2": 0, "r3": 1}
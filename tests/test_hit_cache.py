@@ -0,0 +1,95 @@
+import os
+
+from HCRProbeDesign import genomeMask as gm
+from HCRProbeDesign import hitCache
+
+
+def _make_index(tmp_path, content=b"index"):
+    prefix = tmp_path / "idx"
+    (tmp_path / "idx.1.bt2").write_bytes(content)
+    return str(prefix)
+
+
+def test_index_checksum_changes_when_index_is_rebuilt(tmp_path):
+    assert hitCache.index_checksum(str(tmp_path / "missing")) is None
+    prefix = _make_index(tmp_path)
+    before = hitCache.index_checksum(prefix)
+    _make_index(tmp_path, b"rebuilt index")
+    assert hitCache.index_checksum(prefix) != before
+
+
+def test_index_files_ignore_sibling_indexes_sharing_the_prefix(tmp_path):
+    prefix = _make_index(tmp_path)
+    (tmp_path / "idx.rev.1.bt2l").write_bytes(b"large")
+    (tmp_path / "idx_ercc.1.bt2").write_bytes(b"sibling")
+    assert hitCache.index_files(prefix) == [str(tmp_path / "idx.1.bt2"), str(tmp_path / "idx.rev.1.bt2l")]
+    before = hitCache.index_checksum(prefix)
+    (tmp_path / "idx_ercc.1.bt2").write_bytes(b"rebuilt sibling")
+    assert hitCache.index_checksum(prefix) == before
+
+
+def test_lookup_and_store_are_keyed_by_index_and_params(tmp_path):
+    with hitCache.HitCache(str(tmp_path / "cache.sqlite")) as cache:
+        cache.store("key", "-k3", {"ACGT": 2, "ttgg": 0})
+        assert cache.lookup("key", "-k3", ["acgt", "TTGG", "cccc"]) == {"acgt": 2, "ttgg": 0}
+        assert cache.lookup("key", "-k5", ["acgt"]) == {}
+        assert cache.lookup("other", "-k3", ["acgt"]) == {}
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    with hitCache.HitCache(str(tmp_path / "cache.sqlite"), maxEntries=2) as cache:
+        cache.store("key", "-k3", {"aaaa": 1})
+        cache.store("key", "-k3", {"cccc": 1})
+        cache.lookup("key", "-k3", ["aaaa"])
+        cache.store("key", "-k3", {"gggg": 1})
+        assert len(cache) == 2
+        assert set(cache.lookup("key", "-k3", ["aaaa", "cccc", "gggg"])) == {"aaaa", "gggg"}
+
+
+def test_store_tracks_the_row_count_without_counting_the_table(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with hitCache.HitCache(path) as cache:
+        cache.store("key", "-k3", {"aaaa": 1, "cccc": 1})
+    with hitCache.HitCache(path, maxEntries=3) as cache:
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        cache.store("key", "-k3", {"AAAA": 5, "gggg": 1})
+        cache.store("key", "-k3", {"tttt": 1})
+        assert not any("COUNT" in statement for statement in statements)
+        assert len(cache) == 3
+        assert cache.lookup("key", "-k3", ["aaaa"]) == {"aaaa": 5}
+
+
+def test_invalidate_index_drops_entries_for_prefix(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with hitCache.HitCache(path) as cache:
+        cache.store("key", "-k3", {"aaaa": 1}, indexPrefix=str(tmp_path / "idx"))
+        cache.store("other", "-k3", {"aaaa": 1}, indexPrefix=str(tmp_path / "idx2"))
+    assert hitCache.invalidate_index(str(tmp_path / "idx"), path=path) == 1
+    with hitCache.HitCache(path) as cache:
+        assert cache.lookup("key", "-k3", ["aaaa"]) == {}
+        assert cache.lookup("other", "-k3", ["aaaa"]) == {"aaaa": 1}
+
+
+def test_genomemask_cached_aligns_only_misses(tmp_path):
+    prefix = _make_index(tmp_path)
+    calls = []
+
+    def count_hits(fasta):
+        calls.append(fasta)
+        return [(line[1:], 1) for line in fasta.splitlines() if line.startswith(">")]
+
+    reads = [("a", "AAAA"), ("c", "CCCC")]
+    with hitCache.HitCache(str(tmp_path / "cache.sqlite")) as cache:
+        assert gm.genomemask_cached(reads, count_hits, cache, prefix, "-k3") == {"a": 1, "c": 1}
+        reads.append(("g", "GGGG"))
+        assert gm.genomemask_cached(reads, count_hits, cache, prefix, "-k3") == {"a": 1, "c": 1, "g": 1}
+
+    assert calls == [">a\nAAAA\n>c\nCCCC", ">g\nGGGG"]
+
+
+def test_default_cache_lives_in_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(tmp_path / "data"))
+    with hitCache.HitCache() as cache:
+        assert cache.path == os.path.join(str(tmp_path / "data"), "hitCache.sqlite")
+    assert os.path.exists(cache.path)
@@ -0,0 +1,92 @@
+import gzip
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from HCRProbeDesign import genomeMask as gm
+from HCRProbeDesign import kmerIndex
+from HCRProbeDesign import tiling
+
+
+def _random_sequence(rng, length):
+    return "".join(rng.choice(list("ACGT"), size=length))
+
+
+def _rc(seq):
+    return seq.translate(str.maketrans("acgtACGT", "tgcaTGCA"))[::-1]
+
+
+def _brute_counts(records, k):
+    counts = Counter()
+    for seq in records:
+        seq = seq.lower()
+        for i in range(len(seq) - k + 1):
+            kmer = seq[i:i + k]
+            if "n" in kmer:
+                continue
+            counts[min(kmer, _rc(kmer))] += 1
+    return counts
+
+
+def _canonical(kmer):
+    return kmerIndex.sequence_kmers(tiling.encode(kmer), len(kmer))[0]
+
+
+def test_sequence_kmers_are_strand_independent():
+    rng = np.random.default_rng(0)
+    seq = _random_sequence(rng, 40)
+    forward = np.sort(kmerIndex.sequence_kmers(tiling.encode(seq), 8))
+    reverse = np.sort(kmerIndex.sequence_kmers(tiling.encode(_rc(seq)), 8))
+    assert np.array_equal(forward, reverse)
+    assert len(kmerIndex.sequence_kmers(tiling.encode("ACGTNACGTACG"), 5)) == 3
+
+
+def test_build_matches_brute_force_across_chunks_and_gzip(tmp_path):
+    rng = np.random.default_rng(1)
+    repeat = _random_sequence(rng, 30)
+    chr1 = _random_sequence(rng, 200) + repeat + _random_sequence(rng, 50) + "NNNN" + repeat
+    chr2 = _rc(repeat) + _random_sequence(rng, 120)
+    plain = tmp_path / "chr1.fa"
+    plain.write_text(f">chr1\n{chr1[:150]}\n{chr1[150:]}\n")
+    packed = tmp_path / "chr2.fa.gz"
+    with gzip.open(packed, "wt") as handle:
+        handle.write(f">chr2\n{chr2}\n")
+
+    k = 12
+    out = kmerIndex.build_kmer_index([str(plain), str(packed)], str(tmp_path / "kmer"), k=k, nShards=4, chunkSize=64)
+    index = kmerIndex.KmerIndex(out)
+
+    expected = _brute_counts([chr1, chr2], k)
+    queries = list(expected) + ["acgtacgtacgt"]
+    counts = index.count(np.array([_canonical(q) for q in queries], dtype=np.uint64))
+    assert list(counts) == [expected.get(q, 0) for q in queries]
+    assert index.meta["distinct_kmers"] == len(expected)
+
+
+def test_tile_hits_take_the_worse_half(tmp_path):
+    rng = np.random.default_rng(2)
+    repeat = _random_sequence(rng, 10)
+    unique = _random_sequence(rng, 10)
+    genome = _random_sequence(rng, 50) + repeat + unique + _random_sequence(rng, 50) + repeat
+    fasta = tmp_path / "genome.fa"
+    fasta.write_text(f">chr1\n{genome}\n")
+    index = kmerIndex.KmerIndex(kmerIndex.build_kmer_index([str(fasta)], str(tmp_path / "kmer"), k=10, nShards=2))
+
+    tile = _rc(repeat + unique)
+    hits = index.tile_hits([tile, _rc(unique) + "n" * 10, unique + repeat])
+    assert list(hits) == [2, 1, 2]
+    with pytest.raises(ValueError):
+        index.tile_hits(["acgt"])
+
+
+def test_genomemask_kmer_uses_registered_index(tmp_path, monkeypatch):
+    fasta = tmp_path / "genome.fa"
+    fasta.write_text(">chr1\nACGTACGTTTGCA\n")
+    kmer_dir = kmerIndex.build_kmer_index([str(fasta)], str(tmp_path / "kmer"), k=4, nShards=1)
+    monkeypatch.setattr(gm, "_load_config", lambda: {"species": {"toy": {"kmer_index": kmer_dir}}})
+
+    counts = list(gm.genomemask_kmer(">a\nACGTTTGC\n>b\nGGGGGGGG\n", species="toy"))
+    assert counts == [("a", 2), ("b", 0)]
+    with pytest.raises(ValueError, match="No k-mer index"):
+        list(gm.genomemask_kmer([("a", "ACGT")], species="mouse"))
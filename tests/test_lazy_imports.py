@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import types
+
+from HCRProbeDesign import _lazy
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+HEAVY = ("numpy", "primer3", "pysam", "bs4", "Bio", "sqlite3")
+
+
+def _loaded_after(code, tmp_path):
+    """Run code in a fresh interpreter and return the heavy modules it actually executed."""
+    probe = (
+        f"{code}\n"
+        "import sys, types\n"
+        f"print('LOADED:', ' '.join(m for m in {HEAVY!r} if type(sys.modules.get(m)) is types.ModuleType))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=SRC, HCRPROBEDESIGN_DATA_DIR=str(tmp_path / "data"))
+    result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True)
+    return set(result.stdout.rsplit("LOADED:", 1)[1].split())
+
+
+def test_list_references_does_not_import_heavy_dependencies(tmp_path):
+    code = "import sys; sys.argv = ['listReferences']\nfrom HCRProbeDesign.listReferences import main; main()"
+    assert _loaded_after(code, tmp_path) == set()
+
+
+def test_design_probes_help_does_not_import_heavy_dependencies(tmp_path):
+    code = (
+        "import sys; sys.argv = ['designProbes', '--help']\n"
+        "from HCRProbeDesign.probeDesign import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    )
+    assert _loaded_after(code, tmp_path) == set()
+
+
+def test_package_submodules_load_on_access(tmp_path):
+    code = "import HCRProbeDesign\nassert HCRProbeDesign.thermo.__name__ == 'HCRProbeDesign.thermo'"
+    assert "numpy" in _loaded_after(code, tmp_path)
+
+
+def test_lazy_import_defers_execution(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe_mod.py").write_text("import sys\nsys.lazy_probe_ran = True\nVALUE = 7\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delattr(sys, "lazy_probe_ran", raising=False)
+    monkeypatch.delitem(sys.modules, "lazy_probe_mod", raising=False)
+
+    module = _lazy.lazy_import("lazy_probe_mod")
+    assert not hasattr(sys, "lazy_probe_ran")
+    assert module.VALUE == 7
+    assert sys.lazy_probe_ran
+    assert type(module) is types.ModuleType
+    monkeypatch.delitem(sys.modules, "lazy_probe_mod")
+
+
+def test_probe_design_still_exports_tile_classes():
+    from HCRProbeDesign import tiles
+    from HCRProbeDesign.probeDesign import Tile, TileError
+
+    assert Tile is tiles.Tile and TileError is tiles.TileError
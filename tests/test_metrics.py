@@ -0,0 +1,75 @@
+import importlib
+import json
+import sys
+import time
+
+import pytest
+
+from HCRProbeDesign import metrics
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_stage_writes_one_json_line(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    with metrics.stage(str(path), "gc", "gene", run="abc", tilesIn=10) as stage:
+        stage.tilesOut = 4
+    with metrics.stage(str(path), "select", "gene", run="abc") as stage:
+        stage.tilesIn, stage.tilesOut = 4, 2
+
+    first, second = _lines(path)
+    assert first["stage"] == "gc" and first["record"] == "gene" and first["run"] == "abc"
+    assert (first["tiles_in"], first["tiles_out"], first["status"]) == (10, 4, "ok")
+    assert first["wall_s"] >= 0 and first["cpu_s"] >= 0 and first["peak_rss_mb"] > 0
+    assert (second["tiles_in"], second["tiles_out"]) == (4, 2)
+
+
+def test_stage_reports_null_peaks_without_the_resource_module(tmp_path, monkeypatch):
+    # Windows has no resource module; importing metrics (and tiles) must still work.
+    monkeypatch.setitem(sys.modules, "resource", None)
+    monkeypatch.setattr(metrics, "_workerPeakRss", 0.0)
+    path = tmp_path / "metrics.jsonl"
+    with metrics.stage(str(path), "gc", "gene") as stage:
+        stage.tilesOut = 1
+    (line,) = _lines(path)
+    assert line["peak_rss_mb"] is None and line["children_peak_rss_mb"] is None
+    assert importlib.reload(metrics).peak_rss_mb() == (None, None)
+
+
+def test_failed_stage_is_recorded_and_reraised(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    with pytest.raises(RuntimeError):
+        with metrics.stage(str(path), "hairpin", "gene", tilesIn=3):
+            raise RuntimeError("boom")
+    (line,) = _lines(path)
+    assert line["status"] == "error" and line["tiles_out"] is None
+
+
+def test_stage_without_path_is_a_no_op(tmp_path):
+    with metrics.stage(None, "scan") as stage:
+        stage.tilesOut = 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def _spin(batch):
+    deadline = time.process_time() + 0.05
+    while time.process_time() < deadline:
+        pass
+    return batch
+
+
+def test_stage_counts_cpu_reported_by_pool_workers(tmp_path, monkeypatch):
+    from HCRProbeDesign import tiles
+
+    monkeypatch.setattr(metrics, "_workerCpu", 0.0)
+    monkeypatch.setattr(metrics, "_workerPeakRss", 0.0)
+    path = tmp_path / "metrics.jsonl"
+    with metrics.stage(str(path), "hairpin", "gene"):
+        assert tiles.mapBatches(_spin, list(range(256)), 2) == list(range(256))
+
+    (line,) = _lines(path)
+    # Four 64-item batches, each spinning 50 ms of CPU in a worker that is still alive
+    assert metrics._workerCpu >= 0.2 and line["cpu_s"] >= 0.2
+    assert line["children_peak_rss_mb"] > 0
@@ -1,4 +1,5 @@
 import argparse
+import json
 import sys
 
 import pytest
@@ -9,11 +10,20 @@ from HCRProbeDesign import tiles
 
 
 class _FakeHairpin:
-    def __init__(self, tm=0.0, structure_found=False):
+    def __init__(self, tm=0.0, structure_found=False, dg=0.0):
         self.tm = tm
+        self.dg = dg
         self.structure_found = structure_found
 
 
+@pytest.fixture(autouse=True)
+def _clear_hairpin_cache():
+    """Keep memoized hairpin results from leaking between monkeypatched tests."""
+    tiles.clearHairpinCache()
+    yield
+    tiles.clearHairpinCache()
+
+
 def test_fasta_input_creates_hcr_probes(monkeypatch, tmp_path, capsys):
     fasta_path = tmp_path / "input.fa"
     fasta_path.write_text(">target1\nACGTACGTAC\n")
@@ -238,6 +248,22 @@ def test_assert_species_config_missing_species_raises(tmp_path, monkeypatch):
     assert "is not registered" in str(excinfo.value)
 
 
+def test_assert_species_config_kmer_only_species_needs_kmer_engine(tmp_path, monkeypatch):
+    data_dir = tmp_path / ".hcrprobedesign"
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(data_dir))
+    data_dir.mkdir()
+    (data_dir / "HCRconfig.yaml").write_text("species:\n  mouse:\n    kmer_index: indices/mouse/kmer26\n")
+
+    with pytest.raises(SystemExit) as excinfo:
+        probeDesign._assert_species_config(_make_assert_args(species="mouse"))
+    assert "only has a k-mer index" in str(excinfo.value)
+    args = _make_assert_args(species="mouse")
+    args.mask_engine = "kmer"
+    probeDesign._assert_species_config(args)
+    with pytest.raises(ValueError, match="no Bowtie2 index"):
+        probeDesign.genomeMask._resolve_index("mouse", None)
+
+
 def test_assert_species_config_skips_when_index_supplied(tmp_path, monkeypatch):
     data_dir = tmp_path / ".hcrprobedesign"
     monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(data_dir))
@@ -312,3 +338,563 @@ def test_batch_fasta_header_channel_separator(monkeypatch, tmp_path, capsys):
     assert row[4].startswith(HCR.initiators["B2"]["odd"])
     assert row[5].endswith(HCR.initiators["B2"]["even"])
     assert row[6] == "B2"
+
+
+def test_build_parser_uses_config_default_params(tmp_path, monkeypatch):
+    data_dir = tmp_path / ".hcrprobedesign"
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(data_dir))
+    data_dir.mkdir()
+    (data_dir / "HCRconfig.yaml").write_text(
+        "species: {}\ndefault_params:\n  maxProbes: 7\n  bowtie2_threads: 16\n  bowtie2_preset: very-fast\n  unknown_key: 1\n"
+    )
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">t\nACGT\n")
+
+    args = probeDesign.build_parser().parse_args([str(fasta_path)])
+    assert args.maxProbes == 7
+    assert probeDesign._bowtie2_kwargs(args) == {"threads": 16, "preset": "very-fast", "extra_args": None}
+
+    args = probeDesign.build_parser().parse_args([str(fasta_path), "--bowtie2-threads", "2"])
+    assert args.bowtie2_threads == 2
+
+
+@pytest.mark.parametrize(
+    "param, message",
+    [
+        ("bowtie2_preset: fastest", "invalid choice 'fastest'"),
+        ("bowtie2_threads: eight", "invalid value 'eight'"),
+        ("maxProbes: 7.5", "invalid value 7.5"),
+        ("dTmFilter: 'yes'", "expected true or false"),
+    ],
+)
+def test_build_parser_rejects_invalid_config_default_params(tmp_path, monkeypatch, capsys, param, message):
+    data_dir = tmp_path / ".hcrprobedesign"
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(data_dir))
+    data_dir.mkdir()
+    (data_dir / "HCRconfig.yaml").write_text(f"species: {{}}\ndefault_params:\n  {param}\n")
+
+    with pytest.raises(SystemExit):
+        probeDesign.build_parser()
+    assert f"default_params.{param.split(':')[0]}: {message}" in capsys.readouterr().err
+
+
+def test_build_parser_converts_config_default_params(tmp_path, monkeypatch):
+    data_dir = tmp_path / ".hcrprobedesign"
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(data_dir))
+    data_dir.mkdir()
+    (data_dir / "HCRconfig.yaml").write_text('species: {}\ndefault_params:\n  bowtie2_threads: "8"\n  minGC: 40\n')
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">t\nACGT\n")
+
+    args = probeDesign.build_parser().parse_args([str(fasta_path)])
+    assert args.bowtie2_threads == 8 and isinstance(args.minGC, float)
+
+
+def _fake_stream_factory(calls, hits=None):
+    hits = hits or {}
+
+    def fake_genomemask_stream(reads, **kwargs):
+        calls.append(reads)
+        for line in reads.splitlines():
+            if line.startswith(">"):
+                name = line[1:]
+                yield name, hits.get(name.split("|", 1)[1], 1)
+
+    return fake_genomemask_stream
+
+
+def test_batch_genome_masks_all_records_in_one_run(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n>target2\nTGCATGCATGCC\n")
+
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    # Without --checkpoint-dir the whole panel is masked together, whatever the checkpoint chunk size.
+    monkeypatch.setattr(probeDesign, "_CHECKPOINT_MASK_CHUNK", 1)
+    calls = []
+    # Reject the first tile of target1 as a multi-mapper.
+    monkeypatch.setattr(
+        probeDesign.genomeMask, "genomemask_stream", _fake_stream_factory(calls, {"target1:1-11": 5})
+    )
+
+    argv = [
+        "probeDesignBatch", str(fasta_path), "--index", "/abs/index",
+        "--tileSize", "10", "--minGC", "0", "--maxGC", "100",
+        "--minGibbs", "-1000", "--maxGibbs", "1000", "--targetGibbs", "0",
+        "--maxRunLength", "999", "--maxProbes", "5",
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    probeDesign.main_batch()
+
+    assert len(calls) == 1
+    read_names = [line[1:] for line in calls[0].splitlines() if line.startswith(">")]
+    assert {name.split("|", 1)[0] for name in read_names} == {"0", "1"}
+
+    out = capsys.readouterr().out.strip().splitlines()
+    names = [row.split("\t")[0] for row in out[1:]]
+    assert "target1:1-11" not in names
+    assert any(name.startswith("target1:") for name in names)
+    assert any(name.startswith("target2:") for name in names)
+
+
+def test_batch_masks_in_chunks_and_checkpoints_before_a_crash(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n>target2\nTGCATGCATGCC\n>target3\nGGATCCAAGTTC\n")
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    calls = []
+    stream = _fake_stream_factory(calls)
+
+    def crashing_stream(reads, **kwargs):
+        if calls:
+            raise MemoryError("bowtie2 ran out of memory")
+        return stream(reads, **kwargs)
+
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", crashing_stream)
+    ckpt = tmp_path / "ckpt"
+    argv = [
+        "probeDesignBatch", str(fasta_path), "--index", "/abs/index", "--no-hit-cache",
+        *[arg for arg in _BATCH_ARGS if arg != "-g"], "--mask-chunk", "2", "--checkpoint-dir", str(ckpt),
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    with pytest.raises(MemoryError):
+        probeDesign.main_batch()
+
+    # The first chunk (target1, target2) was masked in one run, written and checkpointed before the crash.
+    assert len(calls) == 1 and len(list(ckpt.iterdir())) == 2
+    rows = capsys.readouterr().out.strip().splitlines()[1:]
+    assert {row.split("\t")[0].split(":")[0] for row in rows} == {"target1", "target2"}
+
+    calls.clear()
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", stream)
+    monkeypatch.setattr(sys, "argv", argv + ["--resume"])
+    probeDesign.main_batch()
+    assert len(calls) == 1 and "target3" in calls[0] and "target1" not in calls[0]
+    rows = capsys.readouterr().out.strip().splitlines()[1:]
+    assert list(dict.fromkeys(row.split("\t")[0].split(":")[0] for row in rows)) == ["target1", "target2", "target3"]
+
+
+def test_record_chunks_count_only_records_to_design():
+    records = [(name, None, None, None, "done" if name in "bd" else None) for name in "abcdef"]
+    chunks = [[record[0] for record in chunk] for chunk in probeDesign._record_chunks(records, 2)]
+    assert chunks == [["a", "b", "c", "d"], ["e", "f"]]
+    assert len(list(probeDesign._record_chunks(records, None))) == 1
+
+
+def test_batch_reuses_cached_hit_counts(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n")
+    (tmp_path / "idx.1.bt2").write_bytes(b"index")
+
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    calls = []
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", _fake_stream_factory(calls))
+
+    argv = [
+        "probeDesignBatch", str(fasta_path), "--index", str(tmp_path / "idx"),
+        "--tileSize", "10", "--minGC", "0", "--maxGC", "100",
+        "--minGibbs", "-1000", "--maxGibbs", "1000", "--targetGibbs", "0",
+        "--maxRunLength", "999", "--maxProbes", "5",
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+    probeDesign.main_batch()
+    first = capsys.readouterr().out
+    probeDesign.main_batch()
+    second = capsys.readouterr().out
+
+    assert len(calls) == 1
+    assert first == second
+
+    monkeypatch.setattr(sys, "argv", argv + ["--no-hit-cache"])
+    probeDesign.main_batch()
+    assert len(calls) == 2
+
+
+def test_mask_server_keys_cache_on_server_settings_and_rejects_conflicts(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n")
+    info = {"index": "/srv/mm10/mm10", "preset": "very-fast", "extra_args": ["--end-to-end"]}
+    monkeypatch.setattr(probeDesign.genomeMask, "mask_server_info", lambda _socket: dict(info))
+    parser = probeDesign.build_parser()
+
+    args = parser.parse_args([str(fasta_path), "--mask-server", "/tmp/mask.sock", "--index", "/local/other"])
+    with pytest.raises(SystemExit):
+        probeDesign._check_mask_server(parser, args)
+    args = parser.parse_args([str(fasta_path), "--mask-server", "/tmp/mask.sock", "--bowtie2-args=--local"])
+    with pytest.raises(SystemExit):
+        probeDesign._check_mask_server(parser, args)
+
+    # Matching (or omitted) options are accepted and the cache is keyed on the server's settings.
+    args = parser.parse_args([str(fasta_path), "--mask-server", "/tmp/mask.sock", "--bowtie2-preset", "very-fast"])
+    probeDesign._check_mask_server(parser, args)
+    assert probeDesign._cache_key(args) == (
+        "/srv/mm10/mm10",
+        probeDesign.genomeMask.cache_params(preset="very-fast", extra_args=["--end-to-end"]),
+    )
+
+
+def test_genome_mask_attaches_counts_by_name_and_handles_missing_reads(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGGA\n")
+    tileSet = tiles.TileSet.fromSequence("ACGTACGTACGGA", "target1", tileSize=10)
+    names = [tileSet.name(row) for row in tileSet.rows()]
+
+    def fake_stream(reads, **kwargs):
+        # Out of order, second tile multi-mapped, last tile dropped (as with --no-unal)
+        reported = [line[1:] for line in reads.splitlines() if line.startswith(">")][:-1]
+        for name in reversed(reported):
+            yield name, 5 if name.endswith(names[1]) else 1
+
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", fake_stream)
+    args = probeDesign.build_parser().parse_args(
+        [str(fasta_path), "--index", "/abs/index", "--no-hit-cache", "--num-hits-allowed", "1"]
+    )
+    probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+    assert list(tileSet.hitCount) == [1, 5, 1, 0]
+    assert [tileSet.name(row) for row in tileSet.rows()] == [names[0], names[2], names[3]]
+
+
+def test_genome_mask_rejects_unexpected_read_names(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n")
+    tileSet = tiles.TileSet.fromSequence("ACGTACGTACGG", "target1", tileSize=10)
+    monkeypatch.setattr(
+        probeDesign.genomeMask, "genomemask_stream", lambda reads, **kwargs: iter([("9|bogus", 0)])
+    )
+    args = probeDesign.build_parser().parse_args([str(fasta_path), "--index", "/abs/index", "--no-hit-cache"])
+    with pytest.raises(ValueError, match="not submitted"):
+        probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+
+def test_kmer_mask_engine_filters_repeated_tiles(tmp_path):
+    from HCRProbeDesign import kmerIndex
+
+    target = "ACGTTGCAAGGCTTACCGATAGCTAG"
+    genome = tmp_path / "genome.fa"
+    # The first 10 bases of the target occur twice in the genome.
+    genome.write_text(f">chr1\n{target}TTTTT{target[:10]}\n")
+    kmer_dir = kmerIndex.build_kmer_index([str(genome)], str(tmp_path / "kmer"), k=5, nShards=1)
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(f">target1\n{target}\n")
+
+    tileSet = tiles.TileSet.fromSequence(target, "target1", tileSize=10)
+    args = probeDesign.build_parser().parse_args(
+        [str(fasta_path), "--mask-engine", "kmer", "--kmer-index", kmer_dir]
+    )
+    probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+    assert tileSet.hitCount[0] == 2
+    assert tileSet.mask[0] & tiles.MASK_GENOME
+    assert (tileSet.hitCount[1:] >= 1).all()
+
+
+def test_kmer_mask_engine_masks_binding_arms(tmp_path):
+    from HCRProbeDesign import kmerIndex
+
+    target = "ACGTTGCAAGGCTTACCGATAGCTAGGT"
+    genome = tmp_path / "genome.fa"
+    genome.write_text(f">chr1\n{target}\n")
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(f">target1\n{target}\n")
+    argv = [str(fasta_path), "--tileSize", "12", "--mask-engine", "kmer", "--mask-target", "arms"]
+
+    # Arms of 12-nt tiles are 5 nt long, so a k=6 index cannot look them up.
+    too_long = kmerIndex.build_kmer_index([str(genome)], str(tmp_path / "k6"), k=6, nShards=1)
+    parser = probeDesign.build_parser()
+    with pytest.raises(SystemExit):
+        probeDesign._check_kmer_index(parser, parser.parse_args([*argv, "--kmer-index", too_long]))
+
+    kmer_dir = kmerIndex.build_kmer_index([str(genome)], str(tmp_path / "k5"), k=5, nShards=1)
+    args = parser.parse_args([*argv, "--kmer-index", kmer_dir])
+    probeDesign._check_kmer_index(parser, args)
+    tileSet = tiles.TileSet.fromSequence(target, "target1", tileSize=12)
+    probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+    masked = (tileSet.mask & tiles.MASK_GENOME) > 0
+    assert 0 < len(tileSet) < len(tileSet.mask)
+    assert (masked == (tileSet.armHits > 0)).all()
+
+
+def test_max_offtarget_mismatches_ignores_distant_hits(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n")
+    tileSet = tiles.TileSet.fromSequence("ACGTACGTACGG", "target1", tileSize=10)
+
+    def fake_stream(reads, stats=False, **kwargs):
+        assert stats
+        for line in reads.splitlines():
+            if line.startswith(">"):
+                name = line[1:]
+                sam = [f"{name}\t0\tchr1\t1\t255\t10M\t*\t0\t0\t*\t*\tAS:i:0\tNM:i:0"]
+                sam.append(f"{name}\t256\tchr2\t1\t255\t10M\t*\t0\t0\t*\t*\tAS:i:-12\tNM:i:2")
+                yield name, next(probeDesign.genomeMask.hitStatsFromSamLines(sam))
+
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", fake_stream)
+    args = probeDesign.build_parser().parse_args(
+        [str(fasta_path), "--index", "/abs/index", "--max-offtarget-mismatches", "1"]
+    )
+    probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+    assert list(tileSet.hitCount) == [1, 1, 1]
+    assert len(tileSet) == 3
+
+
+def test_arm_masking_aligns_distinct_arms_once_and_sums_off_targets(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">t\nACGTACGTAC\n")
+    repeat = "ACGTTGCAAGGCTT"
+    target = repeat + "GATC" + repeat
+    tileSet = tiles.TileSet.fromSequence(target, "target1", tileSize=14)
+    fivePrime, threePrime = tileSet.armSequences()
+    # One arm sequence has two extra genome hits; every other arm is unique.
+    noisy = fivePrime[1]
+    calls = []
+
+    def fake_stream(reads, stats=False, **kwargs):
+        assert stats
+        calls.append(reads)
+        lines = reads.splitlines()
+        for name, seq in zip(lines[::2], lines[1::2]):
+            yield name[1:], _hit_stats(name[1:], [0, 1, 2] if seq == noisy else [0])
+
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", fake_stream)
+    args = probeDesign.build_parser().parse_args(
+        [str(fasta_path), "--index", "/abs/index", "--mask-target", "arms", "--max-arm-offtargets", "1"]
+    )
+    probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+    assert len(calls) == 1
+    aligned = calls[0].splitlines()[1::2]
+    assert sorted(aligned) == sorted(set(fivePrime + threePrime))
+    # The first and last tile share both arms, so fewer arms than 2x tiles are aligned.
+    assert len(aligned) < 2 * len(fivePrime)
+    expected = [2 * (five == noisy) + 2 * (three == noisy) for five, three in zip(fivePrime, threePrime)]
+    assert list(tileSet.armHits) == expected
+    assert list(tileSet.active) == [hits <= 1 for hits in expected]
+
+
+def test_arm_masking_keeps_off_targets_of_arms_without_a_self_hit(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">t\nACGTACGTAC\n")
+    tileSet = tiles.TileSet.fromSequence("ACGTTGCAAGGCTTGATC", "target1", tileSize=14)
+    fivePrime, threePrime = tileSet.armSequences()
+    # The first tile's 5' arm spans an exon-exon junction: no perfect genomic hit, one off-target.
+    junction = fivePrime[0]
+
+    def fake_stream(reads, stats=False, **kwargs):
+        lines = reads.splitlines()
+        for name, seq in zip(lines[::2], lines[1::2]):
+            yield name[1:], _hit_stats(name[1:], [2] if seq == junction else [0])
+
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", fake_stream)
+    args = probeDesign.build_parser().parse_args(
+        [str(fasta_path), "--index", "/abs/index", "--mask-target", "arms", "--max-arm-offtargets", "0"]
+    )
+    probeDesign._genome_mask_tilesets(args, [tileSet], "target1")
+
+    assert tileSet.armHits[0] == 1 + (threePrime[0] == junction)
+    assert not tileSet.active[0]
+    assert all(tileSet.armHits[1:] == [(five == junction) + (three == junction) for five, three in zip(fivePrime[1:], threePrime[1:])])
+
+
+def _hit_stats(name, mismatches):
+    stats = probeDesign.genomeMask.HitStats(name)
+    for pos, nm in enumerate(mismatches, start=1):
+        stats.add(0, "chr1", pos * 1000, mismatches=nm)
+    return stats
+
+
+_BATCH_ARGS = [
+    "--tileSize", "10", "--minGC", "0", "--maxGC", "100",
+    "--minGibbs", "-1000", "--maxGibbs", "1000", "--targetGibbs", "0",
+    "--maxRunLength", "999", "--maxProbes", "2", "-g",
+]
+
+
+def test_batch_jobs_output_matches_serial_order(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(
+        ">target1\nACGTACGTACGGATCCA\n>target2\nTGCATGCATGCCAGTAC\n>target3\nGGATCCAAGTTCGATCA\n"
+    )
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+
+    outputs = []
+    for jobs in ("1", "3"):
+        monkeypatch.setattr(sys, "argv", ["probeDesignBatch", str(fasta_path), *_BATCH_ARGS, "--jobs", jobs])
+        probeDesign.main_batch()
+        outputs.append(capsys.readouterr().out)
+
+    assert outputs[0] == outputs[1]
+    names = [row.split("\t")[0].split(":")[0] for row in outputs[0].strip().splitlines()[1:]]
+    assert names == sorted(names)
+    assert set(names) == {"target1", "target2", "target3"}
+
+
+def test_batch_isolates_record_failures(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n>bad\nTGCATGCATGCC\n>target3\nGGATCCAAGTTC\n")
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    prefilter = probeDesign._prefilter_tiles
+
+    def failing_prefilter(args, record):
+        if record["name"] == "bad":
+            raise tiles.TileError("boom")
+        return prefilter(args, record)
+
+    monkeypatch.setattr(probeDesign, "_prefilter_tiles", failing_prefilter)
+    monkeypatch.setattr(sys, "argv", ["probeDesignBatch", str(fasta_path), *_BATCH_ARGS])
+
+    with pytest.raises(SystemExit, match="1 record\\(s\\): bad"):
+        probeDesign.main_batch()
+
+    captured = capsys.readouterr()
+    names = {row.split("\t")[0].split(":")[0] for row in captured.out.strip().splitlines()[1:]}
+    assert names == {"target1", "target3"}
+    assert "Skipping target bad: TileError: 'boom'" in captured.err
+
+
+def test_batch_record_shorter_than_tile_yields_no_probes(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">short\n" + "ACGT" * 10 + "\n>target1\n" + "ACGTACGTACGGATCCA" * 8 + "\n")
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    argv = ["probeDesignBatch", str(fasta_path), *_BATCH_ARGS, "--maxRunLength", "7", "--tileSize", "52"]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    probeDesign.main_batch()
+
+    rows = capsys.readouterr().out.strip().splitlines()[1:]
+    assert {row.split("\t")[0].split(":")[0] for row in rows} == {"target1"}
+
+
+def test_batch_resume_reuses_checkpointed_records(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGGATCCA\n>target2\nTGCATGCATGCCAGTAC\n")
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    ckpt = tmp_path / "ckpt"
+    idt_path = tmp_path / "probes.idt"
+    argv = ["probeDesignBatch", str(fasta_path), *_BATCH_ARGS, "--checkpoint-dir", str(ckpt), "--idt", str(idt_path)]
+
+    monkeypatch.setattr(sys, "argv", argv)
+    probeDesign.main_batch()
+    first = capsys.readouterr().out
+    first_idt = idt_path.read_text()
+    assert len(list(ckpt.iterdir())) == 2
+
+    prefilter = probeDesign._prefilter_tiles
+    prefiltered = []
+
+    def tracking_prefilter(args, record):
+        prefiltered.append(record["name"])
+        return prefilter(args, record)
+
+    monkeypatch.setattr(probeDesign, "_prefilter_tiles", tracking_prefilter)
+    monkeypatch.setattr(sys, "argv", argv + ["--resume"])
+    probeDesign.main_batch()
+    assert capsys.readouterr().out == first
+    assert idt_path.read_text() == first_idt
+    assert prefiltered == []
+
+    # A changed sequence invalidates only that record's checkpoint.
+    fasta_path.write_text(">target1\nACGTACGTACGGATCCA\n>target2\nTGCATGCATGCCAGTAA\n")
+    probeDesign.main_batch()
+    assert prefiltered == ["target2"]
+
+
+def test_batch_resume_reruns_records_after_the_index_is_rebuilt(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGGATCCA\n")
+    index_file = tmp_path / "idx.1.bt2"
+    index_file.write_bytes(b"v1")
+    monkeypatch.setattr(probeDesign.primer3, "calc_hairpin", lambda _seq: _FakeHairpin())
+    monkeypatch.setattr(probeDesign.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(tiles.primer3, "calc_tm", lambda _seq: 50.0)
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    monkeypatch.setattr(probeDesign.genomeMask, "genomemask_stream", _fake_stream_factory([]))
+    ckpt = tmp_path / "ckpt"
+    argv = [
+        "probeDesignBatch", str(fasta_path), "--index", str(tmp_path / "idx"), "--no-hit-cache",
+        *[arg for arg in _BATCH_ARGS if arg != "-g"], "--checkpoint-dir", str(ckpt), "--resume",
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+    probeDesign.main_batch()
+    probeDesign.main_batch()
+    assert len(list(ckpt.iterdir())) == 1
+
+    # buildGenomeIndex --force rewrites the index files at the same prefix.
+    index_file.write_bytes(b"v2 rebuilt")
+    probeDesign.main_batch()
+    assert len(list(ckpt.iterdir())) == 2
+
+
+def test_batch_resume_requires_checkpoint_dir(monkeypatch, tmp_path):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGG\n")
+    monkeypatch.setattr(sys, "argv", ["probeDesignBatch", str(fasta_path), "--resume"])
+    with pytest.raises(SystemExit):
+        probeDesign.main_batch()
+
+
+def test_batch_selects_records_by_id_file_or_regex(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(
+        ">target1\nACGTACGTACGGATCCA\n>target2 kinase\nTGCATGCATGCCAGTAC\n>target3\nGGATCCAAGTTCGATCA\n"
+    )
+    ids_path = tmp_path / "ids.txt"
+    ids_path.write_text("target3\ntarget1\n")
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+
+    def designed(*extra):
+        monkeypatch.setattr(sys, "argv", ["probeDesignBatch", str(fasta_path), *_BATCH_ARGS, *extra])
+        probeDesign.main_batch()
+        out = capsys.readouterr().out
+        return {row.split("\t")[0].split(":")[0] for row in out.strip().splitlines()[1:]}
+
+    assert designed("--records", str(ids_path)) == {"target1", "target3"}
+    assert designed("--record-regex", "kinase") == {"target2_kinase"}
+
+    ids_path.write_text("target1\nmissing\n")
+    with pytest.raises(SystemExit):
+        designed("--records", str(ids_path))
+    assert "not found in" in capsys.readouterr().err
+
+
+def test_batch_metrics_records_every_stage(monkeypatch, tmp_path, capsys):
+    fasta_path = tmp_path / "input.fa"
+    fasta_path.write_text(">target1\nACGTACGTACGGATCCA\n>target2\nTGCATGCATGCCAGTAC\n")
+    metrics_path = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(probeDesign, "outputRunParams", lambda _args: None)
+    monkeypatch.setattr(
+        sys, "argv",
+        ["probeDesignBatch", str(fasta_path), *_BATCH_ARGS, "--jobs", "2", "--metrics", str(metrics_path)],
+    )
+    probeDesign.main_batch()
+    capsys.readouterr()
+
+    lines = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert len({line["run"] for line in lines}) == 1
+    stages = {(line["record"], line["stage"]) for line in lines}
+    for record in ("target1", "target2"):
+        for stage in ("scan", "runs_c", "runs_g", "hairpin", "gc", "gibbs", "dtm", "select"):
+            assert (record, stage) in stages
+    for line in lines:
+        assert line["status"] == "ok"
+        assert line["tiles_out"] <= line["tiles_in"]
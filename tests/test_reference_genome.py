@@ -166,3 +166,34 @@ def test_register_species_requires_force(tmp_path):
 
     with pytest.raises(ValueError):
         rg.register_species(str(config_path), "mouse", "indices/mm10/mm10")
+
+
+def test_register_species_merges_kmer_index_into_existing_entry(tmp_path):
+    config_path = tmp_path / "HCRconfig.yaml"
+    config_path.write_text("species:\n  mouse:\n    bowtie2_index: /abs/mm10\n")
+
+    rg.register_species(str(config_path), "mouse", kmer_index="/abs/kmer26")
+    assert rg.load_config(str(config_path))["species"]["mouse"] == {
+        "bowtie2_index": "/abs/mm10",
+        "kmer_index": "/abs/kmer26",
+    }
+    with pytest.raises(ValueError, match="kmer_index"):
+        rg.register_species(str(config_path), "mouse", kmer_index="/abs/kmer25")
+    rg.register_species(str(config_path), "mouse", kmer_index="/abs/kmer25", force=True)
+    assert rg.load_config(str(config_path))["species"]["mouse"]["bowtie2_index"] == "/abs/mm10"
+
+
+def test_kmer_only_refuses_registered_species_before_building(monkeypatch, tmp_path):
+    config_path = tmp_path / "HCRconfig.yaml"
+    config_path.write_text("species:\n  mouse:\n    kmer_index: /abs/kmer26\n")
+    fasta = tmp_path / "genome.fa"
+    _write_fasta(fasta)
+    monkeypatch.setenv("HCRPROBEDESIGN_DATA_DIR", str(tmp_path / "data"))
+    built = []
+    monkeypatch.setattr(rg, "build_kmer_index", lambda *args, **kwargs: built.append(args))
+    argv = ["buildGenomeIndex", "--species", "mouse", "--fasta", str(fasta), "--kmer-only", "--config", str(config_path)]
+    monkeypatch.setattr("sys.argv", argv)
+
+    with pytest.raises(SystemExit):
+        rg.main()
+    assert built == []
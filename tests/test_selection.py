@@ -0,0 +1,89 @@
+"""Tests for non-overlapping probe selection."""
+
+import random
+
+from HCRProbeDesign import selection
+from HCRProbeDesign.tiles import Tile
+
+
+def _reference_greedy(tiles, targetGibbs, maxProbes):
+    tiles = list(tiles)
+    bestTiles = []
+    while len(bestTiles) < maxProbes and len(tiles) > 0:
+        nextBestIdx = min(range(len(tiles)), key=lambda i: abs([x.Gibbs for x in tiles][i] - targetGibbs))
+        if len(bestTiles) == 0:
+            bestTiles.append(tiles.pop(nextBestIdx))
+            continue
+        if any([tiles[nextBestIdx].overlaps(x) for x in bestTiles]):
+            tiles.pop(nextBestIdx)
+        else:
+            bestTiles.append(tiles.pop(nextBestIdx))
+    return bestTiles
+
+
+def _random_tiles(rng, n, tileSize=20):
+    starts = sorted(rng.sample(range(1, n * 3), n))
+    tiles = []
+    for start in starts:
+        tile = Tile(sequence="a" * tileSize, seqName="t", startPos=start)
+        tile.Gibbs = round(rng.uniform(-70, -50), 0)  # coarse values force ties
+        tiles.append(tile)
+    return tiles
+
+
+def test_greedy_select_matches_reference():
+    rng = random.Random(2)
+    for trial in range(25):
+        tiles = _random_tiles(rng, rng.randint(1, 120))
+        maxProbes = rng.randint(1, 30)
+        expected = _reference_greedy(tiles, -60.0, maxProbes)
+        picks = selection.greedy_select(
+            [t.start for t in tiles], [t.end for t in tiles], [abs(t.Gibbs + 60.0) for t in tiles], maxProbes
+        )
+        assert [tiles[i] for i in picks] == expected
+        assert [tiles[i].start for i in picks] == [t.start for t in expected]
+
+
+def test_greedy_select_empty():
+    assert selection.greedy_select([], [], [], 5) == []
+
+
+def _brute_force(starts, ends, scores, maxProbes):
+    from itertools import combinations
+
+    best = (0, 0.0)
+    n = len(starts)
+    for size in range(1, min(maxProbes, n) + 1):
+        for combo in combinations(range(n), size):
+            ordered = sorted(combo, key=lambda i: starts[i])
+            if all(ends[a] <= starts[b] for a, b in zip(ordered, ordered[1:])):
+                total = sum(scores[i] for i in combo)
+                if size > best[0] or (size == best[0] and total < best[1] - 1e-12):
+                    best = (size, total)
+    return best
+
+
+def test_optimal_select_matches_brute_force():
+    rng = random.Random(4)
+    for trial in range(40):
+        n = rng.randint(1, 9)
+        starts = [rng.randint(0, 40) for _ in range(n)]
+        ends = [s + rng.randint(3, 12) for s in starts]
+        scores = [rng.uniform(0, 10) for _ in range(n)]
+        maxProbes = rng.randint(1, 5)
+        picks = selection.optimal_select(starts, ends, scores, maxProbes)
+        count, total = selection.selection_objective(picks, scores)
+        expected = _brute_force(starts, ends, scores, maxProbes)
+        assert count == expected[0]
+        assert abs(total - expected[1]) < 1e-9
+        ordered = sorted(picks, key=lambda i: starts[i])
+        assert all(ends[a] <= starts[b] for a, b in zip(ordered, ordered[1:]))
+
+
+def test_optimal_select_beats_greedy_count():
+    # The best-scoring middle interval blocks both neighbours under greedy selection.
+    starts = [0, 8, 15]
+    ends = [10, 17, 25]
+    scores = [1.0, 0.0, 1.0]
+    assert len(selection.greedy_select(starts, ends, scores, 3)) == 1
+    assert selection.optimal_select(starts, ends, scores, 3) == [0, 2]
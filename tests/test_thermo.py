@@ -0,0 +1,64 @@
+"""Tests for batch nearest-neighbor Gibbs energy calculation."""
+
+import random
+
+import pytest
+
+from HCRProbeDesign import selection, thermo
+from HCRProbeDesign.tiles import Tile, TileSet
+
+
+def _scalar_gibbs(seq, temp=37, saltconc=0.33):
+    dHs, dSs = thermo.stacks_rna_dna(seq)
+    dHi, dSi = thermo.init_rna_dna()
+    energy = thermo.gibbs(dHs + dHi, dSs + dSi, temp=temp)
+    return thermo.salt_adjust(energy / 1000, len(seq), saltconc)
+
+
+@pytest.mark.parametrize("windowSize", [2, 10, 52])
+def test_gibbs_windows_match_scalar_path(windowSize):
+    rng = random.Random(windowSize)
+    seq = "".join(rng.choice("acgt") for _ in range(300))
+    energies = thermo.gibbs_rna_dna_windows(seq, windowSize)
+    assert len(energies) == len(seq) - windowSize + 1
+    for start in range(len(energies)):
+        expected = _scalar_gibbs(seq[start:start + windowSize])
+        assert energies[start] == expected
+
+
+def test_gibbs_windows_custom_conditions():
+    seq = "acgtacgtttgcaagc"
+    energies = thermo.gibbs_rna_dna_windows(seq, 8, temp=25, saltconc=0.5)
+    assert energies[3] == pytest.approx(_scalar_gibbs(seq[3:11], temp=25, saltconc=0.5), abs=1e-9)
+
+
+def test_tile_view_calc_gibbs_uses_tileset_batch():
+    rng = random.Random(7)
+    seq = "".join(rng.choice("ACGT") for _ in range(120))
+    tile_set = TileSet.fromSequence(seq, "test", tileSize=52)
+    for tile in tile_set.tiles():
+        tile.calcGibbs()
+        standalone = Tile(sequence=tile.sequence, seqName="test", startPos=tile.start)
+        standalone.calcGibbs()
+        assert tile.Gibbs == standalone.Gibbs
+
+
+def test_batch_gibbs_selects_the_same_probes_as_per_tile_gibbs():
+    rng = random.Random(5000)
+    seq = "".join(rng.choice("ACGT") for _ in range(5000))
+    tile_set = TileSet.fromSequence(seq, "gene1", tileSize=52)
+    tile_set.calcGibbs()
+    rows = tile_set.rows()
+    perTile = []
+    for row in rows:
+        standalone = Tile(sequence=tile_set.sequence(row), seqName="gene1", startPos=int(tile_set.start[row]))
+        standalone.calcGibbs()
+        perTile.append(standalone.Gibbs)
+
+    def picks(energies):
+        scores = [abs(energy - -60.0) for energy in energies]
+        chosen = selection.greedy_select(tile_set.start[rows], tile_set.end[rows], scores, 30)
+        return sorted(int(tile_set.start[rows[i]]) for i in chosen)
+
+    assert list(tile_set.Gibbs[rows]) == perTile
+    assert picks(tile_set.Gibbs[rows]) == picks(perTile)
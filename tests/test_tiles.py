@@ -41,3 +41,135 @@ def test_one_base_overlap():
     t2 = Tile(sequence="A" * 52, seqName="test", startPos=52)  # starts at 52, within t1
     assert t1.overlaps(t2)
     assert t2.overlaps(t1)
+
+
+def test_tileset_masks_n_windows_and_filters_by_bitmap():
+    from HCRProbeDesign.tiles import TileSet, MASK_N, MASK_GC
+
+    tile_set = TileSet.fromSequence("ACGTACGTNACGTACGTAC", "test", tileSize=5)
+    assert len(tile_set) == len(tile_set.tiling) - 5
+    assert all(tile_set.mask[~tile_set.active] & MASK_N)
+
+    tile_set.calcGC()
+    before = len(tile_set)
+    tile_set.applyFilter(tile_set.GC >= 100.0, MASK_GC)
+    assert len(tile_set) < before
+    assert all(tile_set.GC[tile_set.rows()] >= 100.0)
+
+
+def test_tile_view_reads_and_writes_tileset_columns():
+    from HCRProbeDesign.tiles import TileSet
+
+    tile_set = TileSet.fromSequence("ACGT" * 20, "test", tileSize=10)
+    row = tile_set.rows()[3]
+    tile = tile_set.tile(row)
+    assert tile.start == tile_set.start[row]
+    assert tile.name == tile_set.name(row)
+    assert tile.hitCount == -1
+    tile.hitCount = 2
+    assert tile_set.hitCount[row] == 2
+    tile.calcGibbs()
+    assert tile_set.Gibbs[row] == tile.Gibbs
+
+
+def test_standalone_tile_uses_slots():
+    tile = Tile(sequence="ACGT" * 13, seqName="test", startPos=1)
+    assert not hasattr(tile, "__dict__")
+    tile.calcGibbs()
+    assert tile.Gibbs < 0
+
+
+def test_hairpin_screen_calls_primer3_once_per_sequence(monkeypatch):
+    from HCRProbeDesign import tiles
+    from HCRProbeDesign.tiles import TileSet
+
+    calls = []
+
+    class _Result:
+        tm = 50.0
+        dg = -1.5
+        structure_found = True
+
+    def fake_calc_hairpin(seq, **kwargs):
+        calls.append((seq, kwargs))
+        return _Result()
+
+    monkeypatch.setattr(tiles.primer3, "calc_hairpin", fake_calc_hairpin)
+    tiles.clearHairpinCache()
+    try:
+        tile_set = TileSet.fromSequence("ACGTACGTAC" * 3, "test", tileSize=10)
+        tile_set.calcHairpins()
+        sequences = tile_set.sequences()
+        assert len(calls) == len(set(sequences)) < len(sequences)
+        tile = tile_set.tile(tile_set.rows()[0])
+        assert (tile.hairpinTm, tile.hairpinDg, tile.hairpinFound) == (50.0, -1.5, True)
+
+        tile_set.calcHairpins(thermoParams={"temp_c": 25.0})
+        assert calls[-1][1] == {"temp_c": 25.0}
+        assert len(calls) == 2 * len(set(sequences))
+    finally:
+        tiles.clearHairpinCache()
+
+
+def test_hairpin_screen_larger_than_cache_calls_primer3_once(monkeypatch):
+    from HCRProbeDesign import tiles
+    from HCRProbeDesign.tiles import TileSet
+
+    calls = []
+
+    class _Result:
+        tm = 10.0
+        dg = 0.0
+        structure_found = False
+
+    def fake_calc_hairpin(seq, **kwargs):
+        calls.append(seq)
+        return _Result()
+
+    monkeypatch.setattr(tiles.primer3, "calc_hairpin", fake_calc_hairpin)
+    monkeypatch.setattr(tiles, "_hairpinCache", tiles._LRUCache(5))
+    tile_set = TileSet.fromSequence("ACGGTCATTGCAAGTCCATG" * 2, "test", tileSize=10)
+    tile_set.calcHairpins()
+    rows = tile_set.rows()
+    assert len(calls) == len(set(tile_set.sequences(rows))) > 5
+    assert (tile_set.hairpinTm[rows] == 10.0).all()
+    assert len(tiles._hairpinCache) == 5
+
+
+def test_table_rows_fill_and_reuse_tileset_tm_column(monkeypatch):
+    from HCRProbeDesign import probeDesign, tiles
+    from HCRProbeDesign.tiles import TileSet
+
+    calls = []
+
+    def fake_calc_tm(seq):
+        calls.append(seq)
+        return 61.0
+
+    monkeypatch.setattr(tiles.primer3, "calc_tm", fake_calc_tm)
+    tile_set = TileSet.fromSequence("ACGGTCATTGCAAGTCCATG" * 4, "test", tileSize=52)
+    rows = tile_set.rows()[:3]
+    chosen = tile_set.tiles(rows) + [Tile(sequence="ACGT" * 13, seqName="solo", startPos=1)]
+    for tile in chosen:
+        tile.dTm = 0.0
+        tile.P1 = tile.P2 = tile.channel = "B1"
+        tile.calcGibbs()
+    assert probeDesign._tileTms(chosen) == [61.0] * 4
+    assert (tile_set.Tm[rows] == 61.0).all()
+    assert len(calls) == 4
+
+    probeDesign._tableRows(chosen[:3])
+    assert len(calls) == 4
+
+
+def test_map_batches_parallel_preserves_order():
+    import random
+
+    from HCRProbeDesign import tiles
+
+    rng = random.Random(11)
+    sequences = ["".join(rng.choice("acgt") for _ in range(25)) for _ in range(300)]
+    serial = tiles.mapBatches(tiles._tmBatch, sequences, 1)
+    parallel = tiles.mapBatches(tiles._tmBatch, sequences, 2)
+    assert parallel == serial
+    assert len(serial) == len(sequences)
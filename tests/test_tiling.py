@@ -0,0 +1,83 @@
+"""Tests for the vectorized tiling engine."""
+
+import random
+
+import numpy as np
+import pytest
+
+from HCRProbeDesign import probeDesign
+from HCRProbeDesign import sequencelib
+from HCRProbeDesign import tiling
+from HCRProbeDesign.tiles import Tile
+
+
+def _reference_scan(sequence, seqName, tileStep, tileSize):
+    numOfChunks = int(((len(sequence) - tileSize) / tileStep) + 1)
+    tiles = []
+    for i in range(0, numOfChunks * tileStep, tileStep):
+        tile = Tile(sequence=sequencelib.reverse_complement(sequence[i:i + tileSize]), seqName=seqName, startPos=i + 1)
+        if not tile.isMasked():
+            tiles.append(tile)
+    return tiles
+
+
+def test_encode_decode_roundtrip():
+    codes = tiling.encode("ACGTacgtNn")
+    assert codes.dtype == np.uint8
+    assert list(codes) == [0, 1, 2, 3, 0, 1, 2, 3, 4, 4]
+    assert tiling.decode(codes) == "acgtacgtnn"
+
+
+def test_reverse_complement_codes_matches_sequencelib():
+    seq = "AACCGTTNa"
+    rc = tiling.decode(tiling.reverse_complement_codes(tiling.encode(seq)))
+    assert rc == sequencelib.reverse_complement(seq).lower()
+
+
+def test_target_rejects_characters_other_than_acgtn():
+    with pytest.raises(ValueError, match="'R', 'u'.*position 5"):
+        tiling.TargetTiling("ACGTRACGTuACGT", tileSize=5)
+    # Genome references may hold IUPAC codes, which encode() masks like N.
+    assert list(tiling.encode("ACRN")) == [0, 1, tiling.MASK_CODE, tiling.MASK_CODE]
+
+
+def test_scan_sequence_matches_reference():
+    rng = random.Random(0)
+    seq = "".join(rng.choice("ACGTacgt") for _ in range(400))
+    seq = seq[:50] + "NNN" + seq[53:200] + "n" + seq[201:]
+    for tileStep, tileSize in [(1, 52), (3, 52), (1, 10), (7, 25)]:
+        expected = _reference_scan(seq, "target", tileStep, tileSize)
+        observed = probeDesign.scanSequence(seq, "target", tileStep=tileStep, tileSize=tileSize)
+        assert [(t.start, t.sequence) for t in observed] == [(t.start, t.sequence) for t in expected]
+
+
+def test_scan_sequence_shorter_than_tile():
+    assert probeDesign.scanSequence("ACGT", "target", tileSize=52) == []
+
+
+def test_run_windows_on_target_shorter_than_tile():
+    target = tiling.TargetTiling("ACGT" * 10, tileSize=52)
+    assert target.runWindows("c", 7, 2).shape == (0,)
+
+
+def test_run_windows_match_tile_has_runs():
+    rng = random.Random(3)
+    seq = "".join(rng.choice("ACGTCCCCGGG") for _ in range(300))
+    for tileSize in (10, 52):
+        target = tiling.TargetTiling(seq, tileSize=tileSize, tileStep=1)
+        for runChar in "acgtC":
+            for runLength, mismatches in [(7, 2), (4, 0), (3, 1), (0, 0), (tileSize, 3), (tileSize + 1, 0)]:
+                flagged = target.runWindows(runChar, runLength, mismatches)
+                for i in range(len(target)):
+                    tile = Tile(sequence=target.tileSequence(i), seqName="t", startPos=i + 1)
+                    assert flagged[i] == tile.hasRuns(runChar, runLength, mismatches)
+
+
+def test_gc_content_matches_sequencelib():
+    rng = random.Random(5)
+    seq = "".join(rng.choice("ACGTacgt") for _ in range(200)) + "NN" + "GCGC" * 20
+    target = tiling.TargetTiling(seq, tileSize=25, tileStep=2)
+    gc = target.gcContent()
+    for i in range(len(target)):
+        if not target.masked[i]:
+            assert gc[i] == sequencelib.gc_content(target.tileSequence(i))